@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+import os
+
+from app.schemas.schemas import CompactionRequest, SnapshotCreateRequest, SnapshotRestoreRequest
+from app.services import snapshots
+from app.services.vector_store import VectorStore
+from app.services.lexical_index import LexicalIndex
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.compaction import VectorCompactor
+from app.services.embedding_spaces import EmbeddingMigrator
+from app.services.container import (
+    get_embedding_migrator, get_lexical_index, get_near_duplicate_index, get_vector_compactor, get_vector_store
+)
+from app.core.config import settings
+
+router = APIRouter()
+
+@router.post("/snapshots")
+def create_snapshot(
+    request: SnapshotCreateRequest,
+    vector_store: VectorStore = Depends(get_vector_store)
+):
+    """Snapshot stored vectors and document rows without re-embedding anything"""
+    name = request.name or datetime.utcnow().strftime("snapshot-%Y%m%dT%H%M%SZ")
+    try:
+        path = snapshots.snapshot_path(name)
+        os.makedirs(settings.snapshot_dir, exist_ok=True)
+        manifest = snapshots.create_snapshot(vector_store, path, request.project_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"name": name, "manifest": manifest}
+
+@router.get("/snapshots")
+def list_snapshots():
+    """Names of the completed snapshots on this node"""
+    if not os.path.isdir(settings.snapshot_dir):
+        return {"snapshots": []}
+    names = sorted(
+        name for name in os.listdir(settings.snapshot_dir)
+        if os.path.exists(os.path.join(settings.snapshot_dir, name, "manifest.json"))
+    )
+    return {"snapshots": names}
+
+@router.post("/snapshots/restore")
+def restore_snapshot(
+    request: SnapshotRestoreRequest,
+    vector_store: VectorStore = Depends(get_vector_store),
+    lexical_index: LexicalIndex = Depends(get_lexical_index),
+    near_duplicate_index: NearDuplicateIndex = Depends(get_near_duplicate_index)
+):
+    """Restore a snapshot taken on this or another node"""
+    try:
+        path = snapshots.snapshot_path(request.name)
+        if not os.path.exists(os.path.join(path, "manifest.json")):
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+        return snapshots.restore_snapshot(vector_store, lexical_index, near_duplicate_index, path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/compaction")
+def compaction_status(vector_compactor: VectorCompactor = Depends(get_vector_compactor)):
+    """Projects due for compaction and the result of the last run in this process"""
+    return {
+        "threshold": vector_compactor.threshold,
+        "due": vector_compactor.candidates(),
+        "last_run": vector_compactor.last_run
+    }
+
+@router.post("/compaction")
+def run_compaction(
+    request: CompactionRequest,
+    vector_compactor: VectorCompactor = Depends(get_vector_compactor)
+):
+    """Compact due projects now instead of waiting for the schedule"""
+    return vector_compactor.run_once(request.project_ids, request.force)
+
+@router.get("/embedding-migration")
+def embedding_migration_status(embedding_migrator: EmbeddingMigrator = Depends(get_embedding_migrator)):
+    """Which projects have switched to EMBEDDING_MIGRATION_TARGET and how much is left to re-embed"""
+    return embedding_migrator.status()
@@ -1,21 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
+import asyncio
 import io
 
 from app.db.database import get_db
 from app.db.models import ChatMessage, Project, GeneratedDocument
-from app.schemas.schemas import ChatMessageRequest, ChatMessageResponse, ChatResponse, GeneratedDocumentResponse, GeneratedDocumentCreate, GeneratedDocumentUpdate
+from app.schemas.schemas import ChatBatchRequest, ChatBatchResponse, ChatMessageRequest, ChatMessageResponse, ChatResponse, GeneratedDocumentResponse, GeneratedDocumentCreate, GeneratedDocumentUpdate
 from app.services.chat_service import ChatService
+from app.services.container import get_chat_service, get_export_service
 from app.services.export_service import DocumentExportService
 
 router = APIRouter()
 
+def get_recent_chat_history(db: Session, project_id: int, limit: int = 5) -> List[dict]:
+    """Most recent messages of a project in chronological order"""
+    recent_messages = db.query(ChatMessage).filter(
+        ChatMessage.project_id == project_id
+    ).order_by(ChatMessage.timestamp.desc()).limit(limit).all()
+    
+    # Reverse to get chronological order
+    return [{"message": msg.message, "response": msg.response} for msg in reversed(recent_messages)]
+
 @router.post("/", response_model=ChatResponse)
 async def chat_with_project(
     chat_request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Send a message and get AI response based on project documents"""
     
@@ -24,26 +37,34 @@ async def chat_with_project(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Get recent chat history for context
-    recent_messages = db.query(ChatMessage).filter(
-        ChatMessage.project_id == chat_request.project_id
-    ).order_by(ChatMessage.timestamp.desc()).limit(5).all()
-    
-    # Format chat history
-    chat_history = []
-    for msg in reversed(recent_messages):  # Reverse to get chronological order
-        chat_history.append({
-            "message": msg.message,
-            "response": msg.response
-        })
-    
-    # Get AI response
-    chat_service = ChatService()
-    response_data = await chat_service.chat_with_documents(
-        query=chat_request.message,
-        project_id=chat_request.project_id,
-        chat_history=chat_history
+    # Retrieve context and load recent chat history concurrently
+    if chat_service.model_type:
+        retrieval = chat_service.vector_store.asearch(
+            query=chat_request.message,
+            project_id=chat_request.project_id,
+            n_results=chat_service.chat_n_results(),
+            document_ids=chat_request.document_ids
+        )
+    else:
+        retrieval = asyncio.sleep(0, result=[])  # Nothing to retrieve for; the service reports the missing API keys
+    relevant_chunks, chat_history = await asyncio.gather(
+        retrieval,
+        run_in_threadpool(get_recent_chat_history, db, chat_request.project_id),
+        return_exceptions=True
     )
+    if isinstance(chat_history, Exception):
+        raise chat_history
+    
+    # Get AI response; a failed retrieval is reported like any other chat error
+    if isinstance(relevant_chunks, Exception):
+        response_data = chat_service.error_response(relevant_chunks)
+    else:
+        response_data = await chat_service.chat_with_documents(
+            query=chat_request.message,
+            project_id=chat_request.project_id,
+            chat_history=chat_history,
+            relevant_chunks=relevant_chunks
+        )
     
     # Save chat message to database
     db_message = ChatMessage(
@@ -59,6 +80,64 @@ async def chat_with_project(
         sources=response_data["sources"]
     )
 
+@router.post("/batch", response_model=ChatBatchResponse)
+async def chat_with_project_batch(
+    batch_request: ChatBatchRequest,
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    """Send several messages at once; context for all of them is retrieved in one batch"""
+    
+    # Validate project exists
+    project = db.query(Project).filter(Project.id == batch_request.project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    if not batch_request.messages:
+        raise HTTPException(status_code=400, detail="No messages provided")
+    
+    # Retrieve context for every message while recent chat history loads
+    if chat_service.model_type:
+        retrieval = chat_service.vector_store.asearch_many(
+            batch_request.messages,
+            project_id=batch_request.project_id,
+            n_results=chat_service.chat_n_results(),
+            document_ids=batch_request.document_ids
+        )
+    else:
+        retrieval = asyncio.sleep(0, result={"results": [[] for _ in batch_request.messages]})
+    search, chat_history = await asyncio.gather(
+        retrieval,
+        run_in_threadpool(get_recent_chat_history, db, batch_request.project_id),
+        return_exceptions=True
+    )
+    if isinstance(chat_history, Exception):
+        raise chat_history
+    
+    if isinstance(search, Exception):
+        responses = [chat_service.error_response(search) for _ in batch_request.messages]
+    else:
+        responses = await chat_service.chat_with_documents_batch(
+            queries=batch_request.messages,
+            project_id=batch_request.project_id,
+            chat_history=chat_history,
+            relevant_chunks=search["results"]
+        )
+    
+    # Save chat messages to database
+    for message, response_data in zip(batch_request.messages, responses):
+        db.add(ChatMessage(
+            project_id=batch_request.project_id,
+            message=message,
+            response=response_data["response"]
+        ))
+    db.commit()
+    
+    return ChatBatchResponse(responses=[
+        ChatResponse(response=response_data["response"], sources=response_data["sources"])
+        for response_data in responses
+    ])
+
 @router.get("/project/{project_id}/history", response_model=List[ChatMessageResponse])
 def get_chat_history(
     project_id: int,
@@ -101,7 +180,8 @@ def clear_chat_history(project_id: int, db: Session = Depends(get_db)):
 async def generate_project_summary(
     project_id: int,
     summary_type: str = "general",
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate a summary of all documents in the project"""
     
@@ -110,7 +190,6 @@ async def generate_project_summary(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
     summary = await chat_service.generate_summary(project_id, summary_type)
     
     return {"summary": summary, "summary_type": summary_type}
@@ -129,7 +208,8 @@ def get_chat_message(message_id: int, db: Session = Depends(get_db)):
 async def generate_mvp(
     project_id: int,
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate an MVP plan based on project documents"""
     
@@ -138,15 +218,15 @@ async def generate_mvp(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    response = await chat_service.generate_mvp(project_id, request.message)
+    response = await chat_service.generate_mvp(project_id, request.message, document_ids=request.document_ids)
     return ChatResponse(response=response, sources=[])
 
 @router.post("/project/{project_id}/generate_prd")
 async def generate_prd(
     project_id: int,
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate a Product Requirements Document based on project documents"""
     
@@ -155,15 +235,15 @@ async def generate_prd(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    response = await chat_service.generate_prd(project_id, request.message)
+    response = await chat_service.generate_prd(project_id, request.message, document_ids=request.document_ids)
     return ChatResponse(response=response, sources=[])
 
 @router.post("/project/{project_id}/generate_rfp")
 async def generate_rfp(
     project_id: int,
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate a Request for Proposal based on project documents"""
     
@@ -172,15 +252,15 @@ async def generate_rfp(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    response = await chat_service.generate_rfp(project_id, request.message)
+    response = await chat_service.generate_rfp(project_id, request.message, document_ids=request.document_ids)
     return ChatResponse(response=response, sources=[])
 
 @router.post("/project/{project_id}/generate_design")
 async def generate_design(
     project_id: int,
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate a System Design Document based on previously generated documents"""
     
@@ -189,7 +269,6 @@ async def generate_design(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
     # The request.message should contain the context from previous generations
     response = await chat_service.generate_design(project_id, request.message)
     return ChatResponse(response=response, sources=[])
@@ -262,13 +341,12 @@ def delete_generated_document(document_id: int, db: Session = Depends(get_db)):
 
 # EXPORT ENDPOINTS
 @router.get("/generated_document/{document_id}/export/pdf")
-def export_document_to_pdf(document_id: int, db: Session = Depends(get_db)):
+def export_document_to_pdf(document_id: int, db: Session = Depends(get_db), export_service: DocumentExportService = Depends(get_export_service)):
     """Export a generated document to PDF"""
     document = db.query(GeneratedDocument).filter(GeneratedDocument.id == document_id).first()
     if not document:
         raise HTTPException(status_code=404, detail="Generated document not found")
     
-    export_service = DocumentExportService()
     pdf_buffer = export_service.export_to_pdf(document)
     filename = export_service.get_filename(document, 'pdf')
     
@@ -279,13 +357,12 @@ def export_document_to_pdf(document_id: int, db: Session = Depends(get_db)):
     )
 
 @router.get("/generated_document/{document_id}/export/word")
-def export_document_to_word(document_id: int, db: Session = Depends(get_db)):
+def export_document_to_word(document_id: int, db: Session = Depends(get_db), export_service: DocumentExportService = Depends(get_export_service)):
     """Export a generated document to Word"""
     document = db.query(GeneratedDocument).filter(GeneratedDocument.id == document_id).first()
     if not document:
         raise HTTPException(status_code=404, detail="Generated document not found")
     
-    export_service = DocumentExportService()
     word_buffer = export_service.export_to_word(document)
     filename = export_service.get_filename(document, 'word')
     
@@ -300,7 +377,8 @@ def export_document_to_word(document_id: int, db: Session = Depends(get_db)):
 async def generate_documents_from_chat(
     project_id: int,
     chat_request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate MVP, PRD, RFP documents from chat instructions (no uploaded documents required)"""
     
@@ -309,16 +387,12 @@ async def generate_documents_from_chat(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    
     # Use the chat message as instruction for document generation
     instruction = chat_request.message
     
     try:
-        # Generate all documents based on chat instruction
-        mvp_result = await chat_service.generate_mvp(project_id, instruction)
-        prd_result = await chat_service.generate_prd(project_id, instruction) 
-        rfp_result = await chat_service.generate_rfp(project_id, instruction)
+        # Generate all documents based on chat instruction (one batched retrieval)
+        await chat_service.generate_core_documents(project_id, instruction, document_ids=chat_request.document_ids)
         
         return ChatResponse(
             response=f"Successfully generated MVP, PRD, and RFP documents based on your instructions: '{instruction}'. Check the AI Generations tab to view and download them.",
@@ -332,7 +406,8 @@ async def generate_documents_from_chat(
 async def generate_mvp_from_chat(
     project_id: int,
     chat_request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate MVP document from chat instructions"""
     
@@ -340,10 +415,8 @@ async def generate_mvp_from_chat(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    
     try:
-        result = await chat_service.generate_mvp(project_id, chat_request.message)
+        result = await chat_service.generate_mvp(project_id, chat_request.message, document_ids=chat_request.document_ids)
         return ChatResponse(
             response=f"MVP Plan generated based on your instructions. {result}",
             sources=[]
@@ -355,7 +428,8 @@ async def generate_mvp_from_chat(
 async def generate_prd_from_chat(
     project_id: int,
     chat_request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate PRD document from chat instructions"""
     
@@ -363,10 +437,8 @@ async def generate_prd_from_chat(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    
     try:
-        result = await chat_service.generate_prd(project_id, chat_request.message)
+        result = await chat_service.generate_prd(project_id, chat_request.message, document_ids=chat_request.document_ids)
         return ChatResponse(
             response=f"Product Requirements Document generated based on your instructions. {result}",
             sources=[]
@@ -378,7 +450,8 @@ async def generate_prd_from_chat(
 async def generate_rfp_from_chat(
     project_id: int,
     chat_request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate RFP document from chat instructions"""
     
@@ -386,10 +459,8 @@ async def generate_rfp_from_chat(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    
     try:
-        result = await chat_service.generate_rfp(project_id, chat_request.message)
+        result = await chat_service.generate_rfp(project_id, chat_request.message, document_ids=chat_request.document_ids)
         return ChatResponse(
             response=f"Request for Proposal generated based on your instructions. {result}",
             sources=[]
@@ -400,22 +471,19 @@ async def generate_rfp_from_chat(
 # NEW DOCUMENT GENERATION ENDPOINTS
 
 @router.post("/project/{project_id}/generate_business_case")
-async def generate_business_case(project_id: int, request: ChatMessageRequest):
+async def generate_business_case(project_id: int, request: ChatMessageRequest, chat_service: ChatService = Depends(get_chat_service)):
     """Generate business case document"""
-    chat_service = ChatService()
-    response = await chat_service.generate_business_case(project_id, request.message)
+    response = await chat_service.generate_business_case(project_id, request.message, document_ids=request.document_ids)
     return ChatResponse(response=response, sources=[])
 
 @router.post("/project/{project_id}/generate_user_personas")
-async def generate_user_personas(project_id: int, request: ChatMessageRequest):
+async def generate_user_personas(project_id: int, request: ChatMessageRequest, chat_service: ChatService = Depends(get_chat_service)):
     """Generate user personas document"""
-    chat_service = ChatService()
-    response = await chat_service.generate_user_personas(project_id, request.message)
+    response = await chat_service.generate_user_personas(project_id, request.message, document_ids=request.document_ids)
     return ChatResponse(response=response, sources=[])
 
 @router.post("/project/{project_id}/generate_gtm_strategy")
-async def generate_gtm_strategy(project_id: int, request: ChatMessageRequest):
+async def generate_gtm_strategy(project_id: int, request: ChatMessageRequest, chat_service: ChatService = Depends(get_chat_service)):
     """Generate go-to-market strategy document"""
-    chat_service = ChatService()
-    response = await chat_service.generate_gtm_strategy(project_id, request.message)
+    response = await chat_service.generate_gtm_strategy(project_id, request.message, document_ids=request.document_ids)
     return ChatResponse(response=response, sources=[]) 
\ No newline at end of file
@@ -8,20 +8,23 @@ from app.db.database import get_db
 from app.db.models import Document, DocumentChunk, Project
 from app.schemas.schemas import DocumentResponse, FileUploadResponse
 from app.services.document_processor import DocumentProcessor
+from app.services import corpus_stats
 from app.services.vector_store import VectorStore
+from app.services.lexical_index import LexicalIndex
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.container import get_ingestion_engine, get_lexical_index, get_near_duplicate_index, get_vector_store
+from app.services.ingestion import IngestionEngine
 from app.core.config import settings
 
 router = APIRouter()
 
-def process_document_background(document_id: int, file_path: str, file_type: str, project_id: int):
+def process_document_background(document_id: int, file_path: str, file_type: str, project_id: int,
+                                vector_store: VectorStore, lexical_index: LexicalIndex,
+                                ingestion_engine: IngestionEngine, near_duplicate_index: NearDuplicateIndex):
     """Background task to process uploaded document"""
     try:
-        # Initialize services
-        doc_processor = DocumentProcessor()
-        vector_store = VectorStore()
-        
-        # Process document
-        chunks = doc_processor.process_document(file_path, file_type, document_id)
+        # Extract, chunk and (with a worker pool) embed outside the web process
+        chunks, embeddings = ingestion_engine.process(file_path, file_type, document_id)
         
         # Store chunks in database
         from app.db.database import SessionLocal
@@ -37,6 +40,16 @@ def process_document_background(document_id: int, file_path: str, file_type: str
                 )
                 db.add(db_chunk)
             
+            # Near-duplicates of chunks already in the project are kept as back-references, not indexed
+            duplicates = near_duplicate_index.index_chunks(db, project_id, chunks)
+            unique = [i for i, duplicate in enumerate(duplicates) if duplicate is None]
+            unique_chunks = [chunks[i] for i in unique]
+            
+            # Index keywords and update counters in the same transaction as the chunks
+            lexical_index.add_chunks(db, project_id, unique_chunks)
+            corpus_stats.record_chunks_ingested(db, project_id, document_id, len(chunks))
+            corpus_stats.bump_corpus_version(db, project_id)
+            
             # Mark document as processed
             document = db.query(Document).filter(Document.id == document_id).first()
             if document:
@@ -45,7 +58,13 @@ def process_document_background(document_id: int, file_path: str, file_type: str
             db.commit()
             
             # Add to vector store
-            vector_store.add_document_chunks(chunks, project_id)
+            if embeddings is not None:
+                embeddings = embeddings[unique]
+            vector_store.add_document_chunks(unique_chunks, project_id, embeddings=embeddings)
+            
+            # Bump again so results cached while the vectors were being added are dropped
+            corpus_stats.bump_corpus_version(db, project_id)
+            db.commit()
             
         finally:
             db.close()
@@ -68,7 +87,11 @@ async def upload_document(
     background_tasks: BackgroundTasks,
     project_id: int = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    vector_store: VectorStore = Depends(get_vector_store),
+    lexical_index: LexicalIndex = Depends(get_lexical_index),
+    ingestion_engine: IngestionEngine = Depends(get_ingestion_engine),
+    near_duplicate_index: NearDuplicateIndex = Depends(get_near_duplicate_index)
 ):
     """Upload and process a document"""
     
@@ -110,6 +133,7 @@ async def upload_document(
         )
         
         db.add(db_document)
+        corpus_stats.record_document_added(db, project_id)
         db.commit()
         db.refresh(db_document)
         
@@ -119,7 +143,11 @@ async def upload_document(
             db_document.id,
             file_path,
             file_extension,
-            project_id
+            project_id,
+            vector_store,
+            lexical_index,
+            ingestion_engine,
+            near_duplicate_index
         )
         
         return FileUploadResponse(
@@ -149,15 +177,29 @@ def get_document(document_id: int, db: Session = Depends(get_db)):
     return document
 
 @router.delete("/{document_id}")
-def delete_document(document_id: int, db: Session = Depends(get_db)):
+def delete_document(
+    document_id: int,
+    db: Session = Depends(get_db),
+    vector_store: VectorStore = Depends(get_vector_store),
+    lexical_index: LexicalIndex = Depends(get_lexical_index),
+    near_duplicate_index: NearDuplicateIndex = Depends(get_near_duplicate_index)
+):
     """Delete document and all associated data"""
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
+    project_id = document.project_id
     
     # Delete from vector store
-    vector_store = VectorStore()
-    vector_store.delete_document(document_id)
+    vector_store.delete_document(document_id, project_id)
+    lexical_index.delete_document(db, document_id, project_id)
+    
+    # Chunks other documents shared with this one lose their stored copy; index one of them instead
+    promoted = near_duplicate_index.delete_document(db, project_id, document_id)
+    if promoted:
+        lexical_index.add_chunks(db, project_id, promoted)
+    corpus_stats.record_document_deleted(db, project_id, document_id)
+    corpus_stats.bump_corpus_version(db, project_id)
     
     # Delete file from disk
     try:
@@ -169,24 +211,38 @@ def delete_document(document_id: int, db: Session = Depends(get_db)):
     # Delete from database (cascades to chunks)
     db.delete(document)
     db.commit()
+    # Chunks the embedding migrator copied since the vector delete above; it drops any it copies after this commit
+    vector_store.delete_document_from_target(document_id, project_id)
+    
+    if promoted:
+        vector_store.add_document_chunks(promoted, project_id)
+        corpus_stats.bump_corpus_version(db, project_id)
+        db.commit()
     
     return {"message": "Document deleted successfully"}
 
 @router.get("/{document_id}/status")
-def get_document_status(document_id: int, db: Session = Depends(get_db)):
+def get_document_status(
+    document_id: int,
+    db: Session = Depends(get_db),
+    near_duplicate_index: NearDuplicateIndex = Depends(get_near_duplicate_index)
+):
     """Get document processing status"""
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    vector_store = VectorStore()
-    stats = vector_store.get_document_stats(document_id)
+    stats = corpus_stats.get_document_stats(db, document_id)
+    dedup = near_duplicate_index.document_stats(db, document_id, stats["total_chunks"])
     
     return {
         "document_id": document_id,
         "filename": document.original_filename,
         "processed": document.processed,
         "total_chunks": stats["total_chunks"],
+        "stored_chunks": dedup["stored_chunks"],
+        "duplicate_chunks": dedup["duplicate_chunks"],
+        "dedup_ratio": dedup["dedup_ratio"],
         "file_size": document.file_size,
         "created_at": document.created_at
     } 
\ No newline at end of file
@@ -6,6 +6,7 @@ from app.db.database import get_db
 from app.db.models import GeneratedDocument, Project
 from app.schemas.schemas import ChatMessageRequest, ChatResponse, GeneratedDocumentResponse, GeneratedDocumentUpdate, GenerateRequest, GenerateResponse
 from app.services.chat_service import ChatService
+from app.services.container import get_chat_service
 from app.services.document_factory import document_factory
 
 router = APIRouter()
@@ -46,7 +47,8 @@ async def generate_document_factory(
             document_type=document_type,
             raw_brief=request.user_prompt,
             context_documents=request.context_documents,
-            user_preferences=request.user_preferences
+            user_preferences=request.user_preferences,
+            document_ids=request.document_ids
         )
         
         if result["status"] == "error":
@@ -72,15 +74,15 @@ async def generate_document_factory(
 async def generate_mvp(
     project_id: int,
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate MVP document based on uploaded documents"""
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    result = await chat_service.generate_mvp(project_id, request.message)
+    result = await chat_service.generate_mvp(project_id, request.message, document_ids=request.document_ids)
     
     return ChatResponse(response="MVP document generated successfully", sources=[])
 
@@ -88,15 +90,15 @@ async def generate_mvp(
 async def generate_prd(
     project_id: int,
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate PRD document based on uploaded documents"""
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    result = await chat_service.generate_prd(project_id, request.message)
+    result = await chat_service.generate_prd(project_id, request.message, document_ids=request.document_ids)
     
     return ChatResponse(response="PRD document generated successfully", sources=[])
 
@@ -104,15 +106,15 @@ async def generate_prd(
 async def generate_rfp(
     project_id: int,
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate RFP document based on uploaded documents"""
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    result = await chat_service.generate_rfp(project_id, request.message)
+    result = await chat_service.generate_rfp(project_id, request.message, document_ids=request.document_ids)
     
     return ChatResponse(response="RFP document generated successfully", sources=[])
 
@@ -120,14 +122,14 @@ async def generate_rfp(
 async def generate_design(
     project_id: int,
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate system design document"""
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
     result = await chat_service.generate_design(project_id, request.message)
     
     return ChatResponse(response="System design document generated successfully", sources=[])
@@ -216,21 +218,19 @@ def delete_generated_document(document_id: int, db: Session = Depends(get_db)):
 async def generate_documents_from_chat(
     project_id: int,
     chat_request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate MVP, PRD, RFP documents from chat instructions"""
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
     instruction = chat_request.message
     
     try:
-        # Generate all documents
-        await chat_service.generate_mvp(project_id, instruction)
-        await chat_service.generate_prd(project_id, instruction) 
-        await chat_service.generate_rfp(project_id, instruction)
+        # Generate all documents (one batched retrieval)
+        await chat_service.generate_core_documents(project_id, instruction, document_ids=chat_request.document_ids)
         
         return ChatResponse(
             response=f"Successfully generated MVP, PRD, and RFP documents based on your instructions: '{instruction}'. Check the AI Generations tab to view and download them.",
@@ -243,14 +243,14 @@ async def generate_documents_from_chat(
 async def generate_mvp_from_chat(
     project_id: int,
     chat_request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Generate MVP document from chat instructions"""
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    chat_service = ChatService()
-    result = await chat_service.generate_mvp(project_id, chat_request.message)
+    result = await chat_service.generate_mvp(project_id, chat_request.message, document_ids=chat_request.document_ids)
     
     return ChatResponse(response="MVP document generated successfully from your instructions", sources=[])
\ No newline at end of file
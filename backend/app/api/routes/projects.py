@@ -6,6 +6,10 @@ from app.db.database import get_db
 from app.db.models import Project
 from app.schemas.schemas import ProjectCreate, ProjectResponse, ProjectWithDocuments
 from app.services.vector_store import VectorStore
+from app.services.lexical_index import LexicalIndex
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services import corpus_stats
+from app.services.container import get_lexical_index, get_near_duplicate_index, get_vector_store
 
 router = APIRouter()
 
@@ -46,15 +50,24 @@ def update_project(project_id: int, project: ProjectCreate, db: Session = Depend
     return db_project
 
 @router.delete("/{project_id}")
-def delete_project(project_id: int, db: Session = Depends(get_db)):
+def delete_project(
+    project_id: int,
+    db: Session = Depends(get_db),
+    vector_store: VectorStore = Depends(get_vector_store),
+    lexical_index: LexicalIndex = Depends(get_lexical_index),
+    near_duplicate_index: NearDuplicateIndex = Depends(get_near_duplicate_index)
+):
     """Delete project and all associated data"""
     db_project = db.query(Project).filter(Project.id == project_id).first()
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Delete from vector store
-    vector_store = VectorStore()
     vector_store.delete_project(project_id)
+    lexical_index.delete_project(db, project_id)
+    near_duplicate_index.delete_project(db, project_id)
+    corpus_stats.record_project_deleted(db, project_id)
+    corpus_stats.bump_corpus_version(db, project_id)
     
     # Delete from database (cascades to documents and chat messages)
     db.delete(db_project)
@@ -69,13 +82,12 @@ def get_project_stats(project_id: int, db: Session = Depends(get_db)):
     if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    vector_store = VectorStore()
-    vector_stats = vector_store.get_project_stats(project_id)
+    stats = corpus_stats.get_project_stats(db, project_id)
     
     return {
         "project_id": project_id,
         "project_name": project.name,
-        "total_documents": len(project.documents),
-        "total_chunks": vector_stats["total_chunks"],
+        "total_documents": stats["total_documents"],
+        "total_chunks": stats["total_chunks"],
         "created_at": project.created_at
     } 
\ No newline at end of file
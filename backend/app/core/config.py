@@ -17,8 +17,104 @@ class Settings(BaseSettings):
     
     # Vector Database
     vector_db_path: str = "./vector_db"
+    chroma_mode: str = "persistent"  # "persistent" (embedded on vector_db_path) or "http" (shared Chroma server)
+    chroma_host: str = "localhost"
+    chroma_port: int = 8000
+    chroma_ssl: bool = False
+    chroma_auth_token: str = ""  # Sent as a bearer token when the server requires auth
+    chroma_max_retries: int = 3  # Retries of transient failures (connection errors, 5xx) in http mode
+    chroma_retry_backoff_seconds: float = 0.2  # Doubles on each retry
     vector_db_collection_name: str = "documents"
+    vector_db_layout: str = "per_project"  # "per_project" or "global" (single shared collection, pre-migration)
     embedding_model: str = "all-MiniLM-L6-v2"
+    # Changing models without downtime (see app.services.embedding_spaces)
+    embedding_migration_target: str = ""  # Model to move every project to; empty when no migration is running
+    embedding_migration_batch_size: int = 64  # Chunks re-embedded per step
+    embedding_migration_chunks_per_second: float = 50.0  # Re-embedding throttle so live traffic keeps the CPU; 0 disables
+    embedding_migration_interval_seconds: float = 60.0  # Pause between passes over projects that haven't switched
+    embedding_space_refresh_seconds: float = 5.0  # How often each process re-reads which projects have switched
+    embedding_batch_size: int = 64  # Texts per model.encode call during ingestion
+    embedding_backend: str = "torch"  # "torch" (SentenceTransformer), "onnx" (see export_onnx_model.py) or "server"
+    embedding_server_socket: str = "./embedding_server.sock"  # Unix socket of serve_embeddings.py
+    embedding_server_backend: str = "torch"  # Runtime the embedding server itself uses: "torch" or "onnx"
+    embedding_server_max_batch: int = 64  # Texts per coalesced model call
+    embedding_server_max_wait_ms: float = 5.0  # How long the first request of a batch waits for others
+    embedding_server_timeout_seconds: float = 30.0
+    embedding_num_threads: int = 0  # Intra-op threads for the embedding runtime; 0 lets it decide
+    onnx_model_dir: str = "./onnx_models"
+    onnx_quantized: bool = True  # Use the int8 dynamically quantized ONNX export
+    ingestion_workers: int = 0  # Processes for extraction + embedding of uploads; 0 runs them in the web process
+    ingestion_worker_threads: int = 1  # torch/tokenizer threads per ingestion worker
+    vector_db_max_insert_batch: int = 5000  # Upper bound per collection.add, capped by Chroma's own limit
+    # HNSW index of each Chroma collection (Chroma's defaults); tune with benchmarks/hnsw_tuning_benchmark.py
+    chroma_hnsw_m: int = 16  # Links per node: higher raises recall, memory and build time
+    chroma_hnsw_construction_ef: int = 100  # Candidate list while building: higher builds a better graph, slower
+    chroma_hnsw_search_ef: int = 10  # Candidate list per query: higher raises recall and latency; applies to existing collections too
+    
+    snapshot_dir: str = "./snapshots"  # Where snapshot_vector_store.py and /api/admin/snapshots write
+    
+    # Compact vector storage (see app.services.vector_codec)
+    vector_storage_dtype: str = "float32"  # Precision of rescoring codes: "float32", "float16" or "int8" (needs PCA)
+    vector_pca_dimensions: int = 0  # Index PCA projections of this size; 0 indexes full vectors
+    vector_rescore_factor: int = 4  # Candidates fetched per result for full-dimension rescoring
+    
+    # Vector backend (see app.services.vector_backends)
+    vector_backend: str = "chroma"  # "chroma", "numpy" (exact search) or "auto" (numpy until a project outgrows it)
+    numpy_backend_path: str = "./vector_db/numpy"
+    numpy_compaction_threshold: float = 0.2  # Compact a project once this fraction of its rows is deleted
+    numpy_version_retention_seconds: float = 60.0  # Superseded versions stay readable this long for other processes
+    numpy_backend_max_chunks: int = 20000  # In "auto" mode, larger projects move to Chroma
+    
+    # Index compaction (see app.services.compaction)
+    vector_compaction_threshold: float = 0.2  # Rebuild a project's index once this fraction of it is deleted rows
+    vector_compaction_interval_seconds: float = 3600  # How often each API process checks; 0 disables the schedule
+    vector_compaction_lease_seconds: float = 1800  # A crashed compaction's claim on a project expires after this
+    
+    # Project sharding (see app.services.shard_map); empty keeps everything in one location
+    vector_shards: list = []  # "name=location" entries; location is a directory or a Chroma server URL
+    shard_virtual_nodes: int = 64  # Points per shard on the consistent-hash ring
+    shard_map_refresh_seconds: float = 5.0  # How often each process re-reads project placements
+    
+    # Coalesced vector writes (see app.services.vector_writer)
+    vector_write_coalescing: bool = True  # One writer thread batches inserts from all ingestion jobs
+    vector_write_max_rows: int = 2000  # Flush once this many rows are waiting...
+    vector_write_max_wait_ms: float = 50  # ...or this long after the first one arrived
+    
+    # Embedding cache (content-hash keyed, persisted on local disk)
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "./embedding_cache/embeddings.sqlite3"
+    embedding_cache_max_bytes: int = 1024 * 1024 * 1024  # 1GB
+    
+    # Query embedding cache (in-process LRU)
+    query_embedding_cache_size: int = 1024
+    query_embedding_cache_ttl_seconds: int = 3600
+    
+    # Retrieval result cache (in-process LRU, invalidated by the per-project corpus version)
+    retrieval_cache_max_entries: int = 4096  # 0 disables the cache
+    retrieval_cache_max_bytes: int = 64 * 1024 * 1024  # 64MB
+    corpus_version_refresh_seconds: float = 1.0  # How long each process reuses a corpus version; its own bumps apply at once
+    
+    # Retrieval
+    vector_store_async_workers: int = 8  # Threads serving VectorStore.asearch/aadd/adelete, separate from FastAPI's pool
+    hybrid_search_workers: int = 4  # Threads added to that pool for the legs of hybrid searches
+    retrieval_mode: str = "vector"  # "vector" or "hybrid" (BM25 + vector, fused with reciprocal rank fusion)
+    hybrid_candidate_factor: int = 2  # Candidates fetched per leg for each requested result
+    hybrid_rrf_k: int = 60
+    hybrid_vector_budget_ms: int = 1000
+    hybrid_lexical_budget_ms: int = 300
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    bm25_max_postings_per_term: int = 1000  # Candidate postings per common query term; 0 scores them all
+    mmr_candidate_factor: int = 3  # Candidates fetched per result when MMR re-ranking is requested
+    mmr_duplicate_threshold: float = 0.95  # MMR drops candidates this similar to an already selected chunk
+    generation_mmr_lambda: float = 0.7  # Relevance/diversity trade-off for generate_* context; 1.0 disables MMR
+    
+    # Near-duplicate chunks (MinHash/LSH, see app.services.near_duplicates)
+    near_duplicate_detection: bool = True  # Index repeated boilerplate once, with back-references
+    near_duplicate_threshold: float = 0.85  # Estimated Jaccard similarity at which a chunk counts as a duplicate
+    near_duplicate_num_perm: int = 128  # MinHash permutations; changing it invalidates stored fingerprints
+    near_duplicate_bands: int = 16  # LSH bands (must divide num_perm); more bands find lower similarities
+    near_duplicate_shingle_size: int = 5  # Words per shingle
     
     # Chat
     max_chat_history: int = 20
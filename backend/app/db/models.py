@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Boolean, Float, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
@@ -72,4 +72,131 @@ class GeneratedDocument(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
-    project = relationship("Project", back_populates="generated_documents") 
\ No newline at end of file
+    project = relationship("Project", back_populates="generated_documents")
+
+class ChunkTerm(Base):
+    """Inverted index posting: one term of one chunk, used for BM25 search"""
+    __tablename__ = "chunk_terms"
+    __table_args__ = (
+        # Also serves a term's highest-frequency postings first (capped BM25 search)
+        Index("ix_chunk_terms_project_term_tf", "project_id", "term", "term_frequency"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    term = Column(String(100), nullable=False)
+    term_frequency = Column(Integer, nullable=False)
+    chunk_length = Column(Integer, nullable=False)  # Tokens in the chunk, for BM25 length normalization
+
+class LexicalIndexStats(Base):
+    """Per-project corpus totals needed by BM25 (chunk count and total token length)"""
+    __tablename__ = "lexical_index_stats"
+    
+    project_id = Column(Integer, ForeignKey("projects.id"), primary_key=True)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    total_length = Column(Integer, nullable=False, default=0)
+
+class ProjectCorpusStats(Base):
+    """Maintained per-project document and chunk counters"""
+    __tablename__ = "project_corpus_stats"
+    
+    project_id = Column(Integer, ForeignKey("projects.id"), primary_key=True)
+    document_count = Column(Integer, nullable=False, default=0)
+    chunk_count = Column(Integer, nullable=False, default=0)
+
+class ProjectCorpusVersion(Base):
+    """Per-project corpus version, bumped whenever indexed content changes"""
+    __tablename__ = "project_corpus_versions"
+    
+    # No foreign key: the row outlives its project so a reused id never sees an old version again
+    project_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ProjectShard(Base):
+    """Vector store shard a project's vectors are placed on (see app.services.shard_map)"""
+    __tablename__ = "project_shards"
+    
+    # No foreign key: placements are managed by the vector store, like corpus versions
+    project_id = Column(Integer, primary_key=True)
+    shard = Column(String(100), nullable=False, index=True)
+
+class EmbeddingSpace(Base):
+    """Where the vectors of one embedding model are stored (see app.services.embedding_spaces)"""
+    __tablename__ = "embedding_spaces"
+    
+    model_name = Column(String(255), primary_key=True)
+    storage_key = Column(String(64), nullable=False, unique=True)  # "" for the original, unsuffixed collections
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ProjectEmbeddingSpace(Base):
+    """Embedding model a project is queried with, and its re-embedding progress towards a migration target"""
+    __tablename__ = "project_embedding_spaces"
+    
+    # No foreign key: managed alongside the vector store, like corpus versions
+    project_id = Column(Integer, primary_key=True)
+    active_model = Column(String(255), nullable=True)  # None means EMBEDDING_MODEL
+    target_model = Column(String(255), nullable=True)
+    last_chunk_id = Column(Integer, nullable=False, default=0)  # Re-embedding cursor into document_chunks
+    migrated_chunks = Column(Integer, nullable=False, default=0)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    lease_expires_at = Column(Float, nullable=True)  # Epoch seconds; held by the process re-embedding the project
+
+class VectorIndexChurn(Base):
+    """Rows deleted from a project's HNSW index since it was last built (see app.services.compaction)"""
+    __tablename__ = "vector_index_churn"
+    
+    project_id = Column(Integer, primary_key=True)
+    deleted_rows = Column(Integer, nullable=False, default=0)
+    compacted_at = Column(DateTime(timezone=True), nullable=True)
+    lease_expires_at = Column(Float, nullable=True)  # Epoch seconds; held by the process compacting the project
+
+class DocumentCorpusStats(Base):
+    """Maintained per-document chunk counter"""
+    __tablename__ = "document_corpus_stats"
+    
+    document_id = Column(Integer, ForeignKey("documents.id"), primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    chunk_count = Column(Integer, nullable=False, default=0)
+
+class ChunkFingerprint(Base):
+    """MinHash signature of a stored chunk, used for near-duplicate detection"""
+    __tablename__ = "chunk_fingerprints"
+    __table_args__ = (
+        Index("ix_chunk_fingerprints_document_chunk", "document_id", "chunk_index"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    chunk_index = Column(Integer, nullable=False)
+    signature = Column(LargeBinary, nullable=False)  # uint32 per MinHash permutation
+
+class ChunkLshBucket(Base):
+    """LSH band bucket of a stored chunk; chunks sharing a bucket are candidate duplicates"""
+    __tablename__ = "chunk_lsh_buckets"
+    __table_args__ = (
+        Index("ix_chunk_lsh_buckets_project_bucket", "project_id", "bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    bucket = Column(BigInteger, nullable=False)
+
+class ChunkDuplicate(Base):
+    """Back-reference from a near-duplicate chunk to the stored chunk it is indexed under"""
+    __tablename__ = "chunk_duplicates"
+    __table_args__ = (
+        Index("ix_chunk_duplicates_canonical", "canonical_document_id", "canonical_chunk_index"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    canonical_document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    canonical_chunk_index = Column(Integer, nullable=False)
+    similarity = Column(Float, nullable=False)  # Estimated Jaccard similarity of the two chunks
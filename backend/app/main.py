@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -5,9 +6,10 @@ from fastapi.responses import JSONResponse
 import os
 from dotenv import load_dotenv
 
-from app.api.routes import projects, documents, chat, generations
+from app.api.routes import projects, documents, chat, generations, admin
 from app.core.config import settings
 from app.db.database import engine, Base
+from app.services.container import container
 
 # Load environment variables
 load_dotenv()
@@ -15,10 +17,21 @@ load_dotenv()
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build shared services once at startup and release them on shutdown"""
+    container.warm_up()
+    print(f"Services warmed up: {container.init_timings}")
+    container.vector_compactor.start()
+    container.embedding_migrator.start()
+    yield
+    container.shutdown()
+
 app = FastAPI(
     title="KairosAI | Intelligent Strategic Document Platform",
     description="Harness the perfect moment for strategic insights with KairosAI. AI-powered document analysis and automated strategy generation.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -46,6 +59,7 @@ app.include_router(projects.router, prefix="/api/projects", tags=["projects"])
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(generations.router, prefix="/api/chat", tags=["generations"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 @app.get("/")
 async def root():
@@ -53,7 +67,7 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "services": container.status()}
 
 if __name__ == "__main__":
     import uvicorn
@@ -38,6 +38,7 @@ class DocumentResponse(DocumentBase):
 class ChatMessageRequest(BaseModel):
     message: str
     project_id: int
+    document_ids: Optional[List[int]] = None  # Only retrieve from these documents; None searches the whole project
 
 class ChatMessageResponse(BaseModel):
     id: int
@@ -57,6 +58,14 @@ class FileUploadResponse(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     sources: List[dict] = []
+
+class ChatBatchRequest(BaseModel):
+    messages: List[str]
+    project_id: int
+    document_ids: Optional[List[int]] = None
+
+class ChatBatchResponse(BaseModel):
+    responses: List[ChatResponse]
     
 # Project with documents
 class ProjectWithDocuments(ProjectResponse):
@@ -95,6 +104,7 @@ class GenerateRequest(BaseModel):
     user_prompt: str
     context_documents: Optional[List[str]] = None
     user_preferences: Optional[dict] = None
+    document_ids: Optional[List[int]] = None
 
 class GenerateResponse(BaseModel):
     success: bool
@@ -103,4 +113,16 @@ class GenerateResponse(BaseModel):
     content: str
     audience_versions: Optional[dict] = {}
     metadata: dict
-    processing_info: dict 
\ No newline at end of file
+    processing_info: dict 
+
+# Snapshot schemas
+class SnapshotCreateRequest(BaseModel):
+    name: Optional[str] = None  # Defaults to a UTC timestamp
+    project_ids: Optional[List[int]] = None  # Defaults to every project
+
+class CompactionRequest(BaseModel):
+    project_ids: Optional[List[int]] = None  # Defaults to every project
+    force: bool = False  # Compact any project with deleted rows, not just those over the threshold
+
+class SnapshotRestoreRequest(BaseModel):
+    name: str
@@ -0,0 +1,89 @@
+"""
+Batching - a worker thread that coalesces concurrent requests
+
+Callers submit items and wait on their futures; the worker gathers queued
+items until max_size units are waiting or max_wait_ms after the first one
+arrived, whichever comes first, and hands them to one process(batch) call.
+Used by the vector writer (rows per backend write) and the embedding server
+(texts per model call).
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+class BatchItem:
+    """A queued request; size counts towards max_size and future carries its result"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.future = Future()
+
+class Batcher:
+    """Runs process(batch) on a worker thread for batches of submitted items
+
+    process must resolve the future of every item it is given.
+    """
+
+    def __init__(self, process: Callable[[List[BatchItem]], None], max_size: int, max_wait_ms: float,
+                 name: str = "batcher", closed_message: str = "Batcher is shutting down"):
+        self.process = process
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self.closed_message = closed_message
+        self._closed = False
+        self._queue: "queue.Queue[Optional[BatchItem]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: BatchItem) -> Future:
+        if self._closed:
+            raise RuntimeError(self.closed_message)
+        self._queue.put(item)
+        return item.future
+
+    def _collect(self, first: BatchItem) -> List[BatchItem]:
+        batch = [first]
+        size = first.size
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Process what was gathered, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+            size += item.size
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                # Fail items that slipped in while closing instead of leaving them waiting
+                while not self._queue.empty():
+                    item = self._queue.get()
+                    if item is not None:
+                        item.future.set_exception(RuntimeError(self.closed_message))
+                return
+            batch = self._collect(first)
+            try:
+                self.process(batch)
+            except Exception as e:
+                # Don't let a processing bug kill the worker and strand its callers
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
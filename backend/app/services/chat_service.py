@@ -6,22 +6,46 @@ from app.services.vector_store import VectorStore
 from app.db.database import SessionLocal
 from app.db.models import GeneratedDocument
 
+def create_anthropic_client() -> Optional[Anthropic]:
+    """Create the Claude (Anthropic) client if an API key is configured"""
+    if not settings.anthropic_api_key:
+        return None
+    client = Anthropic(api_key=settings.anthropic_api_key)
+    print("Claude API initialized")
+    return client
+
+def create_gemini_model():
+    """Configure Gemini and create the fallback model if an API key is configured"""
+    if not settings.gemini_api_key:
+        return None
+    genai.configure(api_key=settings.gemini_api_key)
+    model = genai.GenerativeModel('gemini-1.5-flash')
+    print("Gemini API initialized")
+    return model
+
+# Retrieval queries used when a generation request has no user prompt
+GENERATION_QUERIES = {
+    "mvp": "Generate MVP plan based on project requirements",
+    "prd": "Generate PRD based on project requirements",
+    "rfp": "Generate RFP based on project scope"
+}
+
 class ChatService:
-    def __init__(self):
+    def __init__(self,
+                 vector_store: Optional[VectorStore] = None,
+                 anthropic_client: Optional[Anthropic] = None,
+                 gemini_model=None):
         self.ai_provider = settings.ai_provider
-        self.anthropic_client = None
-        self.gemini_model = None
         
-        # Configure Claude (Anthropic) API
-        if settings.anthropic_api_key:
-            self.anthropic_client = Anthropic(api_key=settings.anthropic_api_key)
-            print("Claude API initialized")
+        # Without explicit dependencies, borrow the process-wide instances
+        if vector_store is None and anthropic_client is None and gemini_model is None:
+            from app.services.container import container
+            vector_store = container.vector_store
+            anthropic_client = container.anthropic_client
+            gemini_model = container.gemini_model
         
-        # Configure Gemini API (fallback)
-        if settings.gemini_api_key:
-            genai.configure(api_key=settings.gemini_api_key)
-            self.gemini_model = genai.GenerativeModel('gemini-1.5-flash')
-            print("Gemini API initialized")
+        self.anthropic_client = anthropic_client
+        self.gemini_model = gemini_model
         
         # Determine which model to use
         if self.ai_provider == "claude" and self.anthropic_client:
@@ -36,8 +60,7 @@ class ChatService:
             self.model_type = None
             print("Warning: No AI API keys configured")
         
-        # Initialize vector store
-        self.vector_store = VectorStore()
+        self.vector_store = vector_store or VectorStore()
     
     def create_context_from_chunks(self, chunks: List[Dict]) -> str:
         """Create context string from retrieved chunks"""
@@ -101,8 +124,10 @@ ANSWER:"""
     async def chat_with_documents(self, 
                                   query: str, 
                                   project_id: int,
-                                  chat_history: Optional[List[Dict]] = None) -> Dict:
-        """Main chat function using RAG"""
+                                  chat_history: Optional[List[Dict]] = None,
+                                  relevant_chunks: Optional[List[Dict]] = None,
+                                  document_ids: Optional[List[int]] = None) -> Dict:
+        """Main chat function using RAG (pass relevant_chunks if retrieval already ran)"""
         
         if not self.model_type:
             return {
@@ -112,47 +137,96 @@ ANSWER:"""
         
         try:
             # Search for relevant chunks
-            relevant_chunks = self.vector_store.search_similar_chunks(
-                query=query,
-                project_id=project_id,
-                n_results=8 if self.model_type == "claude" else 5  # Claude can handle more context
-            )
-            
-            if not relevant_chunks:
-                return {
-                    "response": "I don't have any documents to reference for this project. Please upload some documents first.",
-                    "sources": []
-                }
-            
-            # Create context from chunks
-            context = self.create_context_from_chunks(relevant_chunks)
-            
-            # Generate response based on AI provider
-            if self.model_type == "claude":
-                response_text = await self._generate_claude_response(query, context, chat_history)
-            else:
-                response_text = await self._generate_gemini_response(query, context, chat_history)
-            
-            # Prepare sources for frontend
-            sources = []
-            for chunk in relevant_chunks:
-                sources.append({
-                    "document_id": chunk['metadata'].get('document_id'),
-                    "chunk_index": chunk['metadata'].get('chunk_index'),
-                    "content_preview": chunk['content'][:200] + "..." if len(chunk['content']) > 200 else chunk['content'],
-                    "distance": chunk.get('distance')
-                })
-            
-            return {
-                "response": response_text,
-                "sources": sources
-            }
+            if relevant_chunks is None:
+                relevant_chunks = await self.vector_store.asearch(
+                    query=query,
+                    project_id=project_id,
+                    n_results=self.chat_n_results(),
+                    document_ids=document_ids
+                )
+            return await self._answer_from_chunks(query, relevant_chunks, chat_history)
             
         except Exception as e:
+            return self.error_response(e)
+    
+    async def chat_with_documents_batch(self,
+                                        queries: List[str],
+                                        project_id: int,
+                                        chat_history: Optional[List[Dict]] = None,
+                                        relevant_chunks: Optional[List[List[Dict]]] = None,
+                                        document_ids: Optional[List[int]] = None) -> List[Dict]:
+        """Answer several questions, retrieving context for all of them in one batch
+
+        relevant_chunks holds one result list per query if retrieval already ran.
+        """
+        
+        if not self.model_type:
+            return [{
+                "response": "Sorry, the AI service is not configured. Please check your API keys.",
+                "sources": []
+            } for _ in queries]
+        
+        if relevant_chunks is None:
+            try:
+                search = await self.vector_store.asearch_many(
+                    queries, project_id=project_id, n_results=self.chat_n_results(), document_ids=document_ids
+                )
+            except Exception as e:
+                return [self.error_response(e) for _ in queries]
+            relevant_chunks = search["results"]
+        
+        responses = []
+        for query, chunks in zip(queries, relevant_chunks):
+            try:
+                responses.append(await self._answer_from_chunks(query, chunks, chat_history))
+            except Exception as e:
+                responses.append(self.error_response(e))
+        return responses
+    
+    def error_response(self, error: Exception) -> Dict:
+        """Chat answer reporting a failure instead of raising it"""
+        return {
+            "response": f"Sorry, I encountered an error: {str(error)}",
+            "sources": []
+        }
+    
+    def chat_n_results(self) -> int:
+        """Number of chunks retrieved as context for a chat answer"""
+        return 8 if self.model_type == "claude" else 5  # Claude can handle more context
+    
+    async def _answer_from_chunks(self, query: str, relevant_chunks: List[Dict],
+                                  chat_history: Optional[List[Dict]] = None) -> Dict:
+        """Generate a RAG answer from already retrieved chunks"""
+        if not relevant_chunks:
             return {
-                "response": f"Sorry, I encountered an error: {str(e)}",
+                "response": "I don't have any documents to reference for this project. Please upload some documents first.",
                 "sources": []
             }
+        
+        # Create context from chunks
+        context = self.create_context_from_chunks(relevant_chunks)
+        
+        # Generate response based on AI provider
+        if self.model_type == "claude":
+            response_text = await self._generate_claude_response(query, context, chat_history)
+        else:
+            response_text = await self._generate_gemini_response(query, context, chat_history)
+        
+        # Prepare sources for frontend
+        sources = []
+        for chunk in relevant_chunks:
+            sources.append({
+                "document_id": chunk['metadata'].get('document_id'),
+                "chunk_index": chunk['metadata'].get('chunk_index'),
+                "content_preview": chunk['content'][:200] + "..." if len(chunk['content']) > 200 else chunk['content'],
+                "distance": chunk.get('distance'),
+                "duplicate_document_ids": chunk.get('duplicate_document_ids', [])
+            })
+        
+        return {
+            "response": response_text,
+            "sources": sources
+        }
     
     async def _generate_claude_response(self, query: str, context: str, chat_history: Optional[List[Dict]] = None) -> str:
         """Generate response using Claude with fallback handling"""
@@ -327,10 +401,11 @@ What would you like to work on today?"""
         
         try:
             # Get all chunks for the project (limit to avoid token limits)
-            all_chunks = self.vector_store.search_similar_chunks(
+            all_chunks = await self.vector_store.asearch(
                 query="summary overview main points key findings",  # Generic query to get diverse content
                 project_id=project_id,
-                n_results=15 if self.model_type == "claude" else 10  # Claude can handle more context
+                n_results=self._generation_n_results(),
+                mmr_lambda=settings.generation_mmr_lambda
             )
             
             if not all_chunks:
@@ -418,18 +493,46 @@ Summary:"""
         finally:
             db.close()
 
-    async def generate_mvp(self, project_id: int, user_prompt: str = "") -> str:
+    def _generation_n_results(self) -> int:
+        return 15 if self.model_type == "claude" else 10  # Claude can handle more context
+    
+    async def generate_core_documents(self, project_id: int, user_prompt: str = "",
+                                      document_ids: Optional[List[int]] = None) -> Dict[str, str]:
+        """Generate the MVP, PRD and RFP with a single batched retrieval"""
+        if not self.model_type:
+            return {kind: "AI service not configured." for kind in ("mvp", "prd", "rfp")}
+        
+        kinds = ["mvp", "prd", "rfp"]
+        search = await self.vector_store.asearch_many(
+            [user_prompt or GENERATION_QUERIES[kind] for kind in kinds],
+            project_id=project_id,
+            n_results=self._generation_n_results(),
+            mmr_lambda=settings.generation_mmr_lambda,
+            document_ids=document_ids
+        )
+        chunks = dict(zip(kinds, search["results"]))
+        
+        return {
+            "mvp": await self.generate_mvp(project_id, user_prompt, chunks=chunks["mvp"]),
+            "prd": await self.generate_prd(project_id, user_prompt, chunks=chunks["prd"]),
+            "rfp": await self.generate_rfp(project_id, user_prompt, chunks=chunks["rfp"])
+        }
+    
+    async def generate_mvp(self, project_id: int, user_prompt: str = "", chunks: Optional[List[Dict]] = None,
+                           document_ids: Optional[List[int]] = None) -> str:
         """Generate a Minimum Viable Product plan based on project documents"""
         if not self.model_type:
             return "AI service not configured."
         
-        # Retrieve relevant chunks from vector store
-        n_results = 15 if self.model_type == "claude" else 10
-        chunks = self.vector_store.search_similar_chunks(
-            project_id=project_id, 
-            query=user_prompt or "Generate MVP plan based on project requirements", 
-            n_results=n_results
-        )
+        # Retrieve relevant chunks from vector store unless the caller already did
+        if chunks is None:
+            chunks = await self.vector_store.asearch(
+                project_id=project_id, 
+                query=user_prompt or GENERATION_QUERIES["mvp"], 
+                n_results=self._generation_n_results(),
+                mmr_lambda=settings.generation_mmr_lambda,
+                document_ids=document_ids
+            )
         
         context = self._format_chunks_for_context_with_sources(chunks)
         
@@ -473,18 +576,21 @@ Keep the plan actionable, realistic, and grounded in the provided context."""
         self._save_generated_document(project_id, "mvp", "MVP Plan", content)
         return content
     
-    async def generate_prd(self, project_id: int, user_prompt: str = "") -> str:
+    async def generate_prd(self, project_id: int, user_prompt: str = "", chunks: Optional[List[Dict]] = None,
+                           document_ids: Optional[List[int]] = None) -> str:
         """Generate a Product Requirements Document based on project documents"""
         if not self.model_type:
             return "AI service not configured."
         
-        # Retrieve relevant chunks from vector store
-        n_results = 15 if self.model_type == "claude" else 10
-        chunks = self.vector_store.search_similar_chunks(
-            project_id=project_id, 
-            query=user_prompt or "Generate PRD based on project requirements", 
-            n_results=n_results
-        )
+        # Retrieve relevant chunks from vector store unless the caller already did
+        if chunks is None:
+            chunks = await self.vector_store.asearch(
+                project_id=project_id, 
+                query=user_prompt or GENERATION_QUERIES["prd"], 
+                n_results=self._generation_n_results(),
+                mmr_lambda=settings.generation_mmr_lambda,
+                document_ids=document_ids
+            )
         
         context = self._format_chunks_for_context_with_sources(chunks)
         
@@ -539,18 +645,21 @@ Make it detailed, professional, and actionable for a development team."""
         self._save_generated_document(project_id, "prd", "Product Requirements Document", content)
         return content
     
-    async def generate_rfp(self, project_id: int, user_prompt: str = "") -> str:
+    async def generate_rfp(self, project_id: int, user_prompt: str = "", chunks: Optional[List[Dict]] = None,
+                           document_ids: Optional[List[int]] = None) -> str:
         """Generate a Request for Proposal document based on project documents"""
         if not self.model_type:
             return "AI service not configured."
         
-        # Retrieve relevant chunks from vector store
-        n_results = 15 if self.model_type == "claude" else 10
-        chunks = self.vector_store.search_similar_chunks(
-            project_id=project_id, 
-            query=user_prompt or "Generate RFP based on project scope", 
-            n_results=n_results
-        )
+        # Retrieve relevant chunks from vector store unless the caller already did
+        if chunks is None:
+            chunks = await self.vector_store.asearch(
+                project_id=project_id, 
+                query=user_prompt or GENERATION_QUERIES["rfp"], 
+                n_results=self._generation_n_results(),
+                mmr_lambda=settings.generation_mmr_lambda,
+                document_ids=document_ids
+            )
         
         context = self._format_chunks_for_context_with_sources(chunks)
         
@@ -615,17 +724,19 @@ Make it professional, comprehensive, and suitable for vendor evaluation."""
         self._save_generated_document(project_id, "rfp", "Request for Proposal", content)
         return content
     
-    async def generate_business_case(self, project_id: int, user_prompt: str = "") -> str:
+    async def generate_business_case(self, project_id: int, user_prompt: str = "",
+                                     document_ids: Optional[List[int]] = None) -> str:
         """Generate a Business Case document based on project documents"""
         if not self.model_type:
             return "AI service not configured."
         
         # Retrieve relevant chunks from vector store
-        n_results = 15 if self.model_type == "claude" else 10
-        chunks = self.vector_store.search_similar_chunks(
+        chunks = await self.vector_store.asearch(
             project_id=project_id, 
             query=user_prompt or "Generate business case based on project analysis", 
-            n_results=n_results
+            n_results=self._generation_n_results(),
+            mmr_lambda=settings.generation_mmr_lambda,
+            document_ids=document_ids
         )
         
         context = self._format_chunks_for_context_with_sources(chunks)
@@ -697,17 +808,19 @@ Make it compelling for executive decision-making with clear financial justificat
         self._save_generated_document(project_id, "business_case", "Business Case", content)
         return content
     
-    async def generate_user_personas(self, project_id: int, user_prompt: str = "") -> str:
+    async def generate_user_personas(self, project_id: int, user_prompt: str = "",
+                                     document_ids: Optional[List[int]] = None) -> str:
         """Generate User Personas document based on project documents"""
         if not self.model_type:
             return "AI service not configured."
         
         # Retrieve relevant chunks from vector store
-        n_results = 15 if self.model_type == "claude" else 10
-        chunks = self.vector_store.search_similar_chunks(
+        chunks = await self.vector_store.asearch(
             project_id=project_id, 
             query=user_prompt or "Generate user personas based on user research and analysis", 
-            n_results=n_results
+            n_results=self._generation_n_results(),
+            mmr_lambda=settings.generation_mmr_lambda,
+            document_ids=document_ids
         )
         
         context = self._format_chunks_for_context_with_sources(chunks)
@@ -783,17 +896,19 @@ Make each persona realistic and actionable for product development decisions."""
         self._save_generated_document(project_id, "user_personas", "User Personas", content)
         return content
     
-    async def generate_gtm_strategy(self, project_id: int, user_prompt: str = "") -> str:
+    async def generate_gtm_strategy(self, project_id: int, user_prompt: str = "",
+                                    document_ids: Optional[List[int]] = None) -> str:
         """Generate Go-to-Market Strategy document based on project documents"""
         if not self.model_type:
             return "AI service not configured."
         
         # Retrieve relevant chunks from vector store
-        n_results = 15 if self.model_type == "claude" else 10
-        chunks = self.vector_store.search_similar_chunks(
+        chunks = await self.vector_store.asearch(
             project_id=project_id, 
             query=user_prompt or "Generate go-to-market strategy based on market analysis", 
-            n_results=n_results
+            n_results=self._generation_n_results(),
+            mmr_lambda=settings.generation_mmr_lambda,
+            document_ids=document_ids
         )
         
         context = self._format_chunks_for_context_with_sources(chunks)
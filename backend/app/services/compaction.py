@@ -0,0 +1,187 @@
+"""
+Compaction - rebuilds vector indexes that deletes have filled with tombstones
+
+Deleting from a Chroma collection only marks rows deleted in its HNSW
+graph, so disk use and search latency keep growing on projects with a lot
+of churn. Rows deleted from each project's collection are counted in the
+vector_index_churn table; once they pass VECTOR_COMPACTION_THRESHOLD of the
+index, the compactor rebuilds the collection as a shadow copy and swaps it
+in (see ChromaBackend.rebuild_project), so reads and writes never stop.
+NumPy projects already compact themselves on delete; the compactor catches
+any left over the threshold.
+
+Every API process runs the compactor every VECTOR_COMPACTION_INTERVAL_SECONDS;
+a lease in the same table keeps two of them from compacting one project. The
+lease is renewed between the batches of a rebuild, which stops if it was lost.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import VectorIndexChurn
+from app.services import leases
+
+def record_deleted(project_id: int, rows: int):
+    """Count rows deleted from a project's index since it was last built"""
+    db = SessionLocal()
+    try:
+        updated = db.query(VectorIndexChurn).filter(VectorIndexChurn.project_id == project_id).update(
+            {VectorIndexChurn.deleted_rows: VectorIndexChurn.deleted_rows + rows},
+            synchronize_session=False
+        )
+        if not updated:
+            db.add(VectorIndexChurn(project_id=project_id, deleted_rows=rows))
+        db.commit()
+    except IntegrityError:
+        # Another process created the row first
+        db.rollback()
+        db.query(VectorIndexChurn).filter(VectorIndexChurn.project_id == project_id).update(
+            {VectorIndexChurn.deleted_rows: VectorIndexChurn.deleted_rows + rows},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def deleted_rows(project_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(VectorIndexChurn.deleted_rows).filter(VectorIndexChurn.project_id == project_id).scalar() or 0
+    finally:
+        db.close()
+
+def mark_rebuilt(project_id: int):
+    """A project's index was just built from live rows only"""
+    db = SessionLocal()
+    try:
+        db.query(VectorIndexChurn).filter(VectorIndexChurn.project_id == project_id).update(
+            {VectorIndexChurn.deleted_rows: 0, VectorIndexChurn.compacted_at: func.now()},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def forget(project_id: int):
+    db = SessionLocal()
+    try:
+        db.query(VectorIndexChurn).filter(VectorIndexChurn.project_id == project_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def claim(project_id: int, lease_seconds: float = None) -> Optional[float]:
+    """Take the compaction lease of a project; returns its expiry, or None if another process holds it"""
+    db = SessionLocal()
+    try:
+        if db.query(VectorIndexChurn.project_id).filter(VectorIndexChurn.project_id == project_id).first() is None:
+            db.add(VectorIndexChurn(project_id=project_id, deleted_rows=0))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+        return leases.claim(db, VectorIndexChurn, project_id, lease_seconds or settings.vector_compaction_lease_seconds)
+    finally:
+        db.close()
+
+def release(project_id: int):
+    leases.release(VectorIndexChurn, project_id)
+
+class LeaseRenewal:
+    """Keeps a claimed compaction lease alive; call it between batches of long work
+
+    Renews once half the lease has run out, and raises if another process
+    took the project meanwhile, so the work stops before it clashes.
+    """
+
+    def __init__(self, project_id: int, expires_at: float, lease_seconds: float = None):
+        self.project_id = project_id
+        self.expires_at = expires_at
+        self.lease_seconds = lease_seconds or settings.vector_compaction_lease_seconds
+
+    def __call__(self):
+        if time.time() < self.expires_at - self.lease_seconds / 2:
+            return
+        renewed = leases.renew(VectorIndexChurn, self.project_id, self.expires_at, self.lease_seconds)
+        if renewed is None:
+            raise RuntimeError(f"Lost the compaction lease of project {self.project_id}")
+        self.expires_at = renewed
+
+class VectorCompactor:
+    """Finds projects over the deleted-row threshold and compacts them, on demand or on a schedule"""
+
+    def __init__(self, vector_store, threshold: float = None, interval_seconds: float = None):
+        self.vector_store = vector_store
+        self.threshold = threshold if threshold is not None else settings.vector_compaction_threshold
+        self.interval_seconds = (
+            interval_seconds if interval_seconds is not None else settings.vector_compaction_interval_seconds
+        )
+        self.last_run: Optional[Dict] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def candidates(self, project_ids: Optional[List[int]] = None, force: bool = False) -> List[Dict]:
+        """Projects due for compaction; with force, every project with any deleted rows"""
+        due = []
+        for project_id in project_ids if project_ids is not None else self.vector_store.list_projects():
+            fraction = self.vector_store.deleted_fraction(project_id)
+            if fraction > 0 and (force or fraction >= self.threshold):
+                due.append({"project_id": project_id, "deleted_fraction": round(float(fraction), 4)})
+        return due
+
+    def run_once(self, project_ids: Optional[List[int]] = None, force: bool = False) -> Dict:
+        """Compact every due project; returns per-project reports and the total space reclaimed"""
+        started = time.time()
+        reports = []
+        for candidate in self.candidates(project_ids, force):
+            project_id = candidate["project_id"]
+            expires_at = claim(project_id)
+            if expires_at is None:
+                continue
+            try:
+                report = self.vector_store.compact_project(project_id, keep_lease=LeaseRenewal(project_id, expires_at))
+            except Exception as e:
+                print(f"Error compacting project {project_id}: {str(e)}")
+                reports.append(dict(candidate, error=str(e)))
+                continue
+            finally:
+                release(project_id)
+            report["deleted_fraction"] = candidate["deleted_fraction"]
+            print(f"Compacted project {project_id} ({report['backend']}): {report['rows_removed']} deleted rows dropped, "
+                  f"{report['bytes_reclaimed'] if report['bytes_reclaimed'] is not None else 'unknown'} bytes reclaimed")
+            reports.append(report)
+
+        self.last_run = {
+            "started_at": started,
+            "duration_seconds": round(time.time() - started, 3),
+            "projects": reports,
+            "bytes_reclaimed": sum(report.get("bytes_reclaimed") or 0 for report in reports)
+        }
+        return self.last_run
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error in scheduled vector compaction: {str(e)}")
+
+    def start(self):
+        """Compact due projects every interval_seconds in a background thread"""
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="vector-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,238 @@
+"""
+Service Container - process-wide holder for expensive service dependencies
+
+The embedding model, the ChromaDB client, the LLM clients and the export
+service are built once per process and shared by every request. Routes get
+them through the FastAPI dependencies at the bottom of this module.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.services.chat_service import ChatService, create_anthropic_client, create_gemini_model
+from app.services.compaction import VectorCompactor
+from app.services.embedding_cache import create_embedding_cache
+from app.services.embedding_spaces import EmbeddingMigrator, register_spaces
+from app.services.export_service import DocumentExportService
+from app.services.ingestion import IngestionEngine
+from app.services.lexical_index import LexicalIndex
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.vector_backends import create_chroma_client
+from app.services.vector_codec import VectorCodec
+from app.services.vector_store import CustomEmbeddingFunction, VectorStore
+from app.core.config import settings
+
+class ServiceContainer:
+    """Lazily builds and caches shared services, recording how long each took"""
+
+    # Components in dependency order, used for warm-up and status reporting
+    COMPONENTS = [
+        "embedding_function",
+        "chroma_client",
+        "lexical_index",
+        "near_duplicate_index",
+        "vector_store",
+        "vector_compactor",
+        "embedding_migrator",
+        "anthropic_client",
+        "gemini_model",
+        "export_service",
+        "chat_service",
+        "ingestion_engine",
+    ]
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._components: Dict[str, Any] = {}
+        self.init_timings: Dict[str, float] = {}
+        self.warmed_at: Optional[float] = None
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """Return a component, building it on first use"""
+        if name in self._components:
+            return self._components[name]
+
+        with self._lock:
+            if name not in self._components:
+                start = time.perf_counter()
+                self._components[name] = factory()
+                self.init_timings[name] = round((time.perf_counter() - start) * 1000, 2)
+        return self._components[name]
+
+    @property
+    def embedding_function(self) -> CustomEmbeddingFunction:
+        return self._get("embedding_function", lambda: CustomEmbeddingFunction(
+            settings.embedding_model,
+            cache=create_embedding_cache()
+        ))
+
+    @property
+    def chroma_client(self):
+        return self._get("chroma_client", create_chroma_client)
+
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        return self._get("lexical_index", LexicalIndex)
+
+    @property
+    def near_duplicate_index(self) -> NearDuplicateIndex:
+        return self._get("near_duplicate_index", NearDuplicateIndex)
+
+    @property
+    def vector_store(self) -> VectorStore:
+        return self._get("vector_store", lambda: VectorStore(
+            client=self.chroma_client if self._uses_default_chroma_client else None,
+            embedding_function=self.embedding_function,
+            lexical_index=self.lexical_index,
+            near_duplicate_index=self.near_duplicate_index,
+            migration_target=self._create_migration_target()
+        ))
+
+    def _create_migration_target(self) -> Optional[VectorStore]:
+        """Store for EMBEDDING_MIGRATION_TARGET's space, if a model migration is running"""
+        target = settings.embedding_migration_target
+        if not target or target == settings.embedding_model:
+            return None
+        if settings.vector_pca_dimensions or settings.vector_storage_dtype != "float32":
+            raise ValueError("EMBEDDING_MIGRATION_TARGET needs VECTOR_STORAGE_DTYPE=float32 and VECTOR_PCA_DIMENSIONS=0")
+        if settings.embedding_backend == "server":
+            # The embedding server only serves EMBEDDING_MODEL, so the target space would get its vectors
+            raise ValueError("EMBEDDING_MIGRATION_TARGET can't be used with EMBEDDING_BACKEND=server; "
+                             "run the migration with the torch or onnx backend")
+        # The target store is built before the live one, which must not lose the original storage to it
+        register_spaces(settings.embedding_model, target)
+        return VectorStore(
+            client=self.chroma_client if self._uses_default_chroma_client else None,
+            embedding_function=CustomEmbeddingFunction(target, cache=self.embedding_function.cache),
+            codec=VectorCodec(),
+            lexical_index=self.lexical_index,
+            near_duplicate_index=self.near_duplicate_index
+        )
+
+    @property
+    def embedding_migrator(self) -> EmbeddingMigrator:
+        return self._get("embedding_migrator", lambda: EmbeddingMigrator(self.vector_store))
+
+    @property
+    def vector_compactor(self) -> VectorCompactor:
+        return self._get("vector_compactor", lambda: VectorCompactor(self.vector_store))
+
+    @property
+    def anthropic_client(self):
+        return self._get("anthropic_client", create_anthropic_client)
+
+    @property
+    def gemini_model(self):
+        return self._get("gemini_model", create_gemini_model)
+
+    @property
+    def export_service(self) -> DocumentExportService:
+        return self._get("export_service", DocumentExportService)
+
+    @property
+    def chat_service(self) -> ChatService:
+        return self._get("chat_service", lambda: ChatService(
+            vector_store=self.vector_store,
+            anthropic_client=self.anthropic_client,
+            gemini_model=self.gemini_model
+        ))
+
+    @property
+    def ingestion_engine(self) -> IngestionEngine:
+        return self._get("ingestion_engine", IngestionEngine)
+
+    @property
+    def _uses_default_chroma_client(self) -> bool:
+        # Shards bring their own clients
+        return settings.vector_backend != "numpy" and not settings.vector_shards
+
+    @property
+    def required_components(self):
+        """Components used by the current configuration"""
+        if not self._uses_default_chroma_client:
+            return [name for name in self.COMPONENTS if name != "chroma_client"]
+        return self.COMPONENTS
+
+    @property
+    def is_warm(self) -> bool:
+        """True once every required component has been built"""
+        return all(name in self._components for name in self.required_components)
+
+    def warm_up(self):
+        """Build every component up front so the first request doesn't pay for it"""
+        for name in self.required_components:
+            getattr(self, name)
+        self.warmed_at = time.time()
+
+    def shutdown(self):
+        """Drop all components so they can be garbage collected"""
+        with self._lock:
+            vector_compactor = self._components.get("vector_compactor")
+            if vector_compactor is not None:
+                vector_compactor.stop()
+            embedding_migrator = self._components.get("embedding_migrator")
+            if embedding_migrator is not None:
+                embedding_migrator.stop()
+            vector_store = self._components.get("vector_store")
+            if vector_store is not None:
+                vector_store.close()
+            ingestion_engine = self._components.get("ingestion_engine")
+            if ingestion_engine is not None:
+                ingestion_engine.close()
+            embedding_function = self._components.get("embedding_function")
+            if embedding_function is not None and embedding_function.cache is not None:
+                embedding_function.cache.close()
+            self._components.clear()
+            self.init_timings.clear()
+            self.warmed_at = None
+
+    def status(self) -> Dict[str, Any]:
+        """Warm/cold state, per-component init timings in milliseconds and cache counters"""
+        vector_store = self._components.get("vector_store")
+        ingestion_engine = self._components.get("ingestion_engine")
+        return {
+            "state": "warm" if self.is_warm else "cold",
+            "warmed_at": self.warmed_at,
+            "components": {
+                name: {
+                    "initialized": name in self._components,
+                    "init_ms": self.init_timings.get(name)
+                }
+                for name in self.COMPONENTS
+            },
+            "caches": vector_store.cache_stats() if vector_store is not None else None,
+            "vector_writes": vector_store.writer.stats() if vector_store is not None and vector_store.writer else None,
+            "ingestion": ingestion_engine.stats() if ingestion_engine is not None else None
+        }
+
+container = ServiceContainer()
+
+# FastAPI dependencies
+
+def get_container() -> ServiceContainer:
+    return container
+
+def get_vector_store() -> VectorStore:
+    return container.vector_store
+
+def get_vector_compactor() -> VectorCompactor:
+    return container.vector_compactor
+
+def get_embedding_migrator() -> EmbeddingMigrator:
+    return container.embedding_migrator
+
+def get_lexical_index() -> LexicalIndex:
+    return container.lexical_index
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    return container.near_duplicate_index
+
+def get_ingestion_engine() -> IngestionEngine:
+    return container.ingestion_engine
+
+def get_chat_service() -> ChatService:
+    return container.chat_service
+
+def get_export_service() -> DocumentExportService:
+    return container.export_service
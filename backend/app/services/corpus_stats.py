@@ -0,0 +1,196 @@
+"""
+Corpus Stats - incrementally maintained document and chunk counters
+
+Counters are updated inside the same transaction that uploads, ingests or
+deletes the underlying rows, so reading project or document stats is a
+primary-key lookup instead of a scan of the vector store.
+
+Each project also has a corpus version, bumped after every change to its
+indexed content; retrieval results are cached per version. Each process
+keeps the versions it reads for CORPUS_VERSION_REFRESH_SECONDS, and drops a
+project's as soon as it commits a bump of its own.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import Document, DocumentChunk, DocumentCorpusStats, ProjectCorpusStats, ProjectCorpusVersion
+
+def _project_stats(db: Session, project_id: int) -> ProjectCorpusStats:
+    stats = db.query(ProjectCorpusStats).filter(ProjectCorpusStats.project_id == project_id).with_for_update().first()
+    if stats is None:
+        stats = ProjectCorpusStats(project_id=project_id, document_count=0, chunk_count=0)
+        db.add(stats)
+    return stats
+
+def lock_project(db: Session, project_id: int):
+    """Serialize writers of a project's indexes until the caller's transaction ends
+
+    Locks the project's counter row. The no-op UPDATE is a row lock on
+    PostgreSQL and takes the database write lock on SQLite, where FOR UPDATE
+    is ignored, so the lock holds across processes on both.
+    """
+    locked = db.query(ProjectCorpusStats).filter(ProjectCorpusStats.project_id == project_id).update(
+        {ProjectCorpusStats.document_count: ProjectCorpusStats.document_count},
+        synchronize_session=False
+    )
+    if not locked:
+        db.add(ProjectCorpusStats(project_id=project_id, document_count=0, chunk_count=0))
+        db.flush()
+
+def record_document_added(db: Session, project_id: int):
+    """Count a newly uploaded document"""
+    stats = _project_stats(db, project_id)
+    stats.document_count = (stats.document_count or 0) + 1
+
+def record_chunks_ingested(db: Session, project_id: int, document_id: int, chunk_count: int):
+    """Count the chunks stored for a processed document"""
+    stats = _project_stats(db, project_id)
+    stats.chunk_count = (stats.chunk_count or 0) + chunk_count
+
+    document_stats = db.query(DocumentCorpusStats).filter(DocumentCorpusStats.document_id == document_id).first()
+    if document_stats is None:
+        db.add(DocumentCorpusStats(document_id=document_id, project_id=project_id, chunk_count=chunk_count))
+    else:
+        document_stats.chunk_count = (document_stats.chunk_count or 0) + chunk_count
+
+def record_document_deleted(db: Session, project_id: int, document_id: int):
+    """Remove a document and its chunks from the counters"""
+    document_stats = db.query(DocumentCorpusStats).filter(DocumentCorpusStats.document_id == document_id).first()
+    chunk_count = document_stats.chunk_count if document_stats else 0
+    if document_stats is not None:
+        db.delete(document_stats)
+
+    stats = _project_stats(db, project_id)
+    stats.document_count = max(0, (stats.document_count or 0) - 1)
+    stats.chunk_count = max(0, (stats.chunk_count or 0) - chunk_count)
+
+def record_project_deleted(db: Session, project_id: int):
+    db.query(DocumentCorpusStats).filter(DocumentCorpusStats.project_id == project_id).delete(synchronize_session=False)
+    db.query(ProjectCorpusStats).filter(ProjectCorpusStats.project_id == project_id).delete(synchronize_session=False)
+
+def bump_corpus_version(db: Session, project_id: int):
+    """Invalidate cached retrieval results for a project
+
+    Call once the vector and lexical indexes reflect the change, within the
+    transaction that commits it.
+    """
+    updated = db.query(ProjectCorpusVersion).filter(ProjectCorpusVersion.project_id == project_id).update(
+        {ProjectCorpusVersion.version: ProjectCorpusVersion.version + 1},
+        synchronize_session=False
+    )
+    if not updated:
+        db.add(ProjectCorpusVersion(project_id=project_id, version=1))
+        # Sessions don't autoflush; make the row visible to a second bump in this transaction
+        db.flush()
+    event.listen(db, "after_commit", lambda session: corpus_versions.invalidate(project_id), once=True)
+
+def get_corpus_version(db: Session, project_id: int) -> int:
+    row = db.query(ProjectCorpusVersion.version).filter(ProjectCorpusVersion.project_id == project_id).first()
+    return row[0] if row else 0
+
+class CorpusVersions:
+    """Corpus versions cached per process and re-read every refresh_seconds
+
+    Bumps committed by this process drop the project's entry right away;
+    those of other processes are seen within refresh_seconds.
+    """
+
+    def __init__(self, refresh_seconds: float = None):
+        self.refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None else settings.corpus_version_refresh_seconds
+        )
+        self._versions: Dict[int, Tuple[int, float]] = {}
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, project_id: int) -> int:
+        entry = self._versions.get(project_id)
+        if entry is not None and time.monotonic() - entry[1] < self.refresh_seconds:
+            return entry[0]
+        invalidations = self._invalidations
+        loaded_at = time.monotonic()
+        db = SessionLocal()
+        try:
+            version = get_corpus_version(db, project_id)
+        finally:
+            db.close()
+        with self._lock:
+            # A bump committed while reading may not be in what was read
+            if invalidations == self._invalidations:
+                self._versions[project_id] = (version, loaded_at)
+        return version
+
+    def invalidate(self, project_id: int):
+        with self._lock:
+            self._versions.pop(project_id, None)
+            self._invalidations += 1
+
+corpus_versions = CorpusVersions()
+
+def get_project_stats(db: Session, project_id: int) -> Dict:
+    stats = db.query(ProjectCorpusStats).filter(ProjectCorpusStats.project_id == project_id).first()
+    return {
+        "total_chunks": stats.chunk_count if stats else 0,
+        "total_documents": stats.document_count if stats else 0,
+        "project_id": project_id
+    }
+
+def get_document_stats(db: Session, document_id: int) -> Dict:
+    stats = db.query(DocumentCorpusStats).filter(DocumentCorpusStats.document_id == document_id).first()
+    return {
+        "total_chunks": stats.chunk_count if stats else 0,
+        "document_id": document_id
+    }
+
+def reconcile(db: Session, project_id: Optional[int] = None) -> Dict[int, Dict]:
+    """Recompute counters from the documents and document_chunks tables"""
+    document_query = db.query(Document.project_id, func.count(Document.id)).group_by(Document.project_id)
+    chunk_query = db.query(Document.project_id, Document.id, func.count(DocumentChunk.id)).join(
+        DocumentChunk, DocumentChunk.document_id == Document.id
+    ).group_by(Document.project_id, Document.id)
+    if project_id is not None:
+        document_query = document_query.filter(Document.project_id == project_id)
+        chunk_query = chunk_query.filter(Document.project_id == project_id)
+
+    documents_per_project = dict(document_query.all())
+    chunk_rows = chunk_query.all()
+
+    stale_project_stats = db.query(ProjectCorpusStats)
+    stale_document_stats = db.query(DocumentCorpusStats)
+    if project_id is not None:
+        stale_project_stats = stale_project_stats.filter(ProjectCorpusStats.project_id == project_id)
+        stale_document_stats = stale_document_stats.filter(DocumentCorpusStats.project_id == project_id)
+    previous = {
+        stats.project_id: {"total_documents": stats.document_count, "total_chunks": stats.chunk_count}
+        for stats in stale_project_stats.all()
+    }
+    stale_project_stats.delete(synchronize_session=False)
+    stale_document_stats.delete(synchronize_session=False)
+
+    chunks_per_project: Dict[int, int] = {}
+    for row_project_id, document_id, chunk_count in chunk_rows:
+        db.add(DocumentCorpusStats(document_id=document_id, project_id=row_project_id, chunk_count=chunk_count))
+        chunks_per_project[row_project_id] = chunks_per_project.get(row_project_id, 0) + chunk_count
+
+    report = {}
+    for row_project_id in set(documents_per_project) | set(chunks_per_project) | set(previous):
+        current = {
+            "total_documents": documents_per_project.get(row_project_id, 0),
+            "total_chunks": chunks_per_project.get(row_project_id, 0)
+        }
+        if row_project_id in documents_per_project or row_project_id in chunks_per_project:
+            db.add(ProjectCorpusStats(
+                project_id=row_project_id,
+                document_count=current["total_documents"],
+                chunk_count=current["total_chunks"]
+            ))
+        report[row_project_id] = {"previous": previous.get(row_project_id), "current": current}
+    db.commit()
+    return report
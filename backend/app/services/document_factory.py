@@ -21,16 +21,25 @@ class DocumentFactoryService:
     Core Workflow: Structured Input -> AI Processing (with Templates) -> Tailored Output -> Human Review
     """
     
-    def __init__(self):
-        self.chat_service = ChatService()
+    def __init__(self, chat_service: Optional[ChatService] = None):
+        self._chat_service = chat_service
         self.master_prompts = MasterPrompts()
+    
+    @property
+    def chat_service(self) -> ChatService:
+        """Shared chat service, resolved on first use so importing this module stays cheap"""
+        if self._chat_service is None:
+            from app.services.container import container
+            self._chat_service = container.chat_service
+        return self._chat_service
         
     async def process_document_request(self, 
                                      project_id: int,
                                      document_type: str, 
                                      raw_brief: str,
                                      context_documents: Optional[List[str]] = None,
-                                     user_preferences: Optional[Dict] = None) -> Dict[str, Any]:
+                                     user_preferences: Optional[Dict] = None,
+                                     document_ids: Optional[List[int]] = None) -> Dict[str, Any]:
         """
         Main factory method - processes raw input through the AI Document Factory
         
@@ -40,6 +49,7 @@ class DocumentFactoryService:
             raw_brief: Unstructured input from user (meeting notes, ideas, requirements)
             context_documents: Optional list of existing documents for context
             user_preferences: Optional preferences for output style, length, etc.
+            document_ids: Optional project documents to restrict retrieved context to
             
         Returns:
             Dict with generated document, metadata, and audience-specific versions
@@ -54,7 +64,7 @@ class DocumentFactoryService:
         
         try:
             # Step 1: Prepare context from existing documents
-            enhanced_context = await self._prepare_context(project_id, context_documents)
+            enhanced_context = await self._prepare_context(project_id, context_documents, document_ids)
             
             # Step 2: Get the appropriate master prompt
             master_prompt = self._get_master_prompt(document_type)
@@ -111,17 +121,19 @@ class DocumentFactoryService:
                 "document": None
             }
     
-    async def _prepare_context(self, project_id: int, context_documents: Optional[List[str]] = None) -> str:
+    async def _prepare_context(self, project_id: int, context_documents: Optional[List[str]] = None,
+                               document_ids: Optional[List[int]] = None) -> str:
         """Prepare contextual information from existing documents and vector store"""
         context_parts = []
         
         # Get relevant context from vector store
         if hasattr(self.chat_service, 'vector_store'):
             try:
-                relevant_chunks = self.chat_service.vector_store.search_similar_chunks(
+                relevant_chunks = await self.chat_service.vector_store.asearch(
                     query="project context requirements business goals user needs",
                     project_id=project_id,
-                    n_results=10
+                    n_results=10,
+                    document_ids=document_ids
                 )
                 
                 if relevant_chunks:
@@ -0,0 +1,107 @@
+"""
+Embedding Backends - interchangeable runtimes for the sentence embedding model
+
+Every backend exposes the subset of the SentenceTransformer API used by
+CustomEmbeddingFunction: encode() and get_sentence_embedding_dimension().
+
+- "torch": the PyTorch SentenceTransformer (default)
+- "onnx":  an ONNX export of the same model run with ONNX Runtime, optionally
+           int8-quantized; produce it with export_onnx_model.py
+- "server": a client for the shared embedding server (serve_embeddings.py),
+           which runs one of the above for every worker on the host
+"""
+
+import json
+import os
+from typing import List
+
+import numpy as np
+
+from app.core.config import settings
+
+def onnx_model_dir(model_name: str) -> str:
+    """Directory holding the ONNX export and tokenizer for a model"""
+    return os.path.join(settings.onnx_model_dir, model_name.replace("/", "__"))
+
+def onnx_model_file(model_name: str, quantized: bool) -> str:
+    return os.path.join(onnx_model_dir(model_name), "model.int8.onnx" if quantized else "model.onnx")
+
+class OnnxEmbeddingModel:
+    """Mean-pooled transformer embeddings computed with ONNX Runtime"""
+
+    def __init__(self, model_name: str, quantized: bool = True, num_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        directory = onnx_model_dir(model_name)
+        path = onnx_model_file(model_name, quantized)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"ONNX model not found at {path}. Run export_onnx_model.py first.")
+
+        with open(os.path.join(directory, "embedding_config.json")) as f:
+            config = json.load(f)
+        self.dimension = config["dimension"]
+        self.max_seq_length = config["max_seq_length"]
+        self.normalize = config["normalize"]
+
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.runtime = "onnx-int8" if quantized else "onnx"
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False) -> np.ndarray:
+        embeddings = np.empty((len(sentences), self.dimension), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            inputs = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            # Mean pooling over non-padding tokens, as in the sentence-transformers pipeline
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings[start:start + len(batch)] = pooled
+
+        return embeddings
+
+def runtime_name(model) -> str:
+    """Runtime that produces a model's vectors; ONNX and int8 outputs differ slightly from torch"""
+    return getattr(model, "runtime", "torch")
+
+def load_torch_model(model_name: str, num_threads: int = 0):
+    from sentence_transformers import SentenceTransformer
+
+    if num_threads > 0:
+        import torch
+        torch.set_num_threads(num_threads)
+    return SentenceTransformer(model_name)
+
+def load_embedding_model(model_name: str, backend: str = None):
+    """Load the embedding model with the configured backend"""
+    backend = backend or settings.embedding_backend
+    if backend == "torch":
+        return load_torch_model(model_name, settings.embedding_num_threads)
+    if backend == "onnx":
+        return OnnxEmbeddingModel(model_name, settings.onnx_quantized, settings.embedding_num_threads)
+    if backend == "server":
+        from app.services.embedding_server import EmbeddingServerClient
+        return EmbeddingServerClient(model_name)
+    raise ValueError(f"Unsupported embedding backend: {backend}. Supported: torch, onnx, server")
@@ -0,0 +1,214 @@
+"""
+Embedding Cache - persistent, content-addressed store for chunk embeddings
+
+Vectors are keyed by (embedding_model, sha256(chunk_text)) and kept in a local
+SQLite file, so re-uploaded files and shared boilerplate are embedded once.
+The model key names the runtime too unless it is torch, since ONNX and
+int8-quantized vectors differ slightly from torch ones.
+The cache is bounded by total vector bytes and evicts least recently used rows.
+Triggers keep the byte and row totals in a meta table, so checking the bound
+never scans the cache, and hits only advance last_used in periodic batches.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+# Hits are recorded in memory and written to last_used once this many are waiting or this much time has passed
+TOUCH_FLUSH_ROWS = 10000
+TOUCH_FLUSH_SECONDS = 60.0
+
+# Running totals, kept by triggers so every process sharing the file sees the same numbers
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS cache_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS embeddings_totals_insert AFTER INSERT ON embeddings BEGIN
+        UPDATE cache_meta SET value = value + length(new.vector) WHERE key = 'size_bytes';
+        UPDATE cache_meta SET value = value + 1 WHERE key = 'entries';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS embeddings_totals_delete AFTER DELETE ON embeddings BEGIN
+        UPDATE cache_meta SET value = value - length(old.vector) WHERE key = 'size_bytes';
+        UPDATE cache_meta SET value = value - 1 WHERE key = 'entries';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS embeddings_totals_update AFTER UPDATE OF vector ON embeddings BEGIN
+        UPDATE cache_meta SET value = value + length(new.vector) - length(old.vector) WHERE key = 'size_bytes';
+    END""",
+]
+
+def hash_text(text: str) -> str:
+    """Content hash used as the cache key for a chunk"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """Disk-backed LRU cache of float32 embeddings with hit/miss counters"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[Tuple[str, str], float] = {}
+        self._touched_since = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+        # Under a write lock, so no other process inserts between counting and installing the triggers
+        self._conn.execute("BEGIN IMMEDIATE")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        # Caches created before the totals existed are counted once
+        self._conn.execute(
+            "INSERT OR IGNORE INTO cache_meta (key, value) "
+            "SELECT 'size_bytes', COALESCE(SUM(length(vector)), 0) FROM embeddings"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO cache_meta (key, value) SELECT 'entries', COUNT(*) FROM embeddings"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Look up vectors by content hash, returning only the hits"""
+        found: Dict[str, np.ndarray] = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                if not self._touched:
+                    self._touched_since = now
+                for text_hash in found:
+                    self._touched[(model, text_hash)] = now
+                if len(self._touched) >= TOUCH_FLUSH_ROWS or now - self._touched_since >= TOUCH_FLUSH_SECONDS:
+                    self._flush_touches()
+
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+
+        return found
+
+    def put_many(self, model: str, items: Dict[str, np.ndarray]):
+        """Store vectors by content hash and evict old rows if over budget"""
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete wouldn't fire the totals trigger
+            self._conn.executemany(
+                "INSERT INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (model, text_hash) DO UPDATE SET vector = excluded.vector, last_used = excluded.last_used",
+                [
+                    (model, text_hash, np.ascontiguousarray(vector, dtype=np.float32).tobytes(), now)
+                    for text_hash, vector in items.items()
+                ]
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _flush_touches(self):
+        """Write the recorded hits to last_used; caller holds _lock"""
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+            [(used, model, text_hash) for (model, text_hash), used in self._touched.items()]
+        )
+        self._conn.commit()
+        self._touched.clear()
+
+    def _evict(self):
+        """Drop least recently used rows until the cache fits in max_bytes"""
+        total = self._size_bytes()
+        if total > self.max_bytes:
+            # Recent hits must count before choosing what to drop
+            self._flush_touches()
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT model, text_hash, length(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                break
+
+            victims = []
+            for model, text_hash, size in rows:
+                victims.append((model, text_hash))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+            self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_hash = ?", victims)
+            self._conn.commit()
+            self.evictions += len(victims)
+
+    def _total(self, key: str) -> int:
+        row = self._conn.execute("SELECT value FROM cache_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _size_bytes(self) -> int:
+        return self._total("size_bytes")
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            entries = self._total("entries")
+            size_bytes = self._size_bytes()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
+
+def create_embedding_cache() -> Optional[EmbeddingCache]:
+    """Build the embedding cache from settings, or None when disabled"""
+    if not settings.embedding_cache_enabled:
+        return None
+    return EmbeddingCache(settings.embedding_cache_path, settings.embedding_cache_max_bytes)
@@ -0,0 +1,261 @@
+"""
+Embedding Server - one embedding model per host, shared over a Unix socket
+
+Each uvicorn worker otherwise loads its own model, and concurrent chat
+requests each encode a single query. The server owns the model and
+micro-batches encode requests: a batch runs once EMBEDDING_SERVER_MAX_BATCH
+texts are waiting or EMBEDDING_SERVER_MAX_WAIT_MS after the first one
+arrived, whichever comes first.
+
+Start it with serve_embeddings.py and set EMBEDDING_BACKEND=server; the
+client below then stands in for the model inside CustomEmbeddingFunction.
+
+Wire format, both directions: two big-endian uint32 (header length, payload
+length), a JSON header, then the payload. Encode responses carry the
+float32 matrix as the payload.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.batching import Batcher, BatchItem
+
+FRAME_PREFIX = struct.Struct(">II")
+
+def send_frame(sock: socket.socket, header: Dict, payload: bytes = b""):
+    encoded = json.dumps(header).encode("utf-8")
+    sock.sendall(FRAME_PREFIX.pack(len(encoded), len(payload)) + encoded + payload)
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        received = sock.recv(size - len(data))
+        if not received:
+            raise ConnectionError("Embedding server connection closed")
+        data.extend(received)
+    return bytes(data)
+
+def recv_frame(sock: socket.socket) -> Tuple[Dict, bytes]:
+    header_length, payload_length = FRAME_PREFIX.unpack(_recv_exact(sock, FRAME_PREFIX.size))
+    header = json.loads(_recv_exact(sock, header_length))
+    return header, _recv_exact(sock, payload_length) if payload_length else b""
+
+class EncodeRequest(BatchItem):
+    """Texts of one client request"""
+
+    def __init__(self, texts: List[str]):
+        super().__init__(len(texts))
+        self.texts = texts
+
+class MicroBatcher:
+    """Coalesces concurrent encode requests into shared model calls"""
+
+    def __init__(self, model, max_batch: int, max_wait_ms: float):
+        self.model = model
+        self.max_batch = max_batch
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self._batcher = Batcher(
+            self._encode, max_size=max_batch, max_wait_ms=max_wait_ms,
+            name="embedding-batcher", closed_message="Embedding server is shutting down"
+        )
+
+    def submit(self, texts: List[str]) -> Future:
+        return self._batcher.submit(EncodeRequest(texts))
+
+    def _encode(self, batch: List[EncodeRequest]):
+        texts = [text for request in batch for text in request.texts]
+        try:
+            vectors = np.asarray(self.model.encode(
+                texts,
+                batch_size=self.max_batch,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            ), dtype=np.float32)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        self.requests += len(batch)
+        self.batches += 1
+        self.texts += len(texts)
+        offset = 0
+        for request in batch:
+            request.future.set_result(vectors[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "average_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0
+        }
+
+    def close(self):
+        self._batcher.close()
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    # Every thread of every worker holds a connection; the default backlog of 5 refuses bursts
+    request_queue_size = 256
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server: EmbeddingServer = self.server.embedding_server
+        while True:
+            try:
+                header, _ = recv_frame(self.request)
+            except ConnectionError:
+                return
+            try:
+                response, payload = server.handle(header)
+            except Exception as e:
+                response, payload = {"error": str(e)}, b""
+            send_frame(self.request, response, payload)
+
+class EmbeddingServer:
+    """Serves encode requests for one model on a Unix socket"""
+
+    def __init__(self, model_name: str = None, socket_path: str = None, backend: str = None,
+                 max_batch: int = None, max_wait_ms: float = None):
+        from app.services.embedding_backends import load_embedding_model, runtime_name
+
+        self.model_name = model_name or settings.embedding_model
+        self.socket_path = socket_path or settings.embedding_server_socket
+        self.model = load_embedding_model(self.model_name, backend or settings.embedding_server_backend)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.runtime = runtime_name(self.model)
+        self.batcher = MicroBatcher(
+            self.model,
+            max_batch or settings.embedding_server_max_batch,
+            max_wait_ms if max_wait_ms is not None else settings.embedding_server_max_wait_ms
+        )
+        self._server: Optional[_UnixServer] = None
+        self.ready = threading.Event()
+
+    def handle(self, header: Dict) -> Tuple[Dict, bytes]:
+        if header.get("model") != self.model_name:
+            raise ValueError(f"Embedding server runs {self.model_name}, client asked for {header.get('model')}")
+        if header.get("op") == "info":
+            return {
+                "model": self.model_name,
+                "dimension": self.dimension,
+                "runtime": self.runtime,
+                "stats": self.batcher.stats()
+            }, b""
+        if header.get("op") == "encode":
+            vectors = self.batcher.submit(header["texts"]).result()
+            return {"shape": list(vectors.shape)}, np.ascontiguousarray(vectors).tobytes()
+        raise ValueError(f"Unknown operation: {header.get('op')}")
+
+    def serve_forever(self):
+        # A socket file left by a previous run would make bind fail
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = _UnixServer(self.socket_path, _ConnectionHandler)
+        self._server.embedding_server = self
+        os.chmod(self.socket_path, 0o660)
+        self.ready.set()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self.batcher.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+class EmbeddingServerClient:
+    """Stands in for the embedding model, forwarding encode calls to the embedding server
+
+    Each thread keeps its own connection, so concurrent requests reach the
+    server at the same time and can share a batch.
+    """
+
+    def __init__(self, model_name: str, socket_path: str = None, timeout: float = None):
+        self.model_name = model_name
+        self.socket_path = socket_path or settings.embedding_server_socket
+        self.timeout = timeout or settings.embedding_server_timeout_seconds
+        self._local = threading.local()
+        self._info: Optional[Dict] = None
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                # Connect in blocking mode: with a timeout set, a full backlog fails at once with EAGAIN
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise ConnectionError(
+                    f"Embedding server not reachable at {self.socket_path} ({e}). Start it with serve_embeddings.py"
+                )
+            sock.settimeout(self.timeout)
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request(self, header: Dict) -> Tuple[Dict, bytes]:
+        header = dict(header, model=self.model_name)
+        # Retry once on a fresh connection: the server may have restarted since this one was opened
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                send_frame(sock, header)
+                response, payload = recv_frame(sock)
+                break
+            except socket.timeout:
+                # The reply may still arrive on this connection; never reuse it
+                self._disconnect()
+                raise
+            except (ConnectionError, OSError):
+                self._disconnect()
+                if attempt:
+                    raise
+        if "error" in response:
+            raise RuntimeError(f"Embedding server error: {response['error']}")
+        return response, payload
+
+    def _server_info(self) -> Dict:
+        if self._info is None:
+            self._info = self._request({"op": "info"})[0]
+        return self._info
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._server_info()["dimension"]
+
+    @property
+    def runtime(self) -> str:
+        """Runtime the server encodes with, so cached vectors stay per runtime"""
+        return self._server_info().get("runtime", "torch")
+
+    def stats(self) -> Dict:
+        return self._request({"op": "info"})[0]["stats"]
+
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False) -> np.ndarray:
+        if not sentences:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        response, payload = self._request({"op": "encode", "texts": list(sentences)})
+        return np.frombuffer(payload, dtype=np.float32).reshape(response["shape"])
@@ -0,0 +1,325 @@
+"""
+Embedding Spaces - changing the embedding model without a maintenance window
+
+Vectors from different models can't be compared, so each model's vectors
+live in their own space: the model first used keeps the original
+collections and NumPy directories, and every later model gets a storage key
+that suffixes them (recorded in the embedding_spaces table).
+
+To move to a new model, set EMBEDDING_MIGRATION_TARGET to it:
+
+1. New chunks are written to both spaces (VectorStore dual-writes to its
+   migration_target store).
+2. EmbeddingMigrator re-embeds each project's existing DocumentChunk rows
+   into the target space in the background, throttled to
+   EMBEDDING_MIGRATION_CHUNKS_PER_SECOND.
+3. Once a project has caught up, its queries switch to the target space;
+   the other projects keep using the current model meanwhile. Deletes are
+   counted and compacted in the space a project is queried from.
+
+Both spaces keep every chunk until the migration is over, so snapshots
+export the current model's space; restoring a project drops its target
+copy and restarts its migration.
+
+When every project has switched, set EMBEDDING_MODEL to the target and
+clear EMBEDDING_MIGRATION_TARGET. The old space is left in place, so
+clearing the target before then rolls back.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import ChunkDuplicate, Document, DocumentChunk, EmbeddingSpace, Project, ProjectEmbeddingSpace
+from app.services import corpus_stats, leases
+
+def _new_storage_key(model_name: str) -> str:
+    # Readable and short enough for Chroma's 63-character collection names
+    slug = re.sub(r"[^a-z0-9]+", "-", model_name.lower()).strip("-")[:24]
+    digest = hashlib.blake2b(model_name.encode("utf-8"), digest_size=4).hexdigest()
+    return f"{slug}-{digest}"
+
+def storage_key(model_name: str) -> str:
+    """Storage key of a model's space, registering the model on first use
+
+    The first model ever registered keeps the original, unsuffixed storage.
+    """
+    db = SessionLocal()
+    try:
+        key = db.query(EmbeddingSpace.storage_key).filter(EmbeddingSpace.model_name == model_name).scalar()
+        if key is not None:
+            return key
+        key = _new_storage_key(model_name) if db.query(EmbeddingSpace.model_name).first() else ""
+        db.add(EmbeddingSpace(model_name=model_name, storage_key=key))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another process registered it first
+            db.rollback()
+            key = db.query(EmbeddingSpace.storage_key).filter(EmbeddingSpace.model_name == model_name).scalar()
+        return key
+    finally:
+        db.close()
+
+def register_spaces(model_name: str, target_model: Optional[str] = None):
+    """Register the live model's space, then a migration target's
+
+    The live model goes first so that, on a database that has never
+    recorded a space, it keeps the original storage its vectors are in.
+    """
+    storage_key(model_name)
+    if target_model:
+        storage_key(target_model)
+
+class ProjectSpaces:
+    """Model each project is queried with, cached per process and re-read every refresh_seconds"""
+
+    def __init__(self, refresh_seconds: float = None):
+        self.refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None else settings.embedding_space_refresh_seconds
+        )
+        self._active: Dict[int, str] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def active_model(self, project_id: int) -> Optional[str]:
+        """Model recorded for a project; None means EMBEDDING_MODEL"""
+        if time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            db = SessionLocal()
+            try:
+                active = dict(db.query(ProjectEmbeddingSpace.project_id, ProjectEmbeddingSpace.active_model).filter(
+                    ProjectEmbeddingSpace.active_model.isnot(None)
+                ).all())
+            finally:
+                db.close()
+            with self._lock:
+                self._active = active
+                self._loaded_at = time.monotonic()
+        return self._active.get(project_id)
+
+def forget(project_id: int):
+    db = SessionLocal()
+    try:
+        db.query(ProjectEmbeddingSpace).filter(ProjectEmbeddingSpace.project_id == project_id).delete(
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+class EmbeddingMigrator:
+    """Re-embeds existing chunks into the migration target's space and switches projects over"""
+
+    LEASE_SECONDS = 600
+
+    def __init__(self, vector_store, batch_size: int = None, chunks_per_second: float = None,
+                 interval_seconds: float = None):
+        self.vector_store = vector_store
+        self.target = vector_store.migration_target
+        self.batch_size = batch_size or settings.embedding_migration_batch_size
+        self.chunks_per_second = (
+            chunks_per_second if chunks_per_second is not None else settings.embedding_migration_chunks_per_second
+        )
+        self.interval_seconds = (
+            interval_seconds if interval_seconds is not None else settings.embedding_migration_interval_seconds
+        )
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def target_model(self) -> Optional[str]:
+        return self.target.model_name if self.target is not None else None
+
+    def _progress(self, db, project_id: int) -> ProjectEmbeddingSpace:
+        """Progress row of a project, restarted if it was tracking a different target"""
+        row = db.query(ProjectEmbeddingSpace).filter(ProjectEmbeddingSpace.project_id == project_id).first()
+        if row is None:
+            row = ProjectEmbeddingSpace(project_id=project_id, last_chunk_id=0, migrated_chunks=0)
+            db.add(row)
+        if row.target_model != self.target_model:
+            row.target_model = self.target_model
+            row.last_chunk_id = 0
+            row.migrated_chunks = 0
+            row.completed_at = None
+        return row
+
+    def _claim(self, project_id: int) -> bool:
+        """Take a project's re-embedding lease; False if another process holds it or it is done"""
+        db = SessionLocal()
+        try:
+            row = self._progress(db, project_id)
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                row = self._progress(db, project_id)
+                db.commit()
+            if row.completed_at is not None:
+                return False
+            return leases.claim(db, ProjectEmbeddingSpace, project_id, self.LEASE_SECONDS) is not None
+        finally:
+            db.close()
+
+    def _release(self, project_id: int):
+        leases.release(ProjectEmbeddingSpace, project_id)
+
+    def _drop_deleted_documents(self, project_id: int, document_ids: set):
+        """Remove just-copied chunks of documents deleted since they were read
+
+        A delete that committed before this check is undone here; one that
+        commits after it clears the target space itself.
+        """
+        db = SessionLocal()
+        try:
+            existing = {document_id for (document_id,) in db.query(Document.id).filter(Document.id.in_(document_ids))}
+        finally:
+            db.close()
+        for document_id in document_ids - existing:
+            self.vector_store.delete_document_from_target(document_id, project_id)
+
+    def migrate_project(self, project_id: int) -> bool:
+        """Re-embed a project's remaining chunks into the target space; True once it has switched over"""
+        db = SessionLocal()
+        try:
+            while not self._stop.is_set():
+                started = time.monotonic()
+                progress = self._progress(db, project_id)
+                rows = db.query(DocumentChunk).join(Document, Document.id == DocumentChunk.document_id).filter(
+                    Document.project_id == project_id,
+                    DocumentChunk.id > progress.last_chunk_id
+                ).order_by(DocumentChunk.id).limit(self.batch_size).all()
+
+                if not rows:
+                    # Chunks stored from now on are dual-written, so the project can switch
+                    progress.completed_at = func.now()
+                    progress.active_model = self.target_model
+                    corpus_stats.bump_corpus_version(db, project_id)
+                    db.commit()
+                    print(f"Project {project_id} switched to embedding model {self.target_model}")
+                    return True
+
+                # Near-duplicates were never indexed in the current space either
+                duplicates = set(db.query(ChunkDuplicate.document_id, ChunkDuplicate.chunk_index).filter(
+                    ChunkDuplicate.project_id == project_id,
+                    ChunkDuplicate.document_id.in_({row.document_id for row in rows})
+                ).all())
+                chunks = [
+                    {
+                        "document_id": row.document_id,
+                        "chunk_index": row.chunk_index,
+                        "chunk_text": row.chunk_text,
+                        "chunk_metadata": row.chunk_metadata
+                    }
+                    for row in rows
+                    if (row.document_id, row.chunk_index) not in duplicates
+                ]
+                self.target.add_document_chunks(chunks, project_id)
+                self._drop_deleted_documents(project_id, {row.document_id for row in rows})
+
+                progress.last_chunk_id = rows[-1].id
+                progress.migrated_chunks = (progress.migrated_chunks or 0) + len(chunks)
+                progress.lease_expires_at = time.time() + self.LEASE_SECONDS
+                db.commit()
+
+                # Leave the CPU to live traffic
+                if self.chunks_per_second > 0:
+                    self._stop.wait(max(0.0, len(rows) / self.chunks_per_second - (time.monotonic() - started)))
+            return False
+        finally:
+            db.close()
+
+    def run_once(self) -> Dict:
+        """One pass over every project that hasn't switched to the target yet"""
+        if self.target is None:
+            return {"target_model": None, "switched": [], "pending": []}
+
+        db = SessionLocal()
+        try:
+            # Switched projects need no lease; their new chunks are dual-written
+            switched_ids = db.query(ProjectEmbeddingSpace.project_id).filter(
+                ProjectEmbeddingSpace.target_model == self.target_model,
+                ProjectEmbeddingSpace.completed_at.isnot(None)
+            )
+            project_ids = [project_id for (project_id,) in db.query(Project.id).filter(
+                Project.id.notin_(switched_ids)
+            ).order_by(Project.id).all()]
+        finally:
+            db.close()
+
+        switched, pending = [], []
+        for project_id in project_ids:
+            if self._stop.is_set():
+                break
+            if not self._claim(project_id):
+                continue
+            try:
+                if self.migrate_project(project_id):
+                    switched.append(project_id)
+                else:
+                    pending.append(project_id)
+            except Exception as e:
+                print(f"Error re-embedding project {project_id}: {str(e)}")
+                pending.append(project_id)
+            finally:
+                self._release(project_id)
+        return {"target_model": self.target_model, "switched": switched, "pending": pending}
+
+    def status(self) -> Dict:
+        """Per-project progress towards the migration target"""
+        db = SessionLocal()
+        try:
+            rows = {row.project_id: row for row in db.query(ProjectEmbeddingSpace).all()}
+            projects = []
+            for (project_id,) in db.query(Project.id).order_by(Project.id).all():
+                row = rows.get(project_id)
+                tracking = row is not None and self.target is not None and row.target_model == self.target_model
+                cursor = row.last_chunk_id if tracking else 0
+                remaining = db.query(func.count(DocumentChunk.id)).join(
+                    Document, Document.id == DocumentChunk.document_id
+                ).filter(Document.project_id == project_id, DocumentChunk.id > cursor).scalar()
+                switched = tracking and row.completed_at is not None
+                projects.append({
+                    "project_id": project_id,
+                    "active_model": (row.active_model if row is not None else None) or self.vector_store.model_name,
+                    "migrated_chunks": row.migrated_chunks if tracking else 0,
+                    # Chunks added after the switch were dual-written
+                    "remaining_chunks": remaining if self.target is not None and not switched else 0,
+                    "switched": switched
+                })
+        finally:
+            db.close()
+        return {
+            "model": self.vector_store.model_name,
+            "target_model": self.target_model,
+            "complete": self.target is not None and all(project["switched"] for project in projects),
+            "projects": projects
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error in embedding migration: {str(e)}")
+            self._stop.wait(self.interval_seconds)
+
+    def start(self):
+        """Re-embed in a background thread while a migration target is configured"""
+        if self.target is None or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="embedding-migrator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
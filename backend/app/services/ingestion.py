@@ -0,0 +1,153 @@
+"""
+Ingestion Engine - CPU-parallel text extraction, chunking and embedding
+
+Uploads are processed in a pool of worker processes so that parsing PDFs and
+running the embedding model neither compete with request handling for the
+GIL nor serialize behind a single encode stream. Each worker loads the
+embedding model once, and caps its BLAS/torch/tokenizer threads so that
+workers x threads stays within the machine's cores. BLAS sizes its pool when
+numpy is first imported, so this module leaves numpy to the worker functions
+and the cap is applied before they run.
+
+With INGESTION_WORKERS=0 the same work runs in the calling process.
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Per-process embedding function, built once by the pool initializer
+_worker_embedding_function = None
+
+# Whether the caps were set before numpy loaded BLAS in this process
+_capped_before_numpy: Optional[bool] = None
+
+def _cap_threads(num_threads: int):
+    """Limit the math and tokenizer thread pools of the current process
+
+    Must run before numpy is imported; BLAS ignores the limits afterwards.
+    """
+    global _capped_before_numpy
+    _capped_before_numpy = "numpy" not in sys.modules
+    if not _capped_before_numpy:
+        print("Warning: numpy was loaded before the ingestion worker capped its threads; BLAS keeps its default pool")
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(num_threads)
+    # Rust tokenizers spawn their own pool per call unless told not to
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    if settings.embedding_backend == "torch":
+        import torch
+        torch.set_num_threads(num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Already set once this process has run a parallel op
+            pass
+
+def _worker_thread_limits() -> Dict:
+    """Thread limits in effect in the current worker process"""
+    limits = {
+        "capped_before_numpy": _capped_before_numpy,
+        "omp_num_threads": os.environ.get("OMP_NUM_THREADS")
+    }
+    if "torch" in sys.modules:
+        limits["torch"] = sys.modules["torch"].get_num_threads()
+    try:
+        from threadpoolctl import threadpool_info
+        limits["blas"] = sorted({pool["num_threads"] for pool in threadpool_info()})
+    except ImportError:
+        pass
+    return limits
+
+def _init_worker(model_name: str, num_threads: int):
+    global _worker_embedding_function
+    # Before the imports below, which load numpy and torch
+    _cap_threads(num_threads)
+
+    from app.services.embedding_cache import create_embedding_cache
+    from app.services.vector_store import CustomEmbeddingFunction
+
+    settings.embedding_num_threads = num_threads
+    _worker_embedding_function = CustomEmbeddingFunction(model_name, cache=create_embedding_cache())
+
+def _process_in_worker(file_path: str, file_type: str, document_id: int) -> Tuple[List[Dict], "np.ndarray"]:
+    from app.services.document_processor import DocumentProcessor
+
+    chunks = DocumentProcessor().process_document(file_path, file_type, document_id)
+    embeddings = _worker_embedding_function.embed([chunk['chunk_text'] for chunk in chunks])
+    return chunks, embeddings
+
+class IngestionEngine:
+    """Extracts, chunks and embeds uploaded documents in a process pool"""
+
+    def __init__(self, workers: Optional[int] = None, threads_per_worker: Optional[int] = None):
+        self.workers = workers if workers is not None else settings.ingestion_workers
+        self.threads_per_worker = threads_per_worker or settings.ingestion_worker_threads
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._counter_lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if self.workers > 0:
+            # spawn: forking a process that already holds torch threads can deadlock
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(settings.embedding_model, self.threads_per_worker)
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self._pool is not None
+
+    def process(self, file_path: str, file_type: str, document_id: int) -> Tuple[List[Dict], Optional["np.ndarray"]]:
+        """Chunks of a document and, when run in the pool, their embeddings
+
+        Blocks until a worker has finished; call it from a background thread.
+        Without a pool, embeddings is None and VectorStore embeds the chunks.
+        """
+        with self._counter_lock:
+            self.submitted += 1
+        try:
+            if self._pool is None:
+                from app.services.document_processor import DocumentProcessor
+                result = DocumentProcessor().process_document(file_path, file_type, document_id), None
+            else:
+                result = self._pool.submit(_process_in_worker, file_path, file_type, document_id).result()
+        except Exception:
+            with self._counter_lock:
+                self.failed += 1
+            raise
+        with self._counter_lock:
+            self.completed += 1
+        return result
+
+    def worker_thread_limits(self) -> Optional[Dict]:
+        """Thread limits a pool worker runs with, to check the cap took effect; None without a pool"""
+        if self._pool is None:
+            return None
+        return self._pool.submit(_worker_thread_limits).result()
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
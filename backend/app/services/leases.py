@@ -0,0 +1,56 @@
+"""
+Leases - per-project work claims shared by every API process
+
+Background jobs (compaction, embedding migration) run in each process, so a
+project's row in the job's table carries a lease_expires_at timestamp; the
+process that sets it owns the project until it releases the lease or it
+expires. Long work renews its lease as it goes.
+"""
+
+import time
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+
+def claim(db: Session, model, project_id: int, lease_seconds: float) -> Optional[float]:
+    """Take the lease on a project's existing row of model; returns its expiry, or None if another process holds it"""
+    now = time.time()
+    expires_at = now + lease_seconds
+    # Conditional update, so exactly one process wins
+    claimed = db.query(model).filter(
+        model.project_id == project_id,
+        (model.lease_expires_at.is_(None)) | (model.lease_expires_at < now)
+    ).update({model.lease_expires_at: expires_at}, synchronize_session=False)
+    db.commit()
+    return expires_at if claimed == 1 else None
+
+def renew(model, project_id: int, expires_at: float, lease_seconds: float) -> Optional[float]:
+    """Extend a lease claimed with expiry expires_at; returns the new expiry, or None if it was lost
+
+    A lease that expired is still renewed as long as no other process has
+    claimed the project since.
+    """
+    renewed_until = time.time() + lease_seconds
+    db = SessionLocal()
+    try:
+        renewed = db.query(model).filter(
+            model.project_id == project_id,
+            model.lease_expires_at == expires_at
+        ).update({model.lease_expires_at: renewed_until}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return renewed_until if renewed == 1 else None
+
+def release(model, project_id: int):
+    db = SessionLocal()
+    try:
+        db.query(model).filter(model.project_id == project_id).update(
+            {model.lease_expires_at: None},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
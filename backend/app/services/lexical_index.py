@@ -0,0 +1,214 @@
+"""
+Lexical Index - BM25 keyword search over stored document chunks
+
+Postings live in the relational database (chunk_terms) and are written in the
+same transaction as the DocumentChunk rows, so exact identifiers such as
+requirement IDs (REQ-001) and product names are searchable as soon as a
+document is processed.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import ChunkTerm, DocumentChunk, LexicalIndexStats
+
+# Keeps identifiers like "req-001", "v2.1" and "user_id" together
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+""".split())
+
+MAX_TERM_LENGTH = 100
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens; compound identifiers also contribute their parts"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS or len(token) > MAX_TERM_LENGTH:
+            continue
+        tokens.append(token)
+        if re.search(r"[-_.]", token):
+            tokens.extend(part for part in re.split(r"[-_.]", token) if part and part not in STOPWORDS)
+    return tokens
+
+class LexicalIndex:
+    """Incrementally maintained BM25 index backed by the chunk_terms table"""
+
+    def __init__(self, k1: float = None, b: float = None, max_postings_per_term: int = None):
+        self.k1 = k1 if k1 is not None else settings.bm25_k1
+        self.b = b if b is not None else settings.bm25_b
+        self.max_postings_per_term = (
+            max_postings_per_term if max_postings_per_term is not None else settings.bm25_max_postings_per_term
+        )
+
+    def add_chunks(self, db: Session, project_id: int, chunks: List[Dict]):
+        """Index chunks within the caller's transaction"""
+        total_length = 0
+        postings = []
+        for chunk in chunks:
+            counts = Counter(tokenize(chunk['chunk_text']))
+            length = sum(counts.values())
+            total_length += length
+            for term, frequency in counts.items():
+                postings.append({
+                    "project_id": project_id,
+                    "document_id": chunk['document_id'],
+                    "chunk_index": chunk['chunk_index'],
+                    "term": term,
+                    "term_frequency": frequency,
+                    "chunk_length": length
+                })
+
+        if postings:
+            db.bulk_insert_mappings(ChunkTerm, postings)
+        self._adjust_stats(db, project_id, len(chunks), total_length)
+
+    def delete_document(self, db: Session, document_id: int, project_id: int):
+        """Remove a document's postings within the caller's transaction"""
+        lengths = db.query(ChunkTerm.chunk_index, ChunkTerm.chunk_length).filter(
+            ChunkTerm.document_id == document_id
+        ).distinct().all()
+        db.query(ChunkTerm).filter(ChunkTerm.document_id == document_id).delete(synchronize_session=False)
+        self._adjust_stats(db, project_id, -len(lengths), -sum(length for _, length in lengths))
+
+    def delete_project(self, db: Session, project_id: int):
+        """Remove all of a project's postings within the caller's transaction"""
+        db.query(ChunkTerm).filter(ChunkTerm.project_id == project_id).delete(synchronize_session=False)
+        db.query(LexicalIndexStats).filter(LexicalIndexStats.project_id == project_id).delete(synchronize_session=False)
+
+    def rebuild_project(self, db: Session, project_id: int, documents: List, exclude: Set[Tuple[int, int]] = None) -> int:
+        """Re-index a project from its stored DocumentChunk rows
+
+        exclude holds (document_id, chunk_index) pairs to skip, e.g. chunks
+        stored as near-duplicate back-references.
+        """
+        self.delete_project(db, project_id)
+        exclude = exclude or set()
+        # One add_chunks call: the stats row it creates isn't flushed, so a second call would add another
+        chunks = [
+            {"document_id": chunk.document_id, "chunk_index": chunk.chunk_index, "chunk_text": chunk.chunk_text}
+            for document in documents
+            for chunk in document.chunks
+            if (chunk.document_id, chunk.chunk_index) not in exclude
+        ]
+        self.add_chunks(db, project_id, chunks)
+        return len(chunks)
+
+    def _adjust_stats(self, db: Session, project_id: int, chunk_delta: int, length_delta: int):
+        stats = db.query(LexicalIndexStats).filter(LexicalIndexStats.project_id == project_id).first()
+        if stats is None:
+            stats = LexicalIndexStats(project_id=project_id, chunk_count=0, total_length=0)
+            db.add(stats)
+        stats.chunk_count = max(0, (stats.chunk_count or 0) + chunk_delta)
+        stats.total_length = max(0, (stats.total_length or 0) + length_delta)
+
+    def search(self, query: str, project_id: int, n_results: int = 5, document_ids: Optional[Iterable[int]] = None,
+               shared_chunks: Optional[Dict[int, List[int]]] = None) -> List[Dict]:
+        """BM25-ranked chunks in the same shape as VectorStore results, optionally from some documents only
+
+        shared_chunks adds chunks of other documents by index, e.g. ones the
+        selected documents share but which are only indexed once (see
+        vector_store.document_filter).
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        db = SessionLocal()
+        try:
+            stats = db.query(LexicalIndexStats).filter(LexicalIndexStats.project_id == project_id).first()
+            if stats is None or not stats.chunk_count:
+                return []
+            total_chunks = stats.chunk_count
+            average_length = stats.total_length / total_chunks or 1.0
+
+            # Document frequency straight from the (project_id, term) index; IDF stays project-wide
+            document_frequency = dict(db.query(ChunkTerm.term, func.count()).filter(
+                ChunkTerm.project_id == project_id, ChunkTerm.term.in_(terms)
+            ).group_by(ChunkTerm.term).all())
+
+            def term_postings(*criteria):
+                query = db.query(
+                    ChunkTerm.document_id,
+                    ChunkTerm.chunk_index,
+                    ChunkTerm.term,
+                    ChunkTerm.term_frequency,
+                    ChunkTerm.chunk_length
+                ).filter(ChunkTerm.project_id == project_id, *criteria)
+                if document_ids:
+                    query = query.filter(or_(ChunkTerm.document_id.in_(list(document_ids)), *[
+                        and_(ChunkTerm.document_id == document_id, ChunkTerm.chunk_index.in_(list(chunk_indexes)))
+                        for document_id, chunk_indexes in (shared_chunks or {}).items()
+                    ]))
+                return query
+
+            # A common term would make query cost grow with the corpus, so only its highest-frequency
+            # postings are scored, read off the (project_id, term, term_frequency) index
+            cap = self.max_postings_per_term
+            common = [term for term in terms if cap > 0 and document_frequency.get(term, 0) > cap]
+            rare = [term for term in terms if term not in common]
+            postings = term_postings(ChunkTerm.term.in_(rare)).all() if rare else []
+            for term in common:
+                postings.extend(
+                    term_postings(ChunkTerm.term == term).order_by(ChunkTerm.term_frequency.desc()).limit(cap).all()
+                )
+
+            def term_score(term: str, tf: int, length: int) -> float:
+                df = document_frequency[term]
+                idf = math.log(1 + (total_chunks - df + 0.5) / (df + 0.5))
+                norm = 1 - self.b + self.b * length / average_length
+                return idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+            scores: Dict[tuple, float] = defaultdict(float)
+            for posting in postings:
+                scores[(posting.document_id, posting.chunk_index)] += term_score(
+                    posting.term, posting.term_frequency, posting.chunk_length
+                )
+
+            # Chunks past a common term's cap are missing that term's share; rescore a shortlist
+            # from the chunk text, which the postings were built from
+            shortlist = heapq.nlargest(max(n_results * 4, 50) if common else n_results, scores, key=scores.get)
+            if not shortlist:
+                return []
+
+            rows = db.query(DocumentChunk).filter(or_(*[
+                and_(DocumentChunk.document_id == document_id, DocumentChunk.chunk_index == chunk_index)
+                for document_id, chunk_index in shortlist
+            ])).all()
+            texts = {(row.document_id, row.chunk_index): row.chunk_text for row in rows}
+        finally:
+            db.close()
+
+        if common:
+            for key in shortlist:
+                if key in texts:
+                    counts = Counter(tokenize(texts[key]))
+                    length = sum(counts.values())
+                    scores[key] = sum(term_score(term, counts[term], length) for term in terms if counts[term])
+        top = heapq.nlargest(n_results, ((key, scores[key]) for key in shortlist), key=lambda item: item[1])
+
+        results = []
+        for (document_id, chunk_index), score in top:
+            if (document_id, chunk_index) not in texts:
+                continue
+            results.append({
+                'content': texts[(document_id, chunk_index)],
+                'metadata': {
+                    'document_id': document_id,
+                    'project_id': project_id,
+                    'chunk_index': chunk_index
+                },
+                'distance': None,
+                'score': score,
+                'id': f"doc_{document_id}_chunk_{chunk_index}"
+            })
+        return results
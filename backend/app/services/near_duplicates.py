@@ -0,0 +1,318 @@
+"""
+Near-Duplicate Index - MinHash/LSH detection of repeated chunks at ingest
+
+Uploaded documents repeat a lot of boilerplate (contract clauses, cover pages,
+meeting-note headers). Each chunk gets a MinHash signature over word
+shingles; signatures are split into LSH bands so that likely matches are found
+with an indexed bucket lookup rather than a scan of the project.
+
+A chunk whose estimated Jaccard similarity to an already stored chunk of the
+same project reaches the threshold is not indexed again. Its DocumentChunk row
+is kept, and a chunk_duplicates row points it at the stored (canonical) chunk,
+so search results can list every document the text appears in.
+"""
+
+import hashlib
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import ChunkDuplicate, ChunkFingerprint, ChunkLshBucket, DocumentChunk
+from app.services import corpus_stats
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Fixed seed: stored signatures are only comparable if every process draws the same permutations
+MINHASH_SEED = 20240501
+
+# Bucket lookups are split to stay under SQLite's bound-parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+ChunkKey = Tuple[int, int]
+
+def shingles(text: str, size: int) -> Set[str]:
+    """Word n-grams of a chunk; short chunks form a single shingle"""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+class NearDuplicateIndex:
+    """Per-project MinHash/LSH index backed by the chunk_fingerprints and chunk_lsh_buckets tables"""
+
+    def __init__(self, threshold: float = None, num_perm: int = None, bands: int = None, shingle_size: int = None):
+        self.enabled = settings.near_duplicate_detection
+        self.threshold = threshold if threshold is not None else settings.near_duplicate_threshold
+        self.num_perm = num_perm or settings.near_duplicate_num_perm
+        self.bands = bands or settings.near_duplicate_bands
+        self.shingle_size = shingle_size or settings.near_duplicate_shingle_size
+        if self.num_perm % self.bands:
+            raise ValueError("NEAR_DUPLICATE_NUM_PERM must be a multiple of NEAR_DUPLICATE_BANDS")
+        self.rows_per_band = self.num_perm // self.bands
+
+        # Multiply-shift hashing of the 32-bit shingle hashes: the high half of (a * x + b) mod 2**64, a odd
+        rng = np.random.RandomState(MINHASH_SEED)
+        self._a = rng.randint(0, 1 << 64, size=self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.randint(0, 1 << 64, size=self.num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature (uint32 per permutation), or None for chunks without words"""
+        chunk_shingles = shingles(text, self.shingle_size)
+        if not chunk_shingles:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in chunk_shingles),
+            dtype=np.uint64, count=len(chunk_shingles)
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def buckets(self, signature: np.ndarray) -> List[int]:
+        """One LSH bucket per band; chunks sharing any bucket are candidate duplicates"""
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows_per_band:(band + 1) * self.rows_per_band]
+            digest = hashlib.blake2b(bytes([band]) + rows.tobytes(), digest_size=8).digest()
+            keys.append(int.from_bytes(digest, "big", signed=True))
+        return keys
+
+    @staticmethod
+    def similarity(first: np.ndarray, second: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the chunks behind two signatures"""
+        return float(np.mean(first == second))
+
+    def index_chunks(self, db: Session, project_id: int, chunks: List[Dict]) -> List[Optional[Dict]]:
+        """Match a document's chunks against the project, within the caller's transaction
+
+        Returns, per chunk, None if it is new (its fingerprint is stored) or
+        the canonical chunk it duplicates as {"document_id", "chunk_index",
+        "similarity"} (a back-reference is stored). Chunks are also matched
+        against earlier chunks of the same document.
+
+        Locks the project until the transaction ends, so concurrent uploads
+        in any process see each other's chunks.
+        """
+        if not self.enabled:
+            return [None] * len(chunks)
+        corpus_stats.lock_project(db, project_id)
+
+        signatures = [self.signature(chunk['chunk_text']) for chunk in chunks]
+        chunk_buckets = [self.buckets(signature) if signature is not None else [] for signature in signatures]
+
+        members: Dict[int, List[ChunkKey]] = {}
+        all_buckets = list({bucket for keys in chunk_buckets for bucket in keys})
+        for start in range(0, len(all_buckets), LOOKUP_BATCH_SIZE):
+            rows = db.query(ChunkLshBucket.bucket, ChunkLshBucket.document_id, ChunkLshBucket.chunk_index).filter(
+                ChunkLshBucket.project_id == project_id,
+                ChunkLshBucket.bucket.in_(all_buckets[start:start + LOOKUP_BATCH_SIZE])
+            ).all()
+            for bucket, document_id, chunk_index in rows:
+                members.setdefault(bucket, []).append((document_id, chunk_index))
+        stored_signatures = self._load_signatures(db, {key for keys in members.values() for key in keys})
+
+        results: List[Optional[Dict]] = []
+        fingerprints = []
+        bucket_rows = []
+        duplicates = []
+        for chunk, signature, keys in zip(chunks, signatures, chunk_buckets):
+            match = None
+            if signature is not None:
+                candidates = {key for bucket in keys for key in members.get(bucket, [])}
+                best = max(
+                    ((self.similarity(signature, stored_signatures[key]), key) for key in candidates),
+                    default=None
+                )
+                if best is not None and best[0] >= self.threshold:
+                    match = {"document_id": best[1][0], "chunk_index": best[1][1], "similarity": best[0]}
+
+            key = (chunk['document_id'], chunk['chunk_index'])
+            if match is not None:
+                duplicates.append({
+                    "project_id": project_id,
+                    "document_id": key[0],
+                    "chunk_index": key[1],
+                    "canonical_document_id": match["document_id"],
+                    "canonical_chunk_index": match["chunk_index"],
+                    "similarity": match["similarity"]
+                })
+            elif signature is not None:
+                fingerprints.append({
+                    "project_id": project_id,
+                    "document_id": key[0],
+                    "chunk_index": key[1],
+                    "signature": signature.tobytes()
+                })
+                bucket_rows.extend(
+                    {"project_id": project_id, "document_id": key[0], "chunk_index": key[1], "bucket": bucket}
+                    for bucket in keys
+                )
+                # Later chunks of this document can match this one
+                stored_signatures[key] = signature
+                for bucket in keys:
+                    members.setdefault(bucket, []).append(key)
+            results.append(match)
+
+        if fingerprints:
+            db.bulk_insert_mappings(ChunkFingerprint, fingerprints)
+            db.bulk_insert_mappings(ChunkLshBucket, bucket_rows)
+        if duplicates:
+            db.bulk_insert_mappings(ChunkDuplicate, duplicates)
+        return results
+
+    def _load_signatures(self, db: Session, keys: Set[ChunkKey]) -> Dict[ChunkKey, np.ndarray]:
+        if not keys:
+            return {}
+        document_ids = list({document_id for document_id, _ in keys})
+        signatures = {}
+        for start in range(0, len(document_ids), LOOKUP_BATCH_SIZE):
+            rows = db.query(ChunkFingerprint.document_id, ChunkFingerprint.chunk_index, ChunkFingerprint.signature).filter(
+                ChunkFingerprint.document_id.in_(document_ids[start:start + LOOKUP_BATCH_SIZE])
+            ).all()
+            for document_id, chunk_index, signature in rows:
+                if (document_id, chunk_index) in keys:
+                    signatures[(document_id, chunk_index)] = np.frombuffer(signature, dtype=np.uint32)
+        return signatures
+
+    def _store_fingerprint(self, db: Session, project_id: int, key: ChunkKey, signature: np.ndarray):
+        db.add(ChunkFingerprint(project_id=project_id, document_id=key[0], chunk_index=key[1],
+                                signature=signature.tobytes()))
+        db.bulk_insert_mappings(ChunkLshBucket, [
+            {"project_id": project_id, "document_id": key[0], "chunk_index": key[1], "bucket": bucket}
+            for bucket in self.buckets(signature)
+        ])
+
+    def delete_document(self, db: Session, project_id: int, document_id: int) -> List[Dict]:
+        """Drop a document's fingerprints and back-references within the caller's transaction
+
+        Chunks of other documents that were stored as duplicates of this
+        document's chunks lose their canonical copy; the first of each group
+        is promoted to canonical and returned (as ingestion chunk dicts) so
+        the caller can index it. The rest are re-pointed at a promoted chunk.
+        Locks the project until the transaction ends, as index_chunks does.
+        """
+        corpus_stats.lock_project(db, project_id)
+        db.query(ChunkDuplicate).filter(ChunkDuplicate.document_id == document_id).delete(synchronize_session=False)
+        db.query(ChunkLshBucket).filter(ChunkLshBucket.document_id == document_id).delete(synchronize_session=False)
+        db.query(ChunkFingerprint).filter(ChunkFingerprint.document_id == document_id).delete(synchronize_session=False)
+
+        orphans = db.query(ChunkDuplicate).filter(ChunkDuplicate.canonical_document_id == document_id).order_by(
+            ChunkDuplicate.canonical_chunk_index, ChunkDuplicate.document_id, ChunkDuplicate.chunk_index
+        ).all()
+        if not orphans:
+            return []
+
+        rows = db.query(DocumentChunk).filter(
+            DocumentChunk.document_id.in_({orphan.document_id for orphan in orphans})
+        ).all()
+        chunk_rows = {(row.document_id, row.chunk_index): row for row in rows}
+
+        promoted = []
+        groups: Dict[int, List[Tuple[ChunkKey, np.ndarray]]] = {}
+        for orphan in orphans:
+            key = (orphan.document_id, orphan.chunk_index)
+            row = chunk_rows.get(key)
+            if row is None:
+                db.delete(orphan)
+                continue
+            signature = self.signature(row.chunk_text)
+            group = groups.setdefault(orphan.canonical_chunk_index, [])
+            best = max(
+                ((self.similarity(signature, canonical_signature), canonical_key)
+                 for canonical_key, canonical_signature in group),
+                default=None
+            ) if signature is not None else None
+            if best is not None and best[0] >= self.threshold:
+                orphan.canonical_document_id, orphan.canonical_chunk_index = best[1]
+                orphan.similarity = best[0]
+                continue
+
+            # Nothing left to point at: this chunk becomes the stored copy
+            db.delete(orphan)
+            if signature is not None:
+                self._store_fingerprint(db, project_id, key, signature)
+                group.append((key, signature))
+            promoted.append({
+                "document_id": row.document_id,
+                "chunk_text": row.chunk_text,
+                "chunk_index": row.chunk_index,
+                "chunk_metadata": row.chunk_metadata
+            })
+        return promoted
+
+    def delete_project(self, db: Session, project_id: int):
+        """Remove all of a project's fingerprints and back-references within the caller's transaction"""
+        for model in (ChunkDuplicate, ChunkLshBucket, ChunkFingerprint):
+            db.query(model).filter(model.project_id == project_id).delete(synchronize_session=False)
+
+    def rebuild_project(self, db: Session, project_id: int, documents: List) -> int:
+        """Re-fingerprint a project's stored chunks, keeping its existing back-references"""
+        corpus_stats.lock_project(db, project_id)
+        db.query(ChunkLshBucket).filter(ChunkLshBucket.project_id == project_id).delete(synchronize_session=False)
+        db.query(ChunkFingerprint).filter(ChunkFingerprint.project_id == project_id).delete(synchronize_session=False)
+        duplicates = self.duplicate_keys(db, project_id)
+        fingerprinted = 0
+        for document in documents:
+            for chunk in document.chunks:
+                key = (chunk.document_id, chunk.chunk_index)
+                signature = self.signature(chunk.chunk_text) if key not in duplicates else None
+                if signature is not None:
+                    self._store_fingerprint(db, project_id, key, signature)
+                    fingerprinted += 1
+        return fingerprinted
+
+    def duplicate_keys(self, db: Session, project_id: int) -> Set[ChunkKey]:
+        """(document_id, chunk_index) of every chunk stored as a back-reference"""
+        return set(db.query(ChunkDuplicate.document_id, ChunkDuplicate.chunk_index).filter(
+            ChunkDuplicate.project_id == project_id
+        ).all())
+
+    def duplicate_sources(self, db: Session, project_id: int, keys: List[ChunkKey]) -> Dict[ChunkKey, List[int]]:
+        """Other documents containing each of the given stored chunks"""
+        if not keys:
+            return {}
+        wanted = set(keys)
+        sources: Dict[ChunkKey, List[int]] = {}
+        rows = db.query(
+            ChunkDuplicate.canonical_document_id, ChunkDuplicate.canonical_chunk_index, ChunkDuplicate.document_id
+        ).filter(
+            ChunkDuplicate.project_id == project_id,
+            ChunkDuplicate.canonical_document_id.in_({document_id for document_id, _ in wanted})
+        ).order_by(ChunkDuplicate.document_id).all()
+        for canonical_document_id, canonical_chunk_index, document_id in rows:
+            key = (canonical_document_id, canonical_chunk_index)
+            if key in wanted and document_id != canonical_document_id and document_id not in sources.get(key, []):
+                sources.setdefault(key, []).append(document_id)
+        return sources
+
+    def shared_chunks(self, db: Session, project_id: int, document_ids: Iterable[int]) -> Dict[ChunkKey, List[ChunkKey]]:
+        """Chunks of the given documents that are stored under another document
+
+        Maps each such stored chunk to the chunks of the given documents it
+        stands in for.
+        """
+        selected = set(document_ids)
+        shared: Dict[ChunkKey, List[ChunkKey]] = {}
+        rows = db.query(
+            ChunkDuplicate.document_id, ChunkDuplicate.chunk_index,
+            ChunkDuplicate.canonical_document_id, ChunkDuplicate.canonical_chunk_index
+        ).filter(
+            ChunkDuplicate.project_id == project_id,
+            ChunkDuplicate.document_id.in_(selected)
+        ).order_by(ChunkDuplicate.document_id, ChunkDuplicate.chunk_index).all()
+        for document_id, chunk_index, canonical_document_id, canonical_chunk_index in rows:
+            if canonical_document_id not in selected:
+                shared.setdefault((canonical_document_id, canonical_chunk_index), []).append((document_id, chunk_index))
+        return shared
+
+    def document_stats(self, db: Session, document_id: int, total_chunks: int) -> Dict:
+        """Duplicate chunk count and dedup ratio of a document"""
+        duplicate_chunks = db.query(ChunkDuplicate).filter(ChunkDuplicate.document_id == document_id).count()
+        return {
+            "duplicate_chunks": duplicate_chunks,
+            "stored_chunks": max(0, total_chunks - duplicate_chunks),
+            "dedup_ratio": round(duplicate_chunks / total_chunks, 4) if total_chunks else 0.0
+        }
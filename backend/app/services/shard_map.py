@@ -0,0 +1,151 @@
+"""
+Shard Map - which vector store location holds each project
+
+VECTOR_SHARDS lists named locations, each a local directory or a Chroma
+server URL. A project is placed on a shard when its first vectors are
+written: the owner on a consistent-hash ring of the shard names, so adding
+a shard only claims about 1/N of new projects. The placement is recorded in
+the project_shards table and stays put until rebalance_shards.py moves the
+project, so changing VECTOR_SHARDS never strands existing vectors.
+"""
+
+import bisect
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import ProjectShard
+
+def parse_shards(entries: List[str] = None) -> Dict[str, str]:
+    """{shard name: location} from "name=location" entries"""
+    shards = {}
+    for entry in entries if entries is not None else settings.vector_shards:
+        name, separator, location = entry.partition("=")
+        name, location = name.strip(), location.strip()
+        if not separator or not name or not location:
+            raise ValueError(f"Invalid VECTOR_SHARDS entry {entry!r}; expected name=location")
+        if name in shards:
+            raise ValueError(f"Duplicate shard name {name!r} in VECTOR_SHARDS")
+        shards[name] = location
+    return shards
+
+def is_remote_location(location: str) -> bool:
+    return location.startswith(("http://", "https://"))
+
+def numpy_shard_path(name: str, location: str) -> str:
+    """NumPy backend files of a shard: beside its Chroma files, or under NUMPY_BACKEND_PATH for a server"""
+    if is_remote_location(location):
+        return os.path.join(settings.numpy_backend_path, name)
+    return os.path.join(location, "numpy")
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+class HashRing:
+    """Consistent hashing of project ids onto shard names"""
+
+    def __init__(self, names: List[str], virtual_nodes: int = None):
+        if not names:
+            raise ValueError("A hash ring needs at least one shard")
+        virtual_nodes = virtual_nodes or settings.shard_virtual_nodes
+        # Virtual nodes spread each shard around the ring so load evens out
+        points = sorted((_ring_hash(f"{name}#{i}"), name) for name in names for i in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def owner(self, project_id: int) -> str:
+        index = bisect.bisect(self._hashes, _ring_hash(f"project:{project_id}")) % len(self._hashes)
+        return self._names[index]
+
+class ShardMap:
+    """Recorded project placements, falling back to the hash ring for new projects
+
+    Placements are cached per process and re-read every
+    SHARD_MAP_REFRESH_SECONDS, so a move made by another process is picked
+    up within that interval.
+    """
+
+    def __init__(self, names: List[str], refresh_seconds: float = None):
+        self.names = list(names)
+        self.ring = HashRing(self.names)
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else settings.shard_map_refresh_seconds
+        self._placements: Dict[int, str] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self, force: bool = False):
+        if not force and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        db = SessionLocal()
+        try:
+            placements = dict(db.query(ProjectShard.project_id, ProjectShard.shard).all())
+        finally:
+            db.close()
+        with self._lock:
+            self._placements = placements
+            self._loaded_at = time.monotonic()
+
+    def placement(self, project_id: int) -> Optional[str]:
+        """Recorded shard of a project, if it has one"""
+        self._refresh()
+        return self._placements.get(project_id)
+
+    def shard_for(self, project_id: int, create: bool = False) -> str:
+        """Shard holding a project; with create, record the placement of a project about to be written"""
+        shard = self.placement(project_id)
+        if shard is not None:
+            return shard
+        if not create:
+            return self.ring.owner(project_id)
+
+        # Another process may have placed the project since the last refresh
+        self._refresh(force=True)
+        shard = self._placements.get(project_id)
+        if shard is None:
+            shard = self.assign(project_id, self.ring.owner(project_id), only_if_missing=True)
+        return shard
+
+    def assign(self, project_id: int, shard: str, only_if_missing: bool = False) -> str:
+        """Record a project's shard; returns the placement now in effect"""
+        if shard not in self.names:
+            raise ValueError(f"Unknown shard {shard!r}; configured shards: {', '.join(self.names)}")
+        db = SessionLocal()
+        try:
+            row = db.query(ProjectShard).filter(ProjectShard.project_id == project_id).first()
+            if row is None:
+                db.add(ProjectShard(project_id=project_id, shard=shard))
+            elif not only_if_missing:
+                row.shard = shard
+            else:
+                shard = row.shard
+            db.commit()
+        except IntegrityError:
+            # Another process placed it first
+            db.rollback()
+            shard = db.query(ProjectShard.shard).filter(ProjectShard.project_id == project_id).scalar()
+        finally:
+            db.close()
+        with self._lock:
+            self._placements[project_id] = shard
+        return shard
+
+    def forget(self, project_id: int):
+        """Drop a deleted project's placement so a reused id is hashed afresh"""
+        db = SessionLocal()
+        try:
+            db.query(ProjectShard).filter(ProjectShard.project_id == project_id).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            self._placements.pop(project_id, None)
+
+    def placements(self) -> Dict[int, str]:
+        self._refresh(force=True)
+        return dict(self._placements)
@@ -0,0 +1,393 @@
+"""
+Snapshots - consistent copies of the vector store plus the relational rows behind it
+
+A snapshot is a directory:
+
+    manifest.json               embedding model, storage mode, per-project corpus versions
+    vector_codec.npz            fitted PCA projection (compact storage only)
+    projects/<id>/embeddings.npy   stored vectors, exactly as the backend holds them
+    projects/<id>/records.jsonl    chunk id, text and metadata per vector
+    projects/<id>/relational.json  Project, Document, DocumentChunk and chunk_duplicates rows
+
+Restoring copies stored vectors back into whichever backend the node uses, so
+no chunk is re-embedded. During an embedding model migration the current
+model's space is the one exported and restored; a restored project starts
+its migration over (see app.services.embedding_spaces).
+
+A project's rows are read first, in one transaction (REPEATABLE READ on
+PostgreSQL), and are the consistency point; its vectors are exported
+afterwards and streamed to disk. Vectors are kept for documents that were
+processed at that point and had every chunk vector exported. The others,
+e.g. documents another API worker was still ingesting, are recorded as
+pending and restored unprocessed, so writers in other processes never need
+to pause. Restored documents are only marked processed once their vectors
+are back in the store.
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import ChunkDuplicate, Document, DocumentChunk, Project
+from app.services import compaction, corpus_stats
+from app.services.lexical_index import LexicalIndex
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.vector_backends import EXPORT_BATCH_SIZE
+from app.services.vector_codec import VectorCodec, codec_path, load_vector_codec
+from app.services.vector_store import VectorStore
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+def snapshot_path(name: str) -> str:
+    """Location of a named snapshot under SNAPSHOT_DIR"""
+    if not name or os.path.basename(name) != name or name.startswith("."):
+        raise ValueError(f"Invalid snapshot name: {name!r}")
+    return os.path.join(settings.snapshot_dir, name)
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+def _export_vectors(vector_store: VectorStore, project_id: int, records_path: str, embeddings_path: str):
+    """Stream a project's stored rows to a records file and a raw float32 file
+
+    Returns the exported chunk ids, the document id of each row and the
+    vector dimensions.
+    """
+    vector_ids = set()
+    row_documents = []
+    dimensions = 0
+    # Under the compaction lease no process swaps the project's collection mid-export
+    expires_at = compaction.claim(project_id)
+    if expires_at is None:
+        raise ValueError(f"Project {project_id} is being compacted; try the snapshot again later")
+    keep_lease = compaction.LeaseRenewal(project_id, expires_at)
+    try:
+        with vector_store.write_lock, open(records_path, "w") as records, open(embeddings_path, "wb") as embeddings:
+            for batch in vector_store.export_project(project_id):
+                keep_lease()
+                if not batch["ids"]:
+                    continue
+                batch_embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+                dimensions = batch_embeddings.shape[1]
+                batch_embeddings.tofile(embeddings)
+                for row in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                    records.write(json.dumps(list(row)) + "\n")
+                vector_ids.update(batch["ids"])
+                row_documents.append(np.array(
+                    [metadata.get("document_id", -1) for metadata in batch["metadatas"]], dtype=np.int64
+                ))
+    finally:
+        compaction.release(project_id)
+    return vector_ids, np.concatenate(row_documents) if row_documents else np.zeros(0, dtype=np.int64), dimensions
+
+def _snapshot_project(db: Session, vector_store: VectorStore, project_id: int, directory: str) -> Dict:
+    if db.bind.dialect.name == "postgresql":
+        # Every read below sees the same commit
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if project is None:
+        raise ValueError(f"Project {project_id} not found")
+
+    # The rows are the consistency point; vectors exported after them are checked against them
+    documents = db.query(Document).filter(Document.project_id == project_id).order_by(Document.id).all()
+    chunks = db.query(DocumentChunk).join(Document).filter(
+        Document.project_id == project_id
+    ).order_by(DocumentChunk.document_id, DocumentChunk.chunk_index).all()
+    duplicates = db.query(ChunkDuplicate).filter(ChunkDuplicate.project_id == project_id).all()
+    version = corpus_stats.get_corpus_version(db, project_id)
+
+    project_directory = os.path.join(directory, "projects", str(project_id))
+    os.makedirs(project_directory)
+    staged_records = os.path.join(project_directory, "records.staged.jsonl")
+    staged_embeddings = os.path.join(project_directory, "embeddings.staged")
+    vector_ids, row_documents, dimensions = _export_vectors(vector_store, project_id, staged_records, staged_embeddings)
+
+    canonical_documents: Dict[tuple, int] = {
+        (duplicate.document_id, duplicate.chunk_index): duplicate.canonical_document_id for duplicate in duplicates
+    }
+    chunks_by_document: Dict[int, List[DocumentChunk]] = {}
+    for chunk in chunks:
+        chunks_by_document.setdefault(chunk.document_id, []).append(chunk)
+
+    # A document is complete once it is processed and every chunk has its vector,
+    # or is a near-duplicate of a chunk in another complete document
+    complete = {
+        document.id for document in documents
+        if document.processed and all(
+            f"doc_{chunk.document_id}_chunk_{chunk.chunk_index}" in vector_ids
+            or (chunk.document_id, chunk.chunk_index) in canonical_documents
+            for chunk in chunks_by_document.get(document.id, [])
+        )
+    }
+    while True:
+        dangling = {
+            document_id for (document_id, _), canonical_document_id in canonical_documents.items()
+            if document_id in complete and canonical_document_id not in complete
+        }
+        if not dangling:
+            break
+        complete -= dangling
+    pending = [document.id for document in documents if document.id not in complete]
+
+    # Copy the rows of complete documents out of the staged files, a batch at a time
+    keep = np.isin(row_documents, np.fromiter(complete, dtype=np.int64, count=len(complete)))
+    vector_count = int(keep.sum())
+    embeddings = np.lib.format.open_memmap(
+        os.path.join(project_directory, "embeddings.npy"), mode="w+", dtype=np.float32,
+        shape=(vector_count, dimensions)
+    )
+    if vector_count:
+        staged = np.memmap(staged_embeddings, dtype=np.float32, mode="r", shape=(len(keep), dimensions))
+        written = 0
+        for start in range(0, len(keep), EXPORT_BATCH_SIZE):
+            rows = staged[start:start + EXPORT_BATCH_SIZE][keep[start:start + EXPORT_BATCH_SIZE]]
+            embeddings[written:written + len(rows)] = rows
+            written += len(rows)
+        del staged
+    embeddings.flush()
+    del embeddings
+    with open(staged_records) as source, open(os.path.join(project_directory, "records.jsonl"), "w") as f:
+        for row, line in enumerate(source):
+            if keep[row]:
+                f.write(line)
+    os.remove(staged_records)
+    os.remove(staged_embeddings)
+
+    with open(os.path.join(project_directory, "relational.json"), "w") as f:
+        json.dump({
+            "project": {
+                "id": project.id,
+                "name": project.name,
+                "description": project.description,
+                "created_at": _timestamp(project.created_at)
+            },
+            "documents": [
+                {
+                    "id": document.id,
+                    "filename": document.filename,
+                    "original_filename": document.original_filename,
+                    "file_path": document.file_path,
+                    "file_size": document.file_size,
+                    "file_type": document.file_type,
+                    "processed": document.id in complete,
+                    "created_at": _timestamp(document.created_at)
+                }
+                for document in documents
+            ],
+            "chunks": [
+                {
+                    "id": chunk.id,
+                    "document_id": chunk.document_id,
+                    "chunk_text": chunk.chunk_text,
+                    "chunk_index": chunk.chunk_index,
+                    "chunk_metadata": chunk.chunk_metadata
+                }
+                for chunk in chunks if chunk.document_id in complete
+            ],
+            "duplicates": [
+                {
+                    "document_id": duplicate.document_id,
+                    "chunk_index": duplicate.chunk_index,
+                    "canonical_document_id": duplicate.canonical_document_id,
+                    "canonical_chunk_index": duplicate.canonical_chunk_index,
+                    "similarity": duplicate.similarity
+                }
+                for duplicate in duplicates if duplicate.document_id in complete
+            ]
+        }, f)
+
+    return {
+        "corpus_version": version,
+        "documents": len(documents),
+        "chunks": vector_count,
+        "pending_documents": pending
+    }
+
+def create_snapshot(vector_store: VectorStore, path: str, project_ids: Optional[List[int]] = None) -> Dict:
+    """Write a snapshot of the given projects (default: all) to path"""
+    if os.path.exists(path):
+        raise ValueError(f"Snapshot already exists: {path}")
+
+    # Build under a temporary name so a crash never leaves a half-written snapshot
+    staging = f"{path}.partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "embedding_model": settings.embedding_model,
+        "vector_storage_dtype": vector_store.codec.dtype,
+        "vector_pca_dimensions": vector_store.codec.pca_dimensions,
+        "projects": {}
+    }
+
+    db = SessionLocal()
+    try:
+        if project_ids is None:
+            project_ids = [row[0] for row in db.query(Project.id).order_by(Project.id).all()]
+        for project_id in project_ids:
+            # Each project is read in its own transaction
+            db.rollback()
+            manifest["projects"][str(project_id)] = _snapshot_project(db, vector_store, project_id, staging)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        db.close()
+
+    if vector_store.codec.uses_pca:
+        vector_store.codec.save(os.path.join(staging, "vector_codec.npz"))
+
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(staging, path)
+    return manifest
+
+def _check_compatible(manifest: Dict, vector_store: VectorStore, directory: str):
+    """Refuse to restore vectors that this node would interpret differently"""
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format_version')}")
+    if manifest["embedding_model"] != settings.embedding_model:
+        raise ValueError(f"Snapshot was embedded with {manifest['embedding_model']}, "
+                         f"this node uses {settings.embedding_model}")
+    if (manifest["vector_storage_dtype"], manifest["vector_pca_dimensions"]) != \
+            (vector_store.codec.dtype, vector_store.codec.pca_dimensions):
+        raise ValueError("Snapshot storage mode differs; set VECTOR_STORAGE_DTYPE and VECTOR_PCA_DIMENSIONS to "
+                         f"{manifest['vector_storage_dtype']} and {manifest['vector_pca_dimensions']}")
+
+    if vector_store.codec.uses_pca:
+        snapshot_codec = VectorCodec.load(os.path.join(directory, "vector_codec.npz"))
+        if vector_store.codec.fitted:
+            if not np.allclose(vector_store.codec.components, snapshot_codec.components):
+                raise ValueError("This node's vector codec was fitted on different data; "
+                                 "restore into a node without a fitted codec")
+        else:
+            shutil.copyfile(os.path.join(directory, "vector_codec.npz"), codec_path())
+            vector_store.codec = load_vector_codec()
+
+def _read_batches(project_directory: str) -> Iterator[Dict]:
+    embeddings = np.load(os.path.join(project_directory, "embeddings.npy"), mmap_mode="r")
+    with open(os.path.join(project_directory, "records.jsonl")) as f:
+        batch = []
+        offset = 0
+        for line in f:
+            batch.append(json.loads(line))
+            if len(batch) == EXPORT_BATCH_SIZE:
+                yield _batch(batch, embeddings[offset:offset + len(batch)])
+                offset += len(batch)
+                batch = []
+        if batch:
+            yield _batch(batch, embeddings[offset:offset + len(batch)])
+
+def _batch(records: List, embeddings: np.ndarray) -> Dict:
+    return {
+        "ids": [record[0] for record in records],
+        "embeddings": np.asarray(embeddings, dtype=np.float32),
+        "documents": [record[1] for record in records],
+        "metadatas": [record[2] for record in records]
+    }
+
+def _sync_sequences(db: Session):
+    """Move PostgreSQL id sequences past the restored ids"""
+    if db.bind.dialect.name != "postgresql":
+        return
+    for table in ("projects", "documents", "document_chunks"):
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 1))"
+        ))
+
+def _restore_project(db: Session, vector_store: VectorStore, lexical_index: LexicalIndex,
+                     near_duplicate_index: NearDuplicateIndex, project_id: int, project_directory: str,
+                     chunk_count: int):
+    with open(os.path.join(project_directory, "relational.json")) as f:
+        data = json.load(f)
+
+    document_ids = [document["id"] for document in data["documents"]]
+    if document_ids:
+        conflict = db.query(Document.id).filter(Document.id.in_(document_ids), Document.project_id != project_id).first()
+        if conflict is not None:
+            raise ValueError(f"Document {conflict[0]} already belongs to another project on this node")
+
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if project is None:
+        project = Project(id=project_id, created_at=_parse_timestamp(data["project"]["created_at"]))
+        db.add(project)
+    project.name = data["project"]["name"]
+    project.description = data["project"]["description"]
+
+    # Replace whatever this node holds for the project; rows referencing its documents go first
+    lexical_index.delete_project(db, project_id)
+    near_duplicate_index.delete_project(db, project_id)
+    corpus_stats.record_project_deleted(db, project_id)
+    existing_documents = [row[0] for row in db.query(Document.id).filter(Document.project_id == project_id).all()]
+    if existing_documents:
+        db.query(DocumentChunk).filter(DocumentChunk.document_id.in_(existing_documents)).delete(synchronize_session=False)
+    db.query(Document).filter(Document.project_id == project_id).delete(synchronize_session=False)
+    db.flush()
+
+    db.bulk_insert_mappings(Document, [
+        # Unprocessed until the vectors below are in place, so a failed vector restore doesn't pass as done
+        dict(document, project_id=project_id, processed=False, created_at=_parse_timestamp(document["created_at"]))
+        for document in data["documents"]
+    ])
+    db.bulk_insert_mappings(DocumentChunk, data["chunks"])
+    db.bulk_insert_mappings(ChunkDuplicate, [
+        dict(duplicate, project_id=project_id) for duplicate in data.get("duplicates", [])
+    ])
+    db.flush()
+    documents = db.query(Document).filter(Document.project_id == project_id).all()
+    near_duplicate_index.rebuild_project(db, project_id, documents)
+    lexical_index.rebuild_project(db, project_id, documents, exclude=near_duplicate_index.duplicate_keys(db, project_id))
+    corpus_stats.bump_corpus_version(db, project_id)
+    _sync_sequences(db)
+    db.commit()
+
+    vector_store.restore_project(project_id, _read_batches(project_directory), chunk_count)
+    processed = [document["id"] for document in data["documents"] if document["processed"]]
+    if processed:
+        db.query(Document).filter(Document.project_id == project_id, Document.id.in_(processed)).update(
+            {Document.processed: True}, synchronize_session=False
+        )
+    corpus_stats.bump_corpus_version(db, project_id)
+    db.commit()
+    corpus_stats.reconcile(db, project_id)
+
+def restore_snapshot(vector_store: VectorStore, lexical_index: LexicalIndex,
+                     near_duplicate_index: NearDuplicateIndex, path: str) -> Dict:
+    """Load a snapshot into this node, replacing the projects it contains"""
+    with open(os.path.join(path, "manifest.json")) as f:
+        manifest = json.load(f)
+    _check_compatible(manifest, vector_store, path)
+
+    restored = {}
+    db = SessionLocal()
+    try:
+        for project_id, entry in manifest["projects"].items():
+            _restore_project(
+                db, vector_store, lexical_index, near_duplicate_index, int(project_id),
+                os.path.join(path, "projects", project_id), entry["chunks"]
+            )
+            restored[project_id] = {
+                "chunks": entry["chunks"],
+                "snapshot_corpus_version": entry["corpus_version"],
+                "corpus_version": corpus_stats.get_corpus_version(db, int(project_id))
+            }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return {"snapshot": path, "created_at": manifest["created_at"], "projects": restored}
@@ -0,0 +1,1150 @@
+"""
+Vector Backends - storage engines behind VectorStore
+
+VectorStore embeds text and handles caching; a backend only stores and
+searches vectors for a project:
+
+- ChromaBackend: HNSW collections in ChromaDB (one per project), either
+                 embedded on a local path or on a shared Chroma server
+- NumpyBackend:  exact search over per-project normalized float32 matrices,
+                 memory-mapped from .npy files; no index build cost, and
+                 faster than HNSW for small and medium projects
+- ShardedBackend: one backend of either kind per shard, routing each
+                 project to its shard (see app.services.shard_map)
+
+Backends exchange rows as dicts of parallel lists:
+{"ids": [...], "embeddings": np.ndarray, "documents": [...], "metadatas": [...]}
+"""
+
+import fcntl
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+
+from app.core.config import settings
+from app.services.vector_codec import normalize
+
+EXPORT_BATCH_SIZE = 1000
+
+# Exception class names of transient transport failures (httpx and requests, across Chroma versions)
+TRANSIENT_ERROR_NAMES = {
+    "ConnectError", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout", "ReadError", "WriteError",
+    "RemoteProtocolError", "ConnectionError", "Timeout", "ChunkedEncodingError",
+}
+
+def is_transient_error(error: Exception) -> bool:
+    """True for failures worth retrying against a Chroma server: transport errors and 5xx responses"""
+    if isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in TRANSIENT_ERROR_NAMES:
+        return True
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status_code, int) and status_code >= 500
+
+def is_missing_collection_error(error: Exception) -> bool:
+    """True when Chroma reports that a collection (e.g. one dropped by another worker) doesn't exist"""
+    return "does not exist" in str(error) or type(error).__name__ in {"InvalidCollectionException", "NotFoundError"}
+
+def with_retries(operation, retries: int, backoff_seconds: float):
+    """Run operation, retrying transient failures with exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return operation()
+        except Exception as e:
+            if attempt == retries or not is_transient_error(e):
+                raise
+            delay = backoff_seconds * (2 ** attempt)
+            print(f"Chroma request failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+def _http_client(host: str, port: int, ssl: bool):
+    headers = {"Authorization": f"Bearer {settings.chroma_auth_token}"} if settings.chroma_auth_token else None
+    # The client keeps one pooled HTTP session, so every request from this process reuses its connections
+    return with_retries(
+        lambda: chromadb.HttpClient(
+            host=host,
+            port=port,
+            ssl=ssl,
+            headers=headers,
+            settings=Settings(anonymized_telemetry=False)
+        ),
+        settings.chroma_max_retries,
+        settings.chroma_retry_backoff_seconds
+    )
+
+def create_chroma_client(location: str = None):
+    """Create a ChromaDB client: embedded on VECTOR_DB_PATH, or an HTTP client for a Chroma server
+
+    location overrides the configuration with a directory or an
+    http(s)://host:port URL, e.g. for one shard.
+    """
+    if location is not None:
+        if location.startswith(("http://", "https://")):
+            url = urlparse(location)
+            return _http_client(url.hostname, url.port or 8000, url.scheme == "https")
+        path = location
+    elif settings.chroma_mode == "http":
+        return _http_client(settings.chroma_host, settings.chroma_port, settings.chroma_ssl)
+    elif settings.chroma_mode == "persistent":
+        path = settings.vector_db_path
+    else:
+        raise ValueError(f"Unsupported CHROMA_MODE: {settings.chroma_mode}. Supported: persistent, http")
+    
+    os.makedirs(path, exist_ok=True)
+    return chromadb.PersistentClient(
+        path=path,
+        settings=Settings(anonymized_telemetry=False)
+    )
+
+def hnsw_metadata(m: int = None, construction_ef: int = None, search_ef: int = None) -> Dict[str, Any]:
+    """Collection metadata selecting cosine distance and the HNSW parameters (settings by default)"""
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:M": m or settings.chroma_hnsw_m,
+        "hnsw:construction_ef": construction_ef or settings.chroma_hnsw_construction_ef,
+        "hnsw:search_ef": search_ef or settings.chroma_hnsw_search_ef
+    }
+
+def effective_search_ef(collection) -> Optional[int]:
+    """search_ef a Chroma collection currently queries with
+
+    Chroma 0.6+ keeps it in the collection configuration, which a
+    configuration modify updates while the creation metadata keeps the old
+    value; older versions only have the metadata.
+    """
+    configuration = getattr(collection, "configuration", None)
+    if not isinstance(configuration, dict):
+        configuration = getattr(collection, "configuration_json", None)
+    if isinstance(configuration, dict):
+        hnsw = configuration.get("hnsw") or configuration.get("hnsw_configuration") or {}
+        if hnsw.get("ef_search") is not None:
+            return hnsw["ef_search"]
+    return (collection.metadata or {}).get("hnsw:search_ef")
+
+class VectorBackend:
+    """Interface implemented by every vector storage engine"""
+
+    name = "base"
+
+    def max_insert_batch(self) -> int:
+        return settings.vector_db_max_insert_batch
+
+    def add(self, project_id: int, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        raise NotImplementedError
+
+    def query(self, project_id: int, query_embedding: np.ndarray, n_results: int, where: Optional[Dict] = None,
+              include_embeddings: bool = False) -> List[Dict]:
+        """Nearest chunks as dicts with content, metadata, cosine distance and id
+
+        With include_embeddings, each result also carries its stored vector
+        under 'embedding'.
+        """
+        raise NotImplementedError
+
+    def query_many(self, project_id: int, query_embeddings: np.ndarray, n_results: int, where: Optional[Dict] = None,
+                   include_embeddings: bool = False) -> List[List[Dict]]:
+        """query() for several query vectors at once; one result list per query"""
+        return [
+            self.query(project_id, query_embedding, n_results, where, include_embeddings)
+            for query_embedding in query_embeddings
+        ]
+
+    def delete_document(self, project_id: int, document_id: int) -> int:
+        """Delete a document's rows; returns the number of rows removed"""
+        raise NotImplementedError
+
+    def delete_project(self, project_id: int):
+        raise NotImplementedError
+
+    def count(self, project_id: int) -> int:
+        raise NotImplementedError
+
+    def has_project(self, project_id: int) -> bool:
+        return self.count(project_id) > 0
+
+    def list_projects(self) -> List[int]:
+        raise NotImplementedError
+
+    def export_project(self, project_id: int, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Dict]:
+        """Yield all of a project's rows, including stored embeddings"""
+        raise NotImplementedError
+
+    def replace_project(self, project_id: int, batches: Iterable[Dict]):
+        """Atomically swap a project's contents for the given rows"""
+        raise NotImplementedError
+
+    def storage_bytes(self, project_id: int) -> Optional[int]:
+        """Bytes on disk behind a project's vectors, if this backend can tell"""
+        return None
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+class ChromaBackend(VectorBackend):
+    """Project vectors stored in ChromaDB HNSW collections"""
+
+    name = "chroma"
+
+    def __init__(self, client, embedding_function=None, layout: str = None, retries: int = None,
+                 hnsw: Optional[Dict[str, Any]] = None, path: Optional[str] = None, collection_prefix: str = None):
+        self.client = client
+        # Collections of other embedding spaces carry a suffix (see app.services.embedding_spaces)
+        self.collection_prefix = collection_prefix or settings.vector_db_collection_name
+        # Directory of an embedded client, for disk use reporting
+        self.path = path
+        self.embedding_function = embedding_function
+        self.layout = layout or settings.vector_db_layout
+        # Only a remote server has transient failures worth retrying
+        if retries is None:
+            retries = settings.chroma_max_retries if settings.chroma_mode == "http" else 0
+        self.retries = retries
+        self.hnsw = hnsw or hnsw_metadata()
+        self._max_insert_batch: Optional[int] = None
+        self._collections: Dict[str, Any] = {}
+        self._collections_lock = threading.Lock()
+
+    def collection_name(self, project_id: int) -> str:
+        """Name of the collection holding a project's chunks"""
+        if self.layout == "global":
+            return self.collection_prefix
+        return f"{self.collection_prefix}_project_{project_id}"
+
+    def _project_filter(self, project_id: int, where: Optional[Dict] = None) -> Optional[Dict]:
+        """Metadata filter for a project; only the legacy global layout needs one"""
+        if self.layout != "global":
+            return where
+        if where:
+            return {"$and": [{"project_id": project_id}, where]}
+        return {"project_id": project_id}
+
+    def _retry(self, operation):
+        return with_retries(operation, self.retries, settings.chroma_retry_backoff_seconds)
+
+    def _create_collection(self, name: str):
+        return self._retry(lambda: self.client.get_or_create_collection(
+            name=name,
+            metadata=self.hnsw,
+            embedding_function=self.embedding_function
+        ))
+
+    def _sync_search_ef(self, collection):
+        """Apply the configured search_ef to an existing collection
+
+        M and construction_ef are fixed when a collection is built (a
+        snapshot restore or shard move rebuilds it with the current ones);
+        search_ef only affects queries, so Chroma lets it change in place.
+        """
+        search_ef = self.hnsw["hnsw:search_ef"]
+        if effective_search_ef(collection) == search_ef:
+            return
+        try:
+            try:
+                self._retry(lambda: collection.modify(configuration={"hnsw": {"ef_search": search_ef}}))
+            except TypeError:
+                # Chroma before 0.6 reads HNSW parameters from the collection metadata; only
+                # search_ef may change there (Chroma rejects changes to hnsw:space and the rest)
+                self._retry(lambda: collection.modify(metadata={"hnsw:search_ef": search_ef}))
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            print(f"Warning: could not set search_ef={search_ef} on collection {collection.name}: {e}")
+
+    def _get_collection(self, project_id: int, create: bool = True):
+        """Return a project's collection, creating it on first write"""
+        name = self.collection_name(project_id)
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+
+        with self._collections_lock:
+            if name in self._collections:
+                return self._collections[name]
+
+            if create:
+                collection = self._create_collection(name)
+            else:
+                try:
+                    collection = self._retry(lambda: self.client.get_collection(
+                        name=name,
+                        embedding_function=self.embedding_function
+                    ))
+                except Exception as e:
+                    if is_transient_error(e):
+                        raise
+                    # Nothing has been written for this project yet
+                    return None
+
+            self._sync_search_ef(collection)
+            self._collections[name] = collection
+            return collection
+
+    def _call(self, project_id: int, method: str, create: bool = False, **kwargs):
+        """Call a collection method with retries; None if the project has no collection
+
+        Another worker may drop or swap a project's collection (delete,
+        restore), leaving the cached handle pointing at a collection that no
+        longer exists; the handle is then refreshed once.
+        """
+        for attempt in range(2):
+            collection = self._get_collection(project_id, create=create)
+            if collection is None:
+                return None
+            try:
+                return self._retry(lambda: getattr(collection, method)(**kwargs))
+            except Exception as e:
+                if attempt or not is_missing_collection_error(e):
+                    raise
+                with self._collections_lock:
+                    if self._collections.get(self.collection_name(project_id)) is collection:
+                        del self._collections[self.collection_name(project_id)]
+
+    def max_insert_batch(self) -> int:
+        """Largest number of records a single collection.add may receive"""
+        # An HTTP client asks the server for its limit, so ask once
+        if self._max_insert_batch is None:
+            limit = settings.vector_db_max_insert_batch
+            if hasattr(self.client, "get_max_batch_size"):
+                limit = min(limit, self._retry(self.client.get_max_batch_size))
+            elif hasattr(self.client, "max_batch_size"):
+                limit = min(limit, self.client.max_batch_size)
+            self._max_insert_batch = max(1, limit)
+        return self._max_insert_batch
+
+    def add(self, project_id, ids, embeddings, documents, metadatas):
+        # Lists keep this compatible with Chroma versions that reject ndarrays; upsert keeps a retried write idempotent
+        self._call(
+            project_id,
+            "upsert",
+            create=True,
+            ids=ids,
+            embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def query(self, project_id, query_embedding, n_results, where=None, include_embeddings=False):
+        return self.query_many(project_id, np.asarray(query_embedding)[None, :], n_results, where, include_embeddings)[0]
+
+    def query_many(self, project_id, query_embeddings, n_results, where=None, include_embeddings=False):
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        # One round trip for every query
+        results = self._call(
+            project_id,
+            "query",
+            query_embeddings=np.asarray(query_embeddings, dtype=np.float32).tolist(),
+            n_results=n_results,
+            where=self._project_filter(project_id, where),
+            include=include
+        )
+        if results is None:
+            return [[] for _ in query_embeddings]
+
+        formatted_results = []
+        for q in range(len(query_embeddings)):
+            query_results = []
+            documents = results['documents'][q] if results['documents'] else []
+            for i, doc in enumerate(documents or []):
+                query_results.append({
+                    'content': doc,
+                    'metadata': results['metadatas'][q][i],
+                    'distance': results['distances'][q][i] if results['distances'] else None,
+                    'id': results['ids'][q][i]
+                })
+                if include_embeddings:
+                    query_results[-1]['embedding'] = np.asarray(results['embeddings'][q][i], dtype=np.float32)
+            formatted_results.append(query_results)
+        return formatted_results
+
+    def delete_document(self, project_id, document_id):
+        # Look the ids up first so the caller learns how many HNSW tombstones this leaves
+        page = self._call(
+            project_id,
+            "get",
+            where=self._project_filter(project_id, {"document_id": document_id}),
+            include=[]
+        )
+        if page is None or not page['ids']:
+            return 0
+        self._call(project_id, "delete", ids=page['ids'])
+        return len(page['ids'])
+
+    def _drop_collection(self, name: str):
+        try:
+            self._retry(lambda: self.client.delete_collection(name=name))
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            # Collection never existed
+
+    def delete_project(self, project_id):
+        if self.layout == "global":
+            self._call(project_id, "delete", where={"project_id": project_id})
+            return
+
+        # Each project owns its collection, so deleting it is a single drop
+        name = self.collection_name(project_id)
+        with self._collections_lock:
+            self._collections.pop(name, None)
+            self._drop_collection(name)
+
+    def count(self, project_id):
+        if self.layout == "global":
+            page = self._call(project_id, "get", where={"project_id": project_id}, include=[])
+            return len(page['ids']) if page is not None else 0
+        return self._call(project_id, "count") or 0
+
+    def list_projects(self):
+        prefix = f"{self.collection_prefix}_project_"
+        names = [c if isinstance(c, str) else c.name for c in self._retry(self.client.list_collections)]
+        return sorted(int(name[len(prefix):]) for name in names if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+    def export_project(self, project_id, batch_size=EXPORT_BATCH_SIZE):
+        offset = 0
+        while True:
+            page = self._call(
+                project_id,
+                "get",
+                where=self._project_filter(project_id),
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset
+            )
+            if page is None or not page['ids']:
+                break
+            yield {
+                "ids": page['ids'],
+                "embeddings": np.asarray(page['embeddings'], dtype=np.float32),
+                "documents": page['documents'],
+                "metadatas": page['metadatas']
+            }
+            offset += len(page['ids'])
+
+    def replace_project(self, project_id, batches):
+        if self.layout == "global":
+            self.delete_project(project_id)
+            for batch in batches:
+                self.add(project_id, **batch)
+            return
+
+        # Build a shadow collection, then swap it in under the project's name
+        name = self.collection_name(project_id)
+        self._swap_in(name, self._build_shadow(f"{name}_shadow", batches))
+
+    def _build_shadow(self, shadow_name: str, batches: Iterable[Dict]):
+        self._drop_collection(shadow_name)
+        shadow = self._create_collection(shadow_name)
+        for batch in batches:
+            self._upsert(shadow, batch)
+        return shadow
+
+    def _upsert(self, collection, batch: Dict):
+        self._retry(lambda: collection.upsert(
+            ids=batch["ids"],
+            embeddings=np.asarray(batch["embeddings"], dtype=np.float32).tolist(),
+            documents=batch["documents"],
+            metadatas=batch["metadatas"]
+        ))
+
+    def _find_collection(self, name: str):
+        """A collection by name, or None if there is none"""
+        try:
+            return self._retry(lambda: self.client.get_collection(name=name, embedding_function=self.embedding_function))
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            return None
+
+    def _count(self, collection) -> int:
+        return self._retry(collection.count) if collection is not None else 0
+
+    def _copy_rows(self, source, target):
+        """Upsert every row of one collection into another"""
+        offset = 0
+        while True:
+            page = self._retry(lambda: source.get(
+                include=["embeddings", "documents", "metadatas"], limit=EXPORT_BATCH_SIZE, offset=offset
+            ))
+            if not page['ids']:
+                return
+            self._upsert(target, page)
+            offset += len(page['ids'])
+
+    def _recover_swap(self, name: str):
+        """Settle a swap that failed midway and left the old collection renamed aside
+
+        If the name holds fewer rows than the retired collection (typically
+        an empty collection another process created while the name was
+        free), the retired one is the real data: rows written to the
+        newcomer are merged into it and it takes its name back. Otherwise
+        the swap had completed and the retired copy is dropped.
+        """
+        retired_name = f"{name}_retired"
+        retired = self._find_collection(retired_name)
+        if retired is None:
+            return
+        current = self._find_collection(name)
+        if self._count(current) >= self._count(retired):
+            self._drop_collection(retired_name)
+            return
+        print(f"Restoring collection {name} from {retired_name} after an interrupted swap")
+        if current is not None:
+            self._copy_rows(current, retired)
+            self._drop_collection(name)
+        self._retry(lambda: retired.modify(name=name))
+
+    def _swap_in(self, name: str, shadow, expected_rows: int = None):
+        """Give a shadow collection a project's collection name
+
+        The old collection is renamed aside and only dropped once the shadow
+        verifiably holds the name (and, if given, expected_rows rows), so
+        handles to it keep answering queries meanwhile and a failed rename
+        never loses it. Another process can claim the free name between the
+        two renames; the old collection is then put back and the error raised.
+        """
+        retired_name = f"{name}_retired"
+        with self._collections_lock:
+            self._collections.pop(name, None)
+            self._recover_swap(name)
+            old = self._find_collection(name)
+            if old is not None:
+                self._retry(lambda: old.modify(name=retired_name))
+            try:
+                self._retry(lambda: shadow.modify(name=name))
+            except Exception:
+                if old is not None:
+                    self._recover_swap(name)
+                raise
+            if old is None:
+                return
+
+            current = self._find_collection(name)
+            if current is None or current.id != shadow.id:
+                print(f"Warning: collection {name} is not the rebuilt copy after the swap; keeping {retired_name}")
+                return
+            if expected_rows is not None and self._count(current) < expected_rows:
+                print(f"Warning: collection {name} holds fewer rows than expected after the swap; keeping {retired_name}")
+                return
+            self._drop_collection(retired_name)
+
+    def rebuild_project(self, project_id: int, swap_lock=None, keep_lease: Optional[Callable[[], None]] = None) -> int:
+        """Rebuild a project's collection from its live rows, leaving deleted-row tombstones behind
+
+        Reads and writes keep going to the old collection until the swap.
+        Rows added or deleted during the build are applied to the new
+        collection just before it is swapped in; swap_lock, if given, is
+        held for that last step so this process's writes can't slip in
+        between. keep_lease, if given, is called before every batch and the
+        swap; an exception from it abandons the rebuild. Returns the number
+        of live rows.
+        """
+        if self.layout == "global":
+            raise ValueError("Rebuilding a single project needs the per_project collection layout")
+
+        name = self.collection_name(project_id)
+        copied = set()
+        def rows():
+            for batch in self.export_project(project_id):
+                if keep_lease is not None:
+                    keep_lease()
+                copied.update(batch["ids"])
+                yield batch
+        shadow = self._build_shadow(f"{name}_shadow", rows())
+
+        with swap_lock if swap_lock is not None else nullcontext():
+            if keep_lease is not None:
+                keep_lease()
+            page = self._call(project_id, "get", include=[])
+            if page is None:
+                # The project was deleted meanwhile; don't bring it back
+                self._drop_collection(f"{name}_shadow")
+                return 0
+            current = set(page['ids'])
+            added = sorted(current - copied)
+            for start in range(0, len(added), EXPORT_BATCH_SIZE):
+                late = self._call(
+                    project_id,
+                    "get",
+                    ids=added[start:start + EXPORT_BATCH_SIZE],
+                    include=["embeddings", "documents", "metadatas"]
+                )
+                self._upsert(shadow, late)
+            removed = sorted(copied - current)
+            if removed:
+                self._retry(lambda: shadow.delete(ids=removed))
+
+            self._swap_in(name, shadow, expected_rows=len(current))
+        return len(current)
+
+    def storage_bytes(self, project_id):
+        # Chroma doesn't expose per-collection files; this is the whole embedded store
+        if self.path is None or not os.path.isdir(self.path):
+            return None
+        return directory_size(self.path)
+
+class _SegmentRecords:
+    """[id, content, metadata] rows of one segment, read from disk on demand
+
+    Segments are written as JSON lines with the byte offset of every line and
+    a separate list of their ids, so a row is read without parsing the
+    others. Segments written before that are one JSON list, loaded whole.
+    """
+
+    def __init__(self, directory: str, records_file: str):
+        path = os.path.join(directory, records_file)
+        self._rows = None
+        if records_file.endswith(".jsonl"):
+            stem = path[:-len(".jsonl")]
+            self._offsets = np.load(f"{stem}.offsets.npy", mmap_mode="r")
+            self._ids_path = f"{stem}.ids.json"
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        else:
+            with open(path) as f:
+                self._rows = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self._rows) if self._rows is not None else len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> List:
+        if self._rows is not None:
+            return self._rows[row]
+        return json.loads(self._data[int(self._offsets[row]):int(self._offsets[row + 1])])
+
+    def ids(self) -> List[str]:
+        if self._rows is not None:
+            return [record[0] for record in self._rows]
+        with open(self._ids_path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def write(directory: str, name: str, records: List) -> str:
+        """Write a segment's records; returns the file name to list in segments.json"""
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        with open(os.path.join(directory, f"{name}.jsonl"), "wb") as f:
+            for i, record in enumerate(records):
+                line = (json.dumps(record) + "\n").encode("utf-8")
+                f.write(line)
+                offsets[i + 1] = offsets[i] + len(line)
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+        with open(os.path.join(directory, f"{name}.ids.json"), "w") as f:
+            json.dump([record[0] for record in records], f)
+        return f"{name}.jsonl"
+
+    @staticmethod
+    def files(records_file: str) -> List[str]:
+        """Every file behind a segment's records"""
+        if not records_file.endswith(".jsonl"):
+            return [records_file]
+        stem = records_file[:-len(".jsonl")]
+        return [records_file, f"{stem}.offsets.npy", f"{stem}.ids.json"]
+
+class _NumpyProjectState:
+    """Loaded arrays for one version of a project's files"""
+
+    # Metadata filters on these keys are answered from per-row arrays
+    COLUMNS = {"document_id": "document_ids", "chunk_index": "chunk_indexes"}
+
+    def __init__(self, version: str, segments: List[List[str]], matrices: List[np.ndarray],
+                 segment_records: List[_SegmentRecords], document_ids: np.ndarray, chunk_indexes: np.ndarray,
+                 alive: np.ndarray, row_of_id: Optional[Dict[str, int]] = None):
+        self.version = version
+        self.segments = segments  # [embeddings file, records file] per segment, in row order
+        self.matrices = matrices  # One memory-mapped matrix per segment
+        self.segment_records = segment_records
+        self.offsets = np.cumsum([0] + [len(matrix) for matrix in matrices])
+        self.document_ids = document_ids
+        self.chunk_indexes = chunk_indexes
+        self.alive = alive
+        self._row_of_id = row_of_id
+
+    def scores(self, query_vectors: np.ndarray) -> np.ndarray:
+        """Dot product of each query with every row"""
+        return np.concatenate([query_vectors @ matrix.T for matrix in self.matrices], axis=1)
+
+    def vectors(self, rows) -> np.ndarray:
+        """Stored vectors of some rows, in the order given"""
+        rows = np.asarray(rows, dtype=np.int64)
+        dimensions = self.matrices[0].shape[1] if self.matrices else 0
+        vectors = np.empty((len(rows), dimensions), dtype=np.float32)
+        segment_of_row = np.searchsorted(self.offsets, rows, side="right") - 1
+        for segment in np.unique(segment_of_row):
+            mask = segment_of_row == segment
+            vectors[mask] = self.matrices[segment][rows[mask] - self.offsets[segment]]
+        return vectors
+
+    def record(self, row: int) -> List:
+        """[id, content, metadata] of a row"""
+        segment = int(np.searchsorted(self.offsets, row, side="right")) - 1
+        return self.segment_records[segment][int(row - self.offsets[segment])]
+
+    def records(self, rows) -> List[List]:
+        return [self.record(row) for row in rows]
+
+    def row_of_id(self) -> Dict[str, int]:
+        """Latest row stored under each chunk id, built on first use"""
+        if self._row_of_id is None:
+            row_of_id: Dict[str, int] = {}
+            for start, records in zip(self.offsets, self.segment_records):
+                row_of_id.update(zip(records.ids(), range(int(start), int(start) + len(records))))
+            self._row_of_id = row_of_id
+        return self._row_of_id
+
+    def column(self, key: str) -> Optional[np.ndarray]:
+        """Per-row values of a metadata key, if it is one of COLUMNS"""
+        return getattr(self, self.COLUMNS[key]) if key in self.COLUMNS else None
+
+class NumpyBackend(VectorBackend):
+    """Exact cosine search over memory-mapped per-project matrices
+
+    Each project directory holds immutable version directories and a CURRENT
+    file naming the live one. Writes build a new version and switch CURRENT
+    with an atomic rename, so readers in any process always see a complete
+    version; a LOCK file serializes writers across processes. A version's
+    rows live in append-only segments hard-linked between versions, so an
+    add only writes its own rows; trailing segments are merged size-tiered,
+    keeping their number logarithmic. Only the vectors and the document_id
+    and chunk_index columns are scanned; records are read row by row, and
+    upserts find existing rows through an id map. Deletes only rewrite the
+    small alive mask; rows are physically removed by compaction once the deleted fraction
+    passes a threshold. Superseded versions stay on disk for
+    NUMPY_VERSION_RETENTION_SECONDS, since other processes may still be
+    opening them.
+    """
+
+    name = "numpy"
+
+    def __init__(self, root: str = None, compaction_threshold: float = None, retention_seconds: float = None):
+        self.root = root or settings.numpy_backend_path
+        self.compaction_threshold = compaction_threshold if compaction_threshold is not None else settings.numpy_compaction_threshold
+        self.retention_seconds = (
+            retention_seconds if retention_seconds is not None else settings.numpy_version_retention_seconds
+        )
+        self._states: Dict[int, _NumpyProjectState] = {}
+        self._locks: Dict[int, threading.Lock] = defaultdict(threading.Lock)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _project_dir(self, project_id: int) -> str:
+        return os.path.join(self.root, f"project_{project_id}")
+
+    @contextmanager
+    def _writing(self, project_id: int):
+        """Exclusive write access to a project, across threads and processes"""
+        project_dir = self._project_dir(project_id)
+        lock_path = os.path.join(project_dir, "LOCK")
+        with self._locks[project_id]:
+            while True:
+                os.makedirs(project_dir, exist_ok=True)
+                lock_file = open(lock_path, "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # delete_project may have removed the file we waited on; lock the current one instead
+                    if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                        break
+                except FileNotFoundError:
+                    pass
+                lock_file.close()
+            try:
+                yield
+            finally:
+                lock_file.close()
+
+    def _current_version(self, project_id: int) -> Optional[str]:
+        try:
+            with open(os.path.join(self._project_dir(project_id), "CURRENT")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _load(self, project_id: int) -> Optional[_NumpyProjectState]:
+        """Current state of a project, reloaded if another writer switched versions"""
+        for attempt in range(2):
+            version = self._current_version(project_id)
+            if version is None:
+                self._states.pop(project_id, None)
+                return None
+
+            state = self._states.get(project_id)
+            if state is not None and state.version == version:
+                return state
+            try:
+                state = self._read_version(project_id, version)
+            except FileNotFoundError:
+                # Retired while we were opening it; CURRENT has moved on since
+                if attempt:
+                    raise
+                continue
+            self._states[project_id] = state
+            return state
+
+    def _read_version(self, project_id: int, version: str) -> _NumpyProjectState:
+        directory = os.path.join(self._project_dir(project_id), version)
+        try:
+            with open(os.path.join(directory, "segments.json")) as f:
+                segments = json.load(f)
+        except FileNotFoundError:
+            # Versions written before segments existed hold a single matrix
+            segments = [["embeddings.npy", "records.json"]]
+        segment_records = [_SegmentRecords(directory, records_file) for _, records_file in segments]
+        try:
+            chunk_indexes = np.load(os.path.join(directory, "chunk_indexes.npy"))
+        except FileNotFoundError:
+            # Versions written before the column existed
+            chunk_indexes = np.array([
+                records[row][2].get("chunk_index", -1) for records in segment_records for row in range(len(records))
+            ], dtype=np.int64)
+        return _NumpyProjectState(
+            version=version,
+            segments=segments,
+            matrices=[np.load(os.path.join(directory, embeddings_file), mmap_mode="r") for embeddings_file, _ in segments],
+            segment_records=segment_records,
+            document_ids=np.load(os.path.join(directory, "document_ids.npy")),
+            chunk_indexes=chunk_indexes,
+            alive=np.load(os.path.join(directory, "alive.npy"))
+        )
+
+    def _write_version(self, project_id: int, base: Optional[_NumpyProjectState], keep: int, new_segments: List[tuple],
+                       document_ids: np.ndarray, chunk_indexes: np.ndarray, alive: np.ndarray,
+                       row_of_id: Optional[Dict[str, int]] = None) -> _NumpyProjectState:
+        """Write a new version and make it current; caller holds _writing
+
+        The first keep segments of base are hard-linked, then new_segments,
+        (embeddings, records) pairs, are written after them. Pass row_of_id
+        only if it is still right for the new version's rows.
+        """
+        project_dir = self._project_dir(project_id)
+        version = f"v_{uuid.uuid4().hex}"
+        directory = os.path.join(project_dir, version)
+        os.makedirs(directory)
+
+        segments = [list(segment) for segment in base.segments[:keep]] if base is not None else []
+        matrices = list(base.matrices[:keep]) if base is not None else []
+        segment_records = list(base.segment_records[:keep]) if base is not None else []
+        for embeddings_file, records_file in segments:
+            for file_name in [embeddings_file, *_SegmentRecords.files(records_file)]:
+                os.link(os.path.join(project_dir, base.version, file_name), os.path.join(directory, file_name))
+        for embeddings, records in new_segments:
+            name = f"s_{uuid.uuid4().hex}"
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(embeddings, dtype=np.float32))
+            records_file = _SegmentRecords.write(directory, name, records)
+            segments.append([f"{name}.npy", records_file])
+            matrices.append(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+            segment_records.append(_SegmentRecords(directory, records_file))
+
+        with open(os.path.join(directory, "segments.json"), "w") as f:
+            json.dump(segments, f)
+        np.save(os.path.join(directory, "document_ids.npy"), document_ids.astype(np.int64))
+        np.save(os.path.join(directory, "chunk_indexes.npy"), chunk_indexes.astype(np.int64))
+        np.save(os.path.join(directory, "alive.npy"), alive.astype(bool))
+
+        pointer = os.path.join(project_dir, f"CURRENT.{version}")
+        with open(pointer, "w") as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(project_dir, "CURRENT"))
+        self._retire_versions(project_id, version)
+
+        # The writer already has the segments open; no need to re-read them
+        state = _NumpyProjectState(version, segments, matrices, segment_records, document_ids.astype(np.int64),
+                                   chunk_indexes.astype(np.int64), alive.astype(bool), row_of_id)
+        self._states[project_id] = state
+        return state
+
+    def _retire_versions(self, project_id: int, current: str):
+        """Mark superseded versions retired and remove the ones retired longer than retention_seconds"""
+        project_dir = self._project_dir(project_id)
+        now = time.time()
+        for entry in os.listdir(project_dir):
+            if not entry.startswith("v_") or entry == current:
+                continue
+            marker = os.path.join(project_dir, entry, "RETIRED")
+            try:
+                retired_at = os.path.getmtime(marker)
+            except FileNotFoundError:
+                # Writers hold the lock, so any other version is superseded (or left by a crashed writer)
+                open(marker, "w").close()
+                continue
+            if now - retired_at >= self.retention_seconds:
+                shutil.rmtree(os.path.join(project_dir, entry), ignore_errors=True)
+
+    def add(self, project_id, ids, embeddings, documents, metadatas):
+        new_embeddings = normalize(np.asarray(embeddings, dtype=np.float32))
+        new_records = [[chunk_id, document, metadata] for chunk_id, document, metadata in zip(ids, documents, metadatas)]
+        new_document_ids = np.array([metadata['document_id'] for metadata in metadatas], dtype=np.int64)
+        new_chunk_indexes = np.array([metadata.get('chunk_index', -1) for metadata in metadatas], dtype=np.int64)
+
+        with self._writing(project_id):
+            state = self._load(project_id)
+            if state is None:
+                self._write_version(project_id, None, 0, [(new_embeddings, new_records)],
+                                    new_document_ids, new_chunk_indexes, np.ones(len(ids), dtype=bool))
+                return
+
+            # Upsert like Chroma: rows already stored under these ids are superseded
+            row_of_id = state.row_of_id()
+            alive = state.alive.copy()
+            alive[[row_of_id[chunk_id] for chunk_id in ids if chunk_id in row_of_id]] = False
+
+            # Fold trailing segments no bigger than the new rows into one, like a binary counter
+            keep = len(state.matrices)
+            merged_rows = len(ids)
+            while keep > 0 and len(state.matrices[keep - 1]) <= merged_rows:
+                keep -= 1
+                merged_rows += len(state.matrices[keep])
+            merged = np.concatenate([np.asarray(matrix) for matrix in state.matrices[keep:]] + [new_embeddings])
+            total = int(state.offsets[-1])
+            merged_records = state.records(range(int(state.offsets[keep]), total)) + new_records
+
+            new_state = self._write_version(
+                project_id, state, keep, [(merged, merged_records)],
+                np.concatenate([state.document_ids, new_document_ids]),
+                np.concatenate([state.chunk_indexes, new_chunk_indexes]),
+                np.concatenate([alive, np.ones(len(ids), dtype=bool)])
+            )
+            # Rows keep their numbers across the merge, so the map carries over once the version is written
+            row_of_id.update(zip(ids, range(total, total + len(ids))))
+            new_state._row_of_id = row_of_id
+
+    def _where_mask(self, state: _NumpyProjectState, where: Optional[Dict]) -> np.ndarray:
+        """Boolean row mask for a Chroma-style metadata filter"""
+        if not where:
+            return np.ones(len(state.alive), dtype=bool)
+        if "$and" in where:
+            mask = np.ones(len(state.alive), dtype=bool)
+            for clause in where["$and"]:
+                mask &= self._where_mask(state, clause)
+            return mask
+        if "$or" in where:
+            mask = np.zeros(len(state.alive), dtype=bool)
+            for clause in where["$or"]:
+                mask |= self._where_mask(state, clause)
+            return mask
+
+        mask = np.ones(len(state.alive), dtype=bool)
+        for key, condition in where.items():
+            values = condition["$in"] if isinstance(condition, dict) and "$in" in condition else [condition]
+            column = state.column(key)
+            if column is not None:
+                mask &= np.isin(column, np.asarray(values, dtype=np.int64))
+            else:
+                # Other keys aren't kept as columns; read them from the records
+                allowed = set(values)
+                mask &= np.array([
+                    state.record(row)[2].get(key) in allowed for row in range(len(state.alive))
+                ], dtype=bool)
+        return mask
+
+    def query(self, project_id, query_embedding, n_results, where=None, include_embeddings=False):
+        return self.query_many(project_id, np.asarray(query_embedding)[None, :], n_results, where, include_embeddings)[0]
+
+    def query_many(self, project_id, query_embeddings, n_results, where=None, include_embeddings=False):
+        state = self._load(project_id)
+        if state is None or n_results <= 0:
+            return [[] for _ in query_embeddings]
+
+        candidates = np.flatnonzero(state.alive & self._where_mask(state, where))
+        if len(candidates) == 0:
+            return [[] for _ in query_embeddings]
+
+        # One matrix product per segment scores every query against every row
+        query_vectors = normalize(np.asarray(query_embeddings, dtype=np.float32))
+        scores = state.scores(query_vectors)[:, candidates]
+        k = min(n_results, len(candidates))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+        all_results = []
+        for q in range(len(query_vectors)):
+            rows = candidates[top[q]]
+            vectors = state.vectors(rows) if include_embeddings else None
+            results = []
+            for i, (row, column) in enumerate(zip(rows, top[q])):
+                chunk_id, content, metadata = state.record(row)
+                results.append({
+                    'content': content,
+                    'metadata': dict(metadata),
+                    'distance': float(1.0 - scores[q, column]),
+                    'id': chunk_id
+                })
+                if include_embeddings:
+                    results[-1]['embedding'] = vectors[i]
+            all_results.append(results)
+        return all_results
+
+    def delete_document(self, project_id, document_id):
+        if self._current_version(project_id) is None:
+            return 0
+        with self._writing(project_id):
+            state = self._load(project_id)
+            if state is None:
+                return 0
+            alive = state.alive & (state.document_ids != document_id)
+            removed = int(state.alive.sum() - alive.sum())
+            if removed == 0:
+                return 0
+            self._write_version(project_id, state, len(state.matrices), [], state.document_ids, state.chunk_indexes,
+                                alive, row_of_id=state._row_of_id)
+            if 1 - alive.sum() / max(len(alive), 1) > self.compaction_threshold:
+                self._compact_locked(project_id)
+            return removed
+
+    def compact(self, project_id: int) -> int:
+        """Physically drop deleted rows; returns the number of rows removed"""
+        if self._current_version(project_id) is None:
+            return 0
+        with self._writing(project_id):
+            return self._compact_locked(project_id)
+
+    def _compact_locked(self, project_id: int) -> int:
+        state = self._load(project_id)
+        if state is None:
+            return 0
+        keep = np.flatnonzero(state.alive)
+        removed = len(state.alive) - len(keep)
+        if removed == 0:
+            return 0
+        self._write_version(
+            project_id, state, 0, [(state.vectors(keep), state.records(keep))],
+            state.document_ids[keep],
+            state.chunk_indexes[keep],
+            np.ones(len(keep), dtype=bool)
+        )
+        return removed
+
+    def deleted_fraction(self, project_id: int) -> float:
+        state = self._load(project_id)
+        if state is None or not len(state.alive):
+            return 0.0
+        return 1 - state.alive.sum() / len(state.alive)
+
+    def delete_project(self, project_id):
+        with self._writing(project_id):
+            self._states.pop(project_id, None)
+            shutil.rmtree(self._project_dir(project_id), ignore_errors=True)
+
+    def storage_bytes(self, project_id):
+        # Only the live version; retired ones are removed once their retention passes
+        version = self._current_version(project_id)
+        if version is None:
+            return 0
+        return directory_size(os.path.join(self._project_dir(project_id), version))
+
+    def count(self, project_id):
+        state = self._load(project_id)
+        return int(state.alive.sum()) if state is not None else 0
+
+    def list_projects(self):
+        return sorted(
+            int(entry[len("project_"):]) for entry in os.listdir(self.root)
+            if entry.startswith("project_") and entry[len("project_"):].isdigit()
+        )
+
+    def export_project(self, project_id, batch_size=EXPORT_BATCH_SIZE):
+        state = self._load(project_id)
+        if state is None:
+            return
+        rows = np.flatnonzero(state.alive)
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            records = state.records(batch)
+            yield {
+                "ids": [record[0] for record in records],
+                "embeddings": state.vectors(batch),
+                "documents": [record[1] for record in records],
+                "metadatas": [dict(record[2]) for record in records]
+            }
+
+    def replace_project(self, project_id, batches):
+        embeddings, document_ids, chunk_indexes, records = [], [], [], []
+        for batch in batches:
+            embeddings.append(normalize(np.asarray(batch["embeddings"], dtype=np.float32)))
+            document_ids.extend(metadata['document_id'] for metadata in batch["metadatas"])
+            chunk_indexes.extend(metadata.get('chunk_index', -1) for metadata in batch["metadatas"])
+            records.extend([list(row) for row in zip(batch["ids"], batch["documents"], batch["metadatas"])])
+
+        with self._writing(project_id):
+            if not records:
+                self._states.pop(project_id, None)
+                shutil.rmtree(self._project_dir(project_id), ignore_errors=True)
+                return
+            self._write_version(
+                project_id, None, 0, [(np.concatenate(embeddings), records)],
+                np.asarray(document_ids, dtype=np.int64),
+                np.asarray(chunk_indexes, dtype=np.int64),
+                np.ones(len(records), dtype=bool)
+            )
+
+class ShardedBackend(VectorBackend):
+    """Backends of one kind, one per shard, each project living on exactly one
+
+    shard_map decides the shard: the recorded placement, or the hash-ring
+    owner for a project that has none yet (placed on first write).
+    """
+
+    def __init__(self, shards: Dict[str, VectorBackend], shard_map):
+        self.shards = shards
+        self.shard_map = shard_map
+        self.name = next(iter(shards.values())).name
+
+    def shard(self, project_id: int, create: bool = False) -> VectorBackend:
+        return self.shards[self.shard_map.shard_for(project_id, create=create)]
+
+    def max_insert_batch(self) -> int:
+        return min(backend.max_insert_batch() for backend in self.shards.values())
+
+    def add(self, project_id, ids, embeddings, documents, metadatas):
+        self.shard(project_id, create=True).add(project_id, ids, embeddings, documents, metadatas)
+
+    def query(self, project_id, query_embedding, n_results, where=None, include_embeddings=False):
+        return self.shard(project_id).query(project_id, query_embedding, n_results, where, include_embeddings)
+
+    def query_many(self, project_id, query_embeddings, n_results, where=None, include_embeddings=False):
+        return self.shard(project_id).query_many(project_id, query_embeddings, n_results, where, include_embeddings)
+
+    def delete_document(self, project_id, document_id):
+        return self.shard(project_id).delete_document(project_id, document_id)
+
+    def delete_project(self, project_id):
+        self.shard(project_id).delete_project(project_id)
+
+    def count(self, project_id):
+        return self.shard(project_id).count(project_id)
+
+    def has_project(self, project_id):
+        return self.shard(project_id).has_project(project_id)
+
+    def list_projects(self):
+        return sorted({project_id for backend in self.shards.values() for project_id in backend.list_projects()})
+
+    def export_project(self, project_id, batch_size=EXPORT_BATCH_SIZE):
+        return self.shard(project_id).export_project(project_id, batch_size)
+
+    def replace_project(self, project_id, batches):
+        self.shard(project_id, create=True).replace_project(project_id, batches)
+
+    def storage_bytes(self, project_id):
+        return self.shard(project_id).storage_bytes(project_id)
+
+    def compact(self, project_id: int) -> int:
+        return self.shard(project_id).compact(project_id)
+
+    def deleted_fraction(self, project_id: int) -> float:
+        return self.shard(project_id).deleted_fraction(project_id)
+
+    def rebuild_project(self, project_id: int, swap_lock=None, keep_lease: Optional[Callable[[], None]] = None) -> int:
+        return self.shard(project_id).rebuild_project(project_id, swap_lock, keep_lease)
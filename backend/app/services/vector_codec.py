@@ -0,0 +1,153 @@
+"""
+Vector Codec - compact storage for embeddings
+
+Two independent reductions are supported:
+- a fitted PCA projection to fewer dimensions, used for the search index
+- scalar quantization of the full vector to float16 or int8, kept on disk
+  and used to rescore the top candidates at full dimensionality
+"""
+
+import base64
+import os
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so dot products are cosine similarities"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class VectorCodec:
+    """Encodes embeddings for compact storage and decodes them for rescoring"""
+
+    def __init__(self, dtype: str = "float32", pca_dimensions: int = 0):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector storage dtype: {dtype}. Supported: {', '.join(SUPPORTED_DTYPES)}")
+        if dtype != "float32" and pca_dimensions <= 0:
+            # Without a projection the index holds the full float32 vectors and no codes are written
+            raise ValueError(f"Vector storage dtype {dtype} needs a PCA projection (VECTOR_PCA_DIMENSIONS > 0); "
+                             f"without one vectors are stored as float32")
+        self.dtype = dtype
+        self.pca_dimensions = pca_dimensions
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+
+    @property
+    def uses_pca(self) -> bool:
+        return self.pca_dimensions > 0
+
+    @property
+    def fitted(self) -> bool:
+        return not self.uses_pca or self.components is not None
+
+    @property
+    def active(self) -> bool:
+        """True when the index holds projected vectors and full vectors live in codes"""
+        return self.uses_pca and self.fitted
+
+    def fit(self, vectors: np.ndarray):
+        """Fit the PCA projection on a sample of full-precision embeddings"""
+        if not self.uses_pca:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < self.pca_dimensions:
+            raise ValueError(f"Need at least {self.pca_dimensions} sample vectors to fit PCA, got {len(vectors)}")
+
+        self.mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:self.pca_dimensions], dtype=np.float32)
+
+    def project(self, vectors: np.ndarray) -> np.ndarray:
+        """Reduce vectors to the fitted PCA dimensions (identity when PCA is off)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not self.active:
+            return vectors
+        return normalize((vectors - self.mean) @ self.components.T).astype(np.float32)
+
+    def quantize(self, vectors: np.ndarray) -> List[bytes]:
+        """Scalar-quantize full vectors to the storage dtype"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype == "float32":
+            return [row.tobytes() for row in vectors]
+        if self.dtype == "float16":
+            return [row.tobytes() for row in vectors.astype(np.float16)]
+
+        # int8: one float32 scale per vector followed by the codes
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return [np.float32(scale).tobytes() + row.tobytes() for scale, row in zip(scales, codes)]
+
+    def dequantize(self, blobs: List[bytes]) -> np.ndarray:
+        """Reconstruct float32 vectors from quantized blobs"""
+        if self.dtype == "float32":
+            return np.stack([np.frombuffer(blob, dtype=np.float32) for blob in blobs])
+        if self.dtype == "float16":
+            return np.stack([np.frombuffer(blob, dtype=np.float16) for blob in blobs]).astype(np.float32)
+
+        rows = []
+        for blob in blobs:
+            scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+            rows.append(np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale)
+        return np.stack(rows)
+
+    def encode(self, vectors: np.ndarray) -> List[str]:
+        """Quantized codes as strings, suitable for storing in chunk metadata"""
+        return [base64.b64encode(blob).decode("ascii") for blob in self.quantize(vectors)]
+
+    def decode(self, codes: List[str]) -> np.ndarray:
+        return self.dequantize([base64.b64decode(code) for code in codes])
+
+    def bytes_per_vector(self, dimensions: int) -> dict:
+        """Storage cost of one vector in the index and in its base64 rescoring code"""
+        index_dims = self.pca_dimensions if self.uses_pca else dimensions
+        blob_bytes = {"float32": 4 * dimensions, "float16": 2 * dimensions, "int8": dimensions + 4}[self.dtype]
+        code_bytes = 4 * ((blob_bytes + 2) // 3) if self.uses_pca else 0
+        return {"index": 4 * index_dims, "codes": code_bytes, "total": 4 * index_dims + code_bytes}
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(
+            path,
+            dtype=np.array(self.dtype),
+            pca_dimensions=np.array(self.pca_dimensions),
+            mean=self.mean if self.mean is not None else np.zeros(0, dtype=np.float32),
+            components=self.components if self.components is not None else np.zeros((0, 0), dtype=np.float32)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "VectorCodec":
+        with np.load(path) as data:
+            pca_dimensions = int(data["pca_dimensions"])
+            # Older codecs could record a dtype without PCA; their vectors were stored as float32
+            dtype = str(data["dtype"]) if pca_dimensions > 0 else "float32"
+            codec = cls(dtype, pca_dimensions)
+            if data["components"].size:
+                codec.mean = data["mean"]
+                codec.components = data["components"]
+        return codec
+
+def codec_path() -> str:
+    return os.path.join(settings.vector_db_path, "vector_codec.npz")
+
+def load_vector_codec() -> VectorCodec:
+    """Codec for the configured storage mode, with its fitted projection if one was saved"""
+    codec = VectorCodec(settings.vector_storage_dtype, settings.vector_pca_dimensions)
+    if codec.uses_pca and codec.dtype == "float32":
+        print("Warning: float32 rescoring codes plus a PCA index take more space than unprojected vectors; "
+              "set VECTOR_STORAGE_DTYPE to float16 or int8")
+    path = codec_path()
+    if codec.uses_pca and os.path.exists(path):
+        saved = VectorCodec.load(path)
+        if saved.pca_dimensions == codec.pca_dimensions and saved.components is not None:
+            codec.mean = saved.mean
+            codec.components = saved.components
+    return codec
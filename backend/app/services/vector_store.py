@@ -1,54 +1,275 @@
-import chromadb
-from chromadb.config import Settings
 from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import numpy as np
+import asyncio
+import functools
 import json
 import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from app.core.config import settings
+from sqlalchemy.orm import Session
+from app.db.database import SessionLocal
+from app.services import compaction, corpus_stats, embedding_spaces
+from app.services.embedding_backends import load_embedding_model, runtime_name
+from app.services.embedding_cache import EmbeddingCache, hash_text
+from app.services.lexical_index import LexicalIndex
+from app.services.lru_cache import LRUCache
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.shard_map import ShardMap, is_remote_location, numpy_shard_path, parse_shards
+from app.services.vector_backends import ChromaBackend, NumpyBackend, ShardedBackend, VectorBackend, create_chroma_client
+from app.services.vector_codec import VectorCodec, load_vector_codec, normalize
+from app.services.vector_writer import VectorWriter
+
+# Metadata key holding the quantized full vector when the index stores PCA projections
+VECTOR_CODE_KEY = "_vector_code"
+
+def mmr_select(query_embedding: np.ndarray, candidate_embeddings: np.ndarray, n_results: int,
+               lambda_mult: float, duplicate_threshold: float = 1.0) -> List[int]:
+    """Indices of candidates chosen by maximal marginal relevance
+
+    Each step picks the candidate maximising
+    lambda * sim(query, c) - (1 - lambda) * max sim(c, selected).
+    Candidates at least duplicate_threshold similar to a selected one are
+    never picked, so near-duplicates (e.g. overlapping chunks) are dropped.
+    """
+    if len(candidate_embeddings) == 0:
+        return []
+    
+    candidates = normalize(np.asarray(candidate_embeddings, dtype=np.float32))
+    relevance = candidates @ normalize(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]
+    pairwise = candidates @ candidates.T
+    
+    selected: List[int] = []
+    max_similarity = np.full(len(candidates), -np.inf, dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    while len(selected) < n_results and available.any():
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, pairwise[best])
+        available &= max_similarity < duplicate_threshold
+    return selected
+
+def document_filter(document_ids: Optional[tuple], shared_chunks: Optional[Dict[int, List[int]]] = None) -> Optional[Dict]:
+    """Backend metadata filter restricting a search to some documents of a project
+
+    shared_chunks maps other documents to the indexes of their chunks that
+    the selected documents share and that are stored only once, under them.
+    """
+    if not document_ids:
+        return None
+    clauses = [{"document_id": document_ids[0]} if len(document_ids) == 1 else {"document_id": {"$in": list(document_ids)}}]
+    for document_id, chunk_indexes in (shared_chunks or {}).items():
+        clauses.append({"$and": [{"document_id": document_id}, {"chunk_index": {"$in": list(chunk_indexes)}}]})
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+def estimate_results_size(results: List[Dict]) -> int:
+    """Approximate in-memory footprint of a list of search results, in bytes"""
+    return sum(
+        200 + len(result['content']) + sum(len(str(key)) + len(str(value)) for key, value in result['metadata'].items())
+        for result in results
+    )
 
 class CustomEmbeddingFunction(embedding_functions.EmbeddingFunction):
-    def __init__(self, model_name: str):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str, cache: Optional[EmbeddingCache] = None, batch_size: int = None):
+        self.model_name = model_name
+        self.model = load_embedding_model(model_name)
+        self.cache = cache
+        self.batch_size = batch_size or settings.embedding_batch_size
     
     def __call__(self, input: list) -> list:
-        return self.model.encode(input).tolist()
+        return self.embed(input).tolist()
+    
+    @property
+    def cache_namespace(self) -> str:
+        """Cache key prefix; vectors from different runtimes of one model must not mix"""
+        runtime = runtime_name(self.model)
+        # Torch keeps the bare model name, which caches written before other runtimes existed use
+        return self.model_name if runtime == "torch" else f"{self.model_name}@{runtime}"
+    
+    def embed(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """Embed texts as a float32 matrix, reusing cached vectors for known content"""
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        if self.cache is None or not use_cache:
+            return self._encode(texts)
+        
+        hashes = [hash_text(text) for text in texts]
+        namespace = self.cache_namespace
+        vectors = self.cache.get_many(namespace, hashes)
+        
+        # Encode each distinct missing text once
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors and text_hash not in missing:
+                missing[text_hash] = text
+        
+        if missing:
+            encoded = self._encode(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), encoded))
+            self.cache.put_many(namespace, new_vectors)
+            vectors.update(new_vectors)
+        
+        return np.stack([vectors[text_hash] for text_hash in hashes])
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode in length-sorted batches into one contiguous float32 matrix"""
+        vectors = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        # Similar lengths in a batch means less padding per forward pass
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        for start in range(0, len(order), self.batch_size):
+            batch_indices = order[start:start + self.batch_size]
+            vectors[batch_indices] = self.model.encode(
+                [texts[i] for i in batch_indices],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        
+        return vectors
 
 class VectorStore:
-    def __init__(self):
-        # Initialize ChromaDB client
-        os.makedirs(settings.vector_db_path, exist_ok=True)
-        self.client = chromadb.PersistentClient(
-            path=settings.vector_db_path,
-            settings=Settings(anonymized_telemetry=False)
+    def __init__(self, client=None, embedding_function: CustomEmbeddingFunction = None, codec: Optional[VectorCodec] = None,
+                 lexical_index: Optional[LexicalIndex] = None, backends: Optional[Dict[str, VectorBackend]] = None,
+                 near_duplicate_index: Optional[NearDuplicateIndex] = None, migration_target: Optional["VectorStore"] = None):
+        # Reuse shared client and embedding model when provided (see app.services.container)
+        self.embedding_function = embedding_function or CustomEmbeddingFunction(settings.embedding_model)
+        self.model_name = self.embedding_function.model_name
+        # Store for the model projects are migrating to (see app.services.embedding_spaces)
+        self.migration_target = migration_target
+        self.project_spaces = embedding_spaces.ProjectSpaces() if migration_target is not None else None
+        self.query_embedding_cache = LRUCache(
+            max_entries=settings.query_embedding_cache_size,
+            ttl_seconds=settings.query_embedding_cache_ttl_seconds
+        )
+        # Keyed on the project's corpus version, so entries never need to expire
+        self.retrieval_cache = LRUCache(
+            max_entries=settings.retrieval_cache_max_entries,
+            max_bytes=settings.retrieval_cache_max_bytes,
+            size_of=estimate_results_size
         )
         
-        # Create custom embedding function
-        self.embedding_function = CustomEmbeddingFunction(settings.embedding_model)
+        self.lexical_index = lexical_index
+        self.near_duplicate_index = near_duplicate_index
+        # Dedicated pool for the async API and the legs of hybrid searches, so slow embedding or
+        # storage calls can't exhaust the threadpool FastAPI uses for sync endpoints. At most
+        # vector_store_async_workers async calls run at once, which leaves hybrid_search_workers
+        # threads for the legs those calls wait on.
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.vector_store_async_workers + settings.hybrid_search_workers,
+            thread_name_prefix="vector-store"
+        )
+        self._async_slots = asyncio.Semaphore(settings.vector_store_async_workers)
+        self.codec = codec or load_vector_codec()
+        if not self.codec.fitted:
+            print("Warning: VECTOR_PCA_DIMENSIONS is set but no fitted codec was found; "
+                  "storing full vectors until fit_vector_codec.py has run")
         
-        # Create or get collection with proper error handling
-        try:
-            self.collection = self.client.get_collection(
-                name=settings.vector_db_collection_name,
-                embedding_function=self.embedding_function
-            )
-        except Exception:
-            # Collection doesn't exist, create it
-            try:
-                self.collection = self.client.create_collection(
-                    name=settings.vector_db_collection_name,
-                    metadata={"hnsw:space": "cosine"},
-                    embedding_function=self.embedding_function
-                )
-            except Exception:
-                # Collection might already exist, try to get it again
-                self.collection = self.client.get_collection(
-                    name=settings.vector_db_collection_name,
-                    embedding_function=self.embedding_function
+        self.backend_mode = settings.vector_backend
+        self.shard_map: Optional[ShardMap] = None
+        self.backends = backends or self._create_backends(client)
+        self._project_backends: Dict[int, str] = {}
+        self._routing_lock = threading.Lock()
+        self.write_lock = threading.RLock()
+        self._compaction_locks: Dict[int, threading.Lock] = defaultdict(threading.Lock)
+        # Inserts from concurrent ingestion jobs are batched into few large writes
+        self.writer = VectorWriter(self._write_rows, self._insert_batch) if settings.vector_write_coalescing else None
+    
+    def _create_backends(self, client) -> Dict[str, VectorBackend]:
+        """Backends needed by the configured mode ("chroma", "numpy" or "auto"), sharded if VECTOR_SHARDS is set"""
+        if self.backend_mode not in ("chroma", "numpy", "auto"):
+            raise ValueError(f"Unsupported vector backend: {self.backend_mode}. Supported: chroma, numpy, auto")
+        kinds = ["chroma", "numpy"] if self.backend_mode == "auto" else [self.backend_mode]
+        
+        # Each embedding model's vectors are kept apart; the first model keeps the original names
+        self.storage_key = embedding_spaces.storage_key(self.model_name)
+        
+        shards = parse_shards()
+        if not shards:
+            backends = {}
+            if "chroma" in kinds:
+                backends["chroma"] = ChromaBackend(
+                    client or create_chroma_client(),
+                    self.embedding_function,
+                    path=settings.vector_db_path if settings.chroma_mode == "persistent" else None,
+                    collection_prefix=self._collection_prefix()
                 )
+            if "numpy" in kinds:
+                backends["numpy"] = NumpyBackend(self._space_path(settings.numpy_backend_path))
+            return backends
+        
+        self.shard_map = ShardMap(list(shards))
+        return {
+            kind: ShardedBackend(
+                {name: self._create_shard_backend(kind, name, location) for name, location in shards.items()},
+                self.shard_map
+            )
+            for kind in kinds
+        }
     
-    def add_document_chunks(self, chunks: List[Dict], project_id: int):
-        """Add document chunks to the vector store"""
+    def _create_shard_backend(self, kind: str, name: str, location: str) -> VectorBackend:
+        """Backend of one kind for a shard location (a directory or a Chroma server URL)"""
+        if kind == "chroma":
+            return ChromaBackend(
+                create_chroma_client(location),
+                self.embedding_function,
+                retries=settings.chroma_max_retries if is_remote_location(location) else 0,
+                path=None if is_remote_location(location) else location,
+                collection_prefix=self._collection_prefix()
+            )
+        return NumpyBackend(self._space_path(numpy_shard_path(name, location)))
+    
+    def _collection_prefix(self) -> str:
+        if not self.storage_key:
+            return settings.vector_db_collection_name
+        return f"{settings.vector_db_collection_name}_{self.storage_key}"
+    
+    def _space_path(self, root: str) -> str:
+        return os.path.join(root, f"space_{self.storage_key}") if self.storage_key else root
+    
+    def backend_for(self, project_id: int) -> VectorBackend:
+        """Backend holding a project's vectors
+
+        In "auto" mode a project starts in the NumPy backend and moves to
+        Chroma once it outgrows numpy_backend_max_chunks.
+        """
+        if self.backend_mode != "auto":
+            return self.backends[self.backend_mode]
+        
+        name = self._project_backends.get(project_id)
+        if name is None:
+            name = "chroma" if self.backends["chroma"].has_project(project_id) else "numpy"
+            self._project_backends[project_id] = name
+        return self.backends[name]
+    
+    def _promote_if_needed(self, project_id: int, incoming: int):
+        """Move a project from the NumPy to the Chroma backend before it grows past the threshold"""
+        if self.backend_mode != "auto":
+            return
+        
+        with self._routing_lock:
+            backend = self.backend_for(project_id)
+            if backend.name != "numpy" or backend.count(project_id) + incoming <= settings.numpy_backend_max_chunks:
+                return
+            
+            print(f"Moving project {project_id} to the chroma backend ({backend.count(project_id) + incoming} chunks)")
+            self.backends["chroma"].replace_project(project_id, backend.export_project(project_id))
+            self._project_backends[project_id] = "chroma"
+            backend.delete_project(project_id)
+    
+    def add_document_chunks(self, chunks: List[Dict], project_id: int, embeddings: Optional[np.ndarray] = None):
+        """Add document chunks to the vector store in bounded, pre-embedded batches
+
+        Pass embeddings (one row per chunk) if they were computed elsewhere,
+        e.g. by the ingestion worker pool.
+        """
         texts = []
         metadatas = []
         ids = []
@@ -79,81 +300,564 @@ class VectorStore:
             metadatas.append(metadata)
             ids.append(f"doc_{chunk['document_id']}_chunk_{chunk['chunk_index']}")
         
-        # Add to ChromaDB (embeddings will be generated automatically by our custom function)
-        self.collection.add(
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
+        with self.write_lock:
+            self._promote_if_needed(project_id, len(ids))
+            insert_batch = self.backend_for(project_id).max_insert_batch()
+        
+        # Embed and insert one slice at a time so peak memory stays bounded
+        # and no single add goes over the backend's batch limit
+        futures = []
+        for start in range(0, len(ids), insert_batch):
+            end = start + insert_batch
+            if embeddings is not None:
+                batch_embeddings = np.asarray(embeddings[start:end], dtype=np.float32)
+            else:
+                batch_embeddings = self.embedding_function.embed(texts[start:end])
+            batch_metadatas = metadatas[start:end]
+            if self.codec.active:
+                # Index the projection; keep the full vector as a compact code for rescoring
+                for metadata, code in zip(batch_metadatas, self.codec.encode(batch_embeddings)):
+                    metadata[VECTOR_CODE_KEY] = code
+            if self.writer is not None:
+                futures.append(self.writer.submit(
+                    project_id, ids[start:end], self.codec.project(batch_embeddings), texts[start:end], batch_metadatas
+                ))
+            else:
+                self._write_rows(project_id, ids[start:end], self.codec.project(batch_embeddings),
+                                 texts[start:end], batch_metadatas)
+        
+        # Raises the error of this document's own rows if the writer couldn't store them
+        for future in futures:
+            future.result()
+        
+        # Dual-write while migrating, so the new space never falls behind once a project has caught up
+        if self.migration_target is not None:
+            self.migration_target.add_document_chunks(chunks, project_id)
+    
+    def _write_rows(self, project_id: int, ids: List[str], embeddings: np.ndarray, documents: List[str],
+                    metadatas: List[Dict]):
+        # Writes are short critical sections so snapshots see whole batches
+        with self.write_lock:
+            self.backend_for(project_id).add(
+                project_id,
+                ids=ids,
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=metadatas
+            )
+    
+    def _insert_batch(self, project_id: int) -> int:
+        with self.write_lock:
+            return self.backend_for(project_id).max_insert_batch()
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a search query, reusing recent embeddings of the same text"""
+        return self.embed_queries([query])[0]
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed several search queries in one model call, reusing recent embeddings"""
+        namespace = self.embedding_function.cache_namespace
+        keys = [(namespace, query) for query in queries]
+        embeddings = [self.query_embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            # Queries stay out of the persistent chunk cache
+            texts = list(dict.fromkeys(queries[i] for i in missing))
+            computed = dict(zip(texts, self.embedding_function.embed(texts, use_cache=False)))
+            for i in missing:
+                embeddings[i] = computed[queries[i]]
+                self.query_embedding_cache.set(keys[i], embeddings[i])
+        return np.stack(embeddings)
+    
+    def query_space(self, project_id: int) -> "VectorStore":
+        """Store a project is queried from: the migration target's once the project has switched to it"""
+        if self.migration_target is not None and \
+                self.project_spaces.active_model(project_id) == self.migration_target.model_name:
+            return self.migration_target
+        return self
+    
+    def search_similar_chunks(self, query: str, project_id: int, n_results: int = 5, mode: Optional[str] = None,
+                              mmr_lambda: Optional[float] = None, document_ids: Optional[List[int]] = None) -> List[Dict]:
+        """Search for similar chunks based on query ("vector" or "hybrid" mode)
+
+        With mmr_lambda below 1.0, candidates are over-fetched and re-ranked by
+        maximal marginal relevance; lower values favour diversity. document_ids
+        restricts the search to those documents of the project.
+        """
+        return self.search_many([query], project_id, n_results, mode, mmr_lambda, document_ids)["results"][0]
+    
+    def search_many(self, queries: List[str], project_id: int, n_results: int = 5, mode: Optional[str] = None,
+                    mmr_lambda: Optional[float] = None, document_ids: Optional[List[int]] = None) -> Dict:
+        """Search several queries with one embedding batch and one backend query
+
+        Returns {"results": one result list per query, "chunks": every distinct
+        chunk across all queries, in first-seen order}.
+        """
+        if not queries:
+            return {"results": [], "chunks": []}
+        
+        space = self.query_space(project_id)
+        if space is not self:
+            return space.search_many(queries, project_id, n_results, mode, mmr_lambda, document_ids)
+        
+        # An empty selection means the whole project, like None
+        document_ids = tuple(sorted(set(document_ids))) if document_ids else None
+        
+        mode = mode or settings.retrieval_mode
+        if mode == "hybrid" and self.lexical_index is None:
+            mode = "vector"
+        unique_queries = list(dict.fromkeys(queries))
+        
+        # Read the version before searching: a concurrent change bumps it and orphans what we store
+        use_cache = self.retrieval_cache.max_entries > 0
+        version = corpus_stats.corpus_versions.get(project_id) if use_cache else None
+        cache_keys = {
+            query: (project_id, version, query, n_results, mode, mmr_lambda, document_ids) for query in unique_queries
+        }
+        by_query = {}
+        if use_cache:
+            for query in unique_queries:
+                cached = self.retrieval_cache.get(cache_keys[query])
+                if cached is not None:
+                    by_query[query] = cached
+        
+        missing = [query for query in unique_queries if query not in by_query]
+        if missing:
+            searched = self._search_uncached(missing, project_id, n_results, mode, mmr_lambda, document_ids)
+            for query, results in zip(missing, searched):
+                by_query[query] = results
+                if use_cache:
+                    self.retrieval_cache.set(cache_keys[query], results)
+        
+        # Hand out copies so callers can't alter cached entries
+        all_results = [[dict(result) for result in by_query[query]] for query in queries]
+        chunks: Dict[str, Dict] = {}
+        for results in all_results:
+            for result in results:
+                chunks.setdefault(result['id'], result)
+        return {"results": all_results, "chunks": list(chunks.values())}
+    
+    def _search_uncached(self, queries: List[str], project_id: int, n_results: int, mode: str,
+                         mmr_lambda: Optional[float], document_ids: Optional[tuple] = None) -> List[List[Dict]]:
+        use_mmr = mmr_lambda is not None and mmr_lambda < 1.0
+        n_candidates = n_results * settings.mmr_candidate_factor if use_mmr else n_results
+        # One session for the dedup lookups before and after the search
+        db = SessionLocal()
+        try:
+            shared = self._shared_chunks(db, project_id, document_ids)
+            # Don't hold a connection (or SQLite's read lock) while the backends search
+            db.rollback()
+            shared_by_document: Dict[int, List[int]] = {}
+            for document_id, chunk_index in sorted(shared):
+                shared_by_document.setdefault(document_id, []).append(chunk_index)
+            
+            if mode == "hybrid":
+                all_results = self._hybrid_search_many(queries, project_id, n_candidates, include_embeddings=use_mmr,
+                                                       document_ids=document_ids, shared_chunks=shared_by_document)
+            else:
+                all_results = self._vector_search_many(queries, project_id, n_candidates, include_embeddings=use_mmr,
+                                                       document_ids=document_ids, shared_chunks=shared_by_document)
+            
+            if use_mmr:
+                all_results = [
+                    self._mmr_rerank(query, results, n_results, mmr_lambda)
+                    for query, results in zip(queries, all_results)
+                ]
+            self._attach_duplicate_sources(db, project_id, all_results)
+        finally:
+            db.close()
+        if shared:
+            self._map_to_selection(all_results, shared)
+        return all_results
+    
+    def _shared_chunks(self, db: Session, project_id: int, document_ids: Optional[tuple]) -> Dict[tuple, List[tuple]]:
+        """Chunks of the selected documents stored under unselected ones (see NearDuplicateIndex.shared_chunks)"""
+        if not document_ids or self.near_duplicate_index is None:
+            return {}
+        return self.near_duplicate_index.shared_chunks(db, project_id, document_ids)
+    
+    def _map_to_selection(self, all_results: List[List[Dict]], shared: Dict[tuple, List[tuple]]):
+        """Attribute hits on chunks stored under an unselected document to the selected document sharing them"""
+        for results in all_results:
+            for result in results:
+                stored = (result['metadata'].get('document_id'), result['metadata'].get('chunk_index'))
+                if stored not in shared:
+                    continue
+                document_id, chunk_index = shared[stored][0]
+                result['metadata'] = dict(result['metadata'], document_id=document_id, chunk_index=chunk_index)
+                result['id'] = f"doc_{document_id}_chunk_{chunk_index}"
+                # The stored copy's document is now one of the others the chunk appears in
+                others = {stored[0], *result.get('duplicate_document_ids', [])} - {document_id}
+                result['duplicate_document_ids'] = sorted(others)
+    
+    def _attach_duplicate_sources(self, db: Session, project_id: int, all_results: List[List[Dict]]):
+        """List the other documents a deduplicated chunk appears in under 'duplicate_document_ids'"""
+        if self.near_duplicate_index is None or not self.near_duplicate_index.enabled:
+            return
+        keys = list({
+            (result['metadata'].get('document_id'), result['metadata'].get('chunk_index'))
+            for results in all_results for result in results
+        })
+        sources = self.near_duplicate_index.duplicate_sources(db, project_id, keys)
+        for results in all_results:
+            for result in results:
+                key = (result['metadata'].get('document_id'), result['metadata'].get('chunk_index'))
+                result['duplicate_document_ids'] = sources.get(key, [])
+    
+    def _mmr_rerank(self, query: str, results: List[Dict], n_results: int, mmr_lambda: float) -> List[Dict]:
+        """Pick a relevant but diverse subset of candidates"""
+        if not results:
+            return results
+        
+        stored = [result.pop('embedding', None) for result in results]
+        if any(embedding is None for embedding in stored):
+            # Lexical-only candidates have no stored vector; chunk embeddings come from the cache
+            embeddings = self.embedding_function.embed([result['content'] for result in results])
+            query_embedding = self.embed_query(query)
+        else:
+            # Stored vectors live in the index space, which may be a PCA projection
+            embeddings = np.stack(stored)
+            query_embedding = self.codec.project(self.embed_query(query)[None, :])[0]
+        
+        selected = mmr_select(query_embedding, embeddings, n_results, mmr_lambda, settings.mmr_duplicate_threshold)
+        return [results[i] for i in selected]
+    
+    def _leg_result(self, name: str, future, budget_ms: int, started: float):
+        """Result of a hybrid search leg, or None if it failed or ran past its budget"""
+        # Each leg gets its own budget measured from the shared start; a slow leg is dropped
+        remaining = max(0.0, budget_ms / 1000 - (time.monotonic() - started))
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeoutError:
+            print(f"Hybrid search: {name} leg exceeded {budget_ms}ms budget, skipping")
+        except Exception as e:
+            print(f"Hybrid search: {name} leg failed: {str(e)}")
+        return None
+    
+    def _hybrid_search_many(self, queries: List[str], project_id: int, n_results: int,
+                            include_embeddings: bool = False, document_ids: Optional[tuple] = None,
+                            shared_chunks: Optional[Dict[int, List[int]]] = None) -> List[List[Dict]]:
+        """Fuse vector and BM25 rankings of each query with reciprocal rank fusion"""
+        n_candidates = n_results * settings.hybrid_candidate_factor
+        started = time.monotonic()
+        vector_future = self._executor.submit(
+            self._vector_search_many, queries, project_id, n_candidates, include_embeddings, document_ids, shared_chunks
         )
+        lexical_futures = [
+            self._executor.submit(
+                self.lexical_index.search, query, project_id, n_candidates, document_ids, shared_chunks
+            )
+            for query in queries
+        ]
+        
+        vector_rankings = self._leg_result("vector", vector_future, settings.hybrid_vector_budget_ms, started)
+        vector_rankings = vector_rankings or [[] for _ in queries]
+        lexical_rankings = [
+            self._leg_result("lexical", future, settings.hybrid_lexical_budget_ms, started) or []
+            for future in lexical_futures
+        ]
+        
+        all_results = []
+        for rankings in zip(vector_rankings, lexical_rankings):
+            fused_scores: Dict[str, float] = {}
+            payloads: Dict[str, Dict] = {}
+            for ranking in rankings:
+                for rank, result in enumerate(ranking):
+                    fused_scores[result['id']] = fused_scores.get(result['id'], 0.0) + 1.0 / (settings.hybrid_rrf_k + rank + 1)
+                    # Prefer the vector payload, which carries the full metadata and distance
+                    payloads.setdefault(result['id'], result)
+            
+            results = []
+            for chunk_id in sorted(fused_scores, key=fused_scores.get, reverse=True)[:n_results]:
+                result = dict(payloads[chunk_id])
+                result['score'] = fused_scores[chunk_id]
+                results.append(result)
+            all_results.append(results)
+        return all_results
     
-    def search_similar_chunks(self, query: str, project_id: int, n_results: int = 5) -> List[Dict]:
-        """Search for similar chunks based on query"""
-        # Search in ChromaDB (query embedding will be generated automatically)
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            where={"project_id": project_id}
+    def _vector_search_many(self, queries: List[str], project_id: int, n_results: int,
+                            include_embeddings: bool = False, document_ids: Optional[tuple] = None,
+                            shared_chunks: Optional[Dict[int, List[int]]] = None) -> List[List[Dict]]:
+        """Nearest-neighbour search for several queries in one backend call"""
+        query_embeddings = self.embed_queries(queries)
+        
+        # In compact mode, over-fetch from the reduced index and rescore at full dimensionality
+        n_candidates = n_results * settings.vector_rescore_factor if self.codec.active else n_results
+        
+        all_results = self.backend_for(project_id).query_many(
+            project_id,
+            self.codec.project(query_embeddings),
+            n_candidates,
+            where=document_filter(document_ids, shared_chunks),
+            include_embeddings=include_embeddings
         )
         
-        # Format results
-        formatted_results = []
-        if results['documents'] and results['documents'][0]:
-            for i, doc in enumerate(results['documents'][0]):
-                result = {
-                    'content': doc,
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i] if results['distances'] else None,
-                    'id': results['ids'][0][i]
-                }
-                formatted_results.append(result)
-        
-        return formatted_results
-    
-    def delete_document(self, document_id: int):
-        """Delete all chunks for a specific document"""
-        # Get all chunks for this document
-        results = self.collection.get(
-            where={"document_id": document_id}
+        if self.codec.active:
+            all_results = [
+                self._rescore(query_embedding, results)[:n_results]
+                for query_embedding, results in zip(query_embeddings, all_results)
+            ]
+        
+        return all_results
+    
+    def _rescore(self, query_embedding: np.ndarray, results: List[Dict]) -> List[Dict]:
+        """Re-rank candidates by cosine distance to their decoded full vectors"""
+        coded = [result for result in results if VECTOR_CODE_KEY in result['metadata']]
+        if coded:
+            vectors = normalize(self.codec.decode([result['metadata'][VECTOR_CODE_KEY] for result in coded]))
+            similarities = vectors @ normalize(query_embedding[None, :])[0]
+            for result, similarity in zip(coded, similarities):
+                result['distance'] = float(1.0 - similarity)
+        
+        for result in results:
+            result['metadata'].pop(VECTOR_CODE_KEY, None)
+        
+        return sorted(results, key=lambda result: result['distance'] if result['distance'] is not None else float("inf"))
+    
+    async def _run_async(self, func, *args, **kwargs):
+        async with self._async_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    async def asearch(self, query: str, project_id: int, n_results: int = 5, mode: Optional[str] = None,
+                      mmr_lambda: Optional[float] = None, document_ids: Optional[List[int]] = None) -> List[Dict]:
+        """search_similar_chunks without blocking the event loop"""
+        return await self._run_async(
+            self.search_similar_chunks, query, project_id, n_results, mode, mmr_lambda, document_ids
         )
+    
+    async def asearch_many(self, queries: List[str], project_id: int, n_results: int = 5, mode: Optional[str] = None,
+                           mmr_lambda: Optional[float] = None, document_ids: Optional[List[int]] = None) -> Dict:
+        """search_many without blocking the event loop"""
+        return await self._run_async(self.search_many, queries, project_id, n_results, mode, mmr_lambda, document_ids)
+    
+    async def aadd(self, chunks: List[Dict], project_id: int, embeddings: Optional[np.ndarray] = None):
+        """add_document_chunks without blocking the event loop"""
+        return await self._run_async(self.add_document_chunks, chunks, project_id, embeddings)
+    
+    async def adelete(self, document_id: int, project_id: int):
+        """delete_document without blocking the event loop"""
+        return await self._run_async(self.delete_document, document_id, project_id)
+    
+    async def adelete_project(self, project_id: int):
+        """delete_project without blocking the event loop"""
+        return await self._run_async(self.delete_project, project_id)
+    
+    def close(self):
+        """Stop the worker pools"""
+        if self.migration_target is not None:
+            self.migration_target.close()
+        if self.writer is not None:
+            self.writer.close()
+        self._executor.shutdown(wait=False)
+    
+    def delete_document(self, document_id: int, project_id: int):
+        """Delete all chunks for a specific document"""
+        with self.write_lock:
+            backend = self.backend_for(project_id)
+            removed = backend.delete_document(project_id, document_id)
+        target_removed = self.delete_document_from_target(document_id, project_id)
         
-        if results['ids']:
-            self.collection.delete(ids=results['ids'])
+        # Tombstones are only tracked for the space being queried
+        if self.query_space(project_id) is not self:
+            backend, removed = self.migration_target.backend_for(project_id), target_removed
+        if removed and backend.name == "chroma":
+            # HNSW keeps the rows as tombstones until the project is compacted
+            compaction.record_deleted(project_id, removed)
+    
+    def delete_document_from_target(self, document_id: int, project_id: int) -> int:
+        """Delete a document's chunks from the migration target's space, if a migration is running
+
+        The migrator may copy a document while it is being deleted, so this
+        runs again once the delete is committed. Returns the rows removed.
+        """
+        if self.migration_target is None:
+            return 0
+        with self.migration_target.write_lock:
+            return self.migration_target.backend_for(project_id).delete_document(project_id, document_id)
     
     def delete_project(self, project_id: int):
         """Delete all chunks for a specific project"""
-        # Get all chunks for this project
-        results = self.collection.get(
-            where={"project_id": project_id}
-        )
+        with self.write_lock:
+            self.backend_for(project_id).delete_project(project_id)
+            self._project_backends.pop(project_id, None)
+            if self.shard_map is not None:
+                self.shard_map.forget(project_id)
+        compaction.forget(project_id)
+        if self.migration_target is not None:
+            self.migration_target.delete_project(project_id)
+            embedding_spaces.forget(project_id)
+    
+    def list_projects(self) -> List[int]:
+        """Projects with vectors in any backend"""
+        return sorted({project_id for backend in self.backends.values() for project_id in backend.list_projects()})
+    
+    def export_project(self, project_id: int) -> Iterator[Dict]:
+        """Stored rows of a project, as held by its backend (projected vectors and codes included)"""
+        return self.backend_for(project_id).export_project(project_id)
+    
+    def restore_project(self, project_id: int, batches: Iterable[Dict], total_chunks: int):
+        """Replace a project's vectors with previously exported rows
+
+        During a model migration the project's copy in the target space no
+        longer matches; it is dropped, queries return to this space and the
+        migrator re-embeds the project.
+        """
+        if self.migration_target is not None:
+            embedding_spaces.forget(project_id)
+            self.migration_target.delete_project(project_id)
+        with self.write_lock:
+            name = self.backend_mode
+            if name == "auto":
+                name = "chroma" if total_chunks > settings.numpy_backend_max_chunks else "numpy"
+                for other, backend in self.backends.items():
+                    if other != name:
+                        backend.delete_project(project_id)
+            self.backends[name].replace_project(project_id, batches)
+            self._project_backends[project_id] = name
+        compaction.mark_rebuilt(project_id)
+    
+    def project_shards(self) -> Dict[int, List[str]]:
+        """Shards holding vectors of each project (more than one only mid-move or after a failed move)"""
+        if self.shard_map is None:
+            raise ValueError("VECTOR_SHARDS is not configured")
+        found: Dict[int, List[str]] = {}
+        for backend in self.backends.values():
+            for name, shard in backend.shards.items():
+                for project_id in shard.list_projects():
+                    if name not in found.setdefault(project_id, []):
+                        found[project_id].append(name)
+        return found
+    
+    def move_project_shard(self, project_id: int, target: str, settle_seconds: float = 0.0) -> Dict:
+        """Move a project's stored vectors to another shard without re-embedding
+
+        Rows are copied, the recorded placement is switched, and the old copy
+        is dropped. Other processes keep using the old placement until they
+        refresh the shard map; pass settle_seconds of at least
+        SHARD_MAP_REFRESH_SECONDS when they may be writing, and rows they
+        add or delete on the old shard in that window are carried over.
+        """
+        if self.shard_map is None:
+            raise ValueError("VECTOR_SHARDS is not configured")
+        if target not in self.shard_map.names:
+            raise ValueError(f"Unknown shard {target!r}; configured shards: {', '.join(self.shard_map.names)}")
+        
+        with self.write_lock:
+            source = self.shard_map.shard_for(project_id)
+            if source == target:
+                return {"project_id": project_id, "from": source, "to": target, "chunks": 0}
+            
+            copied: Dict[str, set] = {}
+            for kind, backend in self.backends.items():
+                source_backend, target_backend = backend.shards[source], backend.shards[target]
+                if not source_backend.has_project(project_id):
+                    # Leftovers of an earlier attempt would shadow the moved rows
+                    target_backend.delete_project(project_id)
+                    continue
+                ids = set()
+                def rows(source_backend=source_backend, ids=ids):
+                    for batch in source_backend.export_project(project_id):
+                        ids.update(batch["ids"])
+                        yield batch
+                target_backend.replace_project(project_id, rows())
+                copied[kind] = ids
+            self.shard_map.assign(project_id, target)
+        
+        if settle_seconds > 0:
+            time.sleep(settle_seconds)
         
-        if results['ids']:
-            self.collection.delete(ids=results['ids'])
+        with self.write_lock:
+            for kind, ids in copied.items():
+                source_backend, target_backend = self.backends[kind].shards[source], self.backends[kind].shards[target]
+                if settle_seconds > 0:
+                    self._carry_over_late_writes(project_id, ids, source_backend, target_backend)
+                source_backend.delete_project(project_id)
+        
+        compaction.mark_rebuilt(project_id)
+        return {"project_id": project_id, "from": source, "to": target,
+                "chunks": sum(len(ids) for ids in copied.values())}
     
-    def get_document_stats(self, document_id: int) -> Dict:
-        """Get statistics for a document"""
-        results = self.collection.get(
-            where={"document_id": document_id}
-        )
+    def _carry_over_late_writes(self, project_id: int, copied_ids: set, source: VectorBackend, target: VectorBackend):
+        """Apply writes that reached the old shard after the copy"""
+        current_ids = set()
+        for batch in source.export_project(project_id):
+            current_ids.update(batch["ids"])
+            new_rows = [i for i, chunk_id in enumerate(batch["ids"]) if chunk_id not in copied_ids]
+            if new_rows:
+                target.add(
+                    project_id,
+                    ids=[batch["ids"][i] for i in new_rows],
+                    embeddings=np.asarray(batch["embeddings"])[new_rows],
+                    documents=[batch["documents"][i] for i in new_rows],
+                    metadatas=[batch["metadatas"][i] for i in new_rows]
+                )
+        # Chunk ids are doc_{document_id}_chunk_{index}; deletes happen a document at a time
+        deleted_documents = {int(chunk_id.split("_")[1]) for chunk_id in copied_ids - current_ids}
+        for document_id in deleted_documents:
+            target.delete_document(project_id, document_id)
+    
+    def deleted_fraction(self, project_id: int) -> float:
+        """Share of a project's index taken up by deleted rows, in the space it is queried from"""
+        space = self.query_space(project_id)
+        if space is not self:
+            return space.deleted_fraction(project_id)
+        backend = self.backend_for(project_id)
+        if backend.name == "numpy":
+            return backend.deleted_fraction(project_id)
+        if settings.vector_db_layout == "global":
+            # The shared collection can't be rebuilt per project
+            return 0.0
+        deleted = compaction.deleted_rows(project_id)
+        if not deleted:
+            return 0.0
+        return deleted / (deleted + backend.count(project_id))
+    
+    def compact_project(self, project_id: int, keep_lease: Optional[Callable[[], None]] = None) -> Dict:
+        """Rebuild a project's index without its deleted rows and report the space reclaimed
+
+        Searches and writes keep running: a Chroma rebuild only holds the
+        write lock while it swaps the new collection in, and the NumPy
+        backend locks just the project's own files. Compactions of one
+        project are serialized. A project that switched to the migration
+        target's space is compacted there. keep_lease, if given, is called
+        between the batches of a Chroma rebuild and may raise to stop it.
+        """
+        space = self.query_space(project_id)
+        if space is not self:
+            return space.compact_project(project_id, keep_lease)
+        with self._compaction_locks[project_id]:
+            backend = self.backend_for(project_id)
+            bytes_before = backend.storage_bytes(project_id)
+            if backend.name == "numpy":
+                removed = backend.compact(project_id)
+            else:
+                removed = compaction.deleted_rows(project_id)
+                backend.rebuild_project(project_id, swap_lock=self.write_lock, keep_lease=keep_lease)
+            compaction.mark_rebuilt(project_id)
+            bytes_after = backend.storage_bytes(project_id)
         
         return {
-            "total_chunks": len(results['ids']) if results['ids'] else 0,
-            "document_id": document_id
+            "project_id": project_id,
+            "backend": backend.name,
+            "rows_removed": removed,
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": bytes_before - bytes_after if bytes_before is not None and bytes_after is not None else None
         }
     
     def get_project_stats(self, project_id: int) -> Dict:
-        """Get statistics for a project"""
-        results = self.collection.get(
-            where={"project_id": project_id}
-        )
-        
-        # Count documents
-        document_ids = set()
-        if results['metadatas']:
-            for metadata in results['metadatas']:
-                document_ids.add(metadata['document_id'])
-        
+        """Chunk count as stored in the vector backend (used for reconciliation)"""
         return {
-            "total_chunks": len(results['ids']) if results['ids'] else 0,
-            "total_documents": len(document_ids),
+            "total_chunks": self.backend_for(project_id).count(project_id),
             "project_id": project_id
-        } 
\ No newline at end of file
+        }
+    
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters for the embedding and retrieval caches"""
+        cache = self.embedding_function.cache
+        return {
+            "embedding_cache": cache.stats() if cache is not None else None,
+            "query_embedding_cache": self.query_embedding_cache.stats(),
+            "retrieval_cache": self.retrieval_cache.stats()
+        }
@@ -0,0 +1,142 @@
+"""
+Vector Writer - one writer thread per vector store, coalescing inserts
+
+Every ingestion job used to make its own backend add call, so a bulk upload
+of small notes became hundreds of tiny writes contending on Chroma's SQLite
+and HNSW locks (or hundreds of matrix rewrites in the NumPy backend). Jobs
+now submit their embedded batches here and wait on a future; the writer
+gathers pending batches from all jobs and flushes them per project once
+VECTOR_WRITE_MAX_ROWS rows are waiting or VECTOR_WRITE_MAX_WAIT_MS after the
+first one arrived, whichever comes first.
+
+If a combined write fails, its batches are retried one by one so only the
+batches that fail on their own (i.e. the documents they belong to) see the
+error.
+"""
+
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.batching import Batcher, BatchItem
+
+class PendingWrite(BatchItem):
+    """Rows of one document waiting to be written"""
+
+    def __init__(self, project_id: int, ids: List[str], embeddings: np.ndarray, documents: List[str],
+                 metadatas: List[Dict]):
+        super().__init__(len(ids))
+        self.project_id = project_id
+        self.ids = ids
+        self.embeddings = embeddings
+        self.documents = documents
+        self.metadatas = metadatas
+
+class VectorWriter:
+    """Coalesces concurrent vector inserts into few large backend writes
+
+    write(project_id, ids, embeddings, documents, metadatas) performs one
+    backend add; max_rows(project_id) is the backend's insert batch limit.
+    """
+
+    def __init__(self, write: Callable, max_rows: Callable[[int], int], flush_rows: int = None,
+                 max_wait_ms: float = None):
+        self.write = write
+        self.max_rows = max_rows
+        self.requests = 0
+        self.writes = 0
+        self.rows = 0
+        self.failed = 0
+        self._batcher = Batcher(
+            self._flush,
+            max_size=flush_rows or settings.vector_write_max_rows,
+            max_wait_ms=max_wait_ms if max_wait_ms is not None else settings.vector_write_max_wait_ms,
+            name="vector-writer",
+            closed_message="Vector writer is shutting down"
+        )
+
+    def submit(self, project_id: int, ids: List[str], embeddings: np.ndarray, documents: List[str],
+               metadatas: List[Dict]) -> Future:
+        """Queue rows for writing; the future resolves once they are stored"""
+        return self._batcher.submit(PendingWrite(project_id, ids, embeddings, documents, metadatas))
+
+    def _flush(self, batch: List[PendingWrite]):
+        by_project: Dict[int, List[PendingWrite]] = {}
+        for pending in batch:
+            by_project.setdefault(pending.project_id, []).append(pending)
+        for project_id, pending_writes in by_project.items():
+            self._flush_project(project_id, pending_writes)
+
+    def _flush_project(self, project_id: int, pending_writes: List[PendingWrite]):
+        try:
+            limit = self.max_rows(project_id)
+        except Exception as e:
+            self._fail(pending_writes, e)
+            return
+
+        # Pack whole submissions into each write so a failure maps to the submissions in it
+        group: List[PendingWrite] = []
+        group_rows = 0
+        for pending in pending_writes:
+            if group and group_rows + len(pending.ids) > limit:
+                self._write_group(project_id, group, limit)
+                group, group_rows = [], 0
+            group.append(pending)
+            group_rows += len(pending.ids)
+        if group:
+            self._write_group(project_id, group, limit)
+
+    def _write_group(self, project_id: int, group: List[PendingWrite], limit: int):
+        try:
+            self._write_rows(project_id, group, limit)
+        except Exception as e:
+            if len(group) == 1:
+                self._fail(group, e)
+                return
+            # Backend writes are idempotent upserts or all-or-nothing, so retrying alone is safe
+            for pending in group:
+                try:
+                    self._write_rows(project_id, [pending], limit)
+                except Exception as single_error:
+                    self._fail([pending], single_error)
+                    continue
+                self._succeed([pending])
+            return
+        self._succeed(group)
+
+    def _write_rows(self, project_id: int, group: List[PendingWrite], limit: int):
+        ids = [chunk_id for pending in group for chunk_id in pending.ids]
+        documents = [document for pending in group for document in pending.documents]
+        metadatas = [metadata for pending in group for metadata in pending.metadatas]
+        embeddings = np.concatenate([np.asarray(pending.embeddings, dtype=np.float32) for pending in group])
+        # A single submission can still exceed the limit if the project changed backend since
+        for start in range(0, len(ids), limit):
+            end = start + limit
+            self.write(project_id, ids[start:end], embeddings[start:end], documents[start:end], metadatas[start:end])
+            self.writes += 1
+
+    def _succeed(self, group: List[PendingWrite]):
+        for pending in group:
+            self.requests += 1
+            self.rows += len(pending.ids)
+            pending.future.set_result(len(pending.ids))
+
+    def _fail(self, group: List[PendingWrite], error: Exception):
+        for pending in group:
+            self.requests += 1
+            self.failed += 1
+            pending.future.set_exception(error)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "writes": self.writes,
+            "rows": self.rows,
+            "failed": self.failed,
+            "rows_per_write": round(self.rows / self.writes, 2) if self.writes else 0.0
+        }
+
+    def close(self):
+        self._batcher.close()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Embedding server benchmark for KairosAI
+Encodes single chat queries from many concurrent threads, as simultaneous
+chat requests would, first directly with the model and then through the
+embedding server with different batching windows. Reports queries per
+second, p95 latency and the server's average batch size.
+
+    python -m benchmarks.embedding_server_benchmark --concurrency 32 --queries 2000 --max-wait-ms 0 2 5 10
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_backends import load_embedding_model
+from app.services.embedding_server import EmbeddingServer, EmbeddingServerClient
+
+QUERIES = [
+    "What are the MVP requirements for single sign-on?",
+    "Summarise the pricing discussion from the last meeting",
+    "Which vendors responded to the RFP before the deadline?",
+    "List the personas mentioned in the discovery interviews",
+    "What does REQ-{n} say about exports?",
+]
+
+def run(model, queries: list, concurrency: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def encode(query):
+        start = time.perf_counter()
+        model.encode([query], batch_size=1, convert_to_numpy=True, show_progress_bar=False)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as requests:
+        list(requests.map(encode, queries))
+    elapsed = time.perf_counter() - start
+    return {"qps": len(queries) / elapsed, "p95_ms": float(np.percentile(latencies, 95)) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--max-batch", type=int, default=settings.embedding_server_max_batch)
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[0, 2, 5, 10])
+    parser.add_argument("--backend", default=settings.embedding_server_backend, choices=["torch", "onnx"])
+    args = parser.parse_args()
+
+    queries = [QUERIES[i % len(QUERIES)].format(n=i) for i in range(args.queries)]
+    print(f"{'mode':>16}{'queries/s':>11}{'p95 ms':>9}{'avg batch':>11}")
+
+    direct = run(load_embedding_model(settings.embedding_model, args.backend), queries, args.concurrency)
+    print(f"{'direct':>16}{direct['qps']:>11.1f}{direct['p95_ms']:>9.1f}{1:>11.2f}")
+
+    directory = tempfile.mkdtemp(prefix="kairos-embedding-server-")
+    try:
+        for max_wait_ms in args.max_wait_ms:
+            socket_path = os.path.join(directory, f"server-{max_wait_ms}.sock")
+            server = EmbeddingServer(settings.embedding_model, socket_path, args.backend, args.max_batch, max_wait_ms)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            server.ready.wait()
+
+            row = run(EmbeddingServerClient(settings.embedding_model, socket_path), queries, args.concurrency)
+            stats = server.batcher.stats()
+            server.shutdown()
+            thread.join()
+            print(f"{f'server {max_wait_ms:g}ms':>16}{row['qps']:>11.1f}{row['p95_ms']:>9.1f}"
+                  f"{stats['average_batch_size']:>11.2f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+HNSW tuning benchmark for KairosAI
+Sweeps Chroma's HNSW parameters (M, construction ef, search ef) on a
+synthetic corpus. For each combination it builds a collection and reports
+build time, index size on disk (what the HNSW graph and vectors occupy in
+memory once loaded), p50/p99 single-query latency and recall@k against
+exact search. Pick a row, then set CHROMA_HNSW_M, CHROMA_HNSW_CONSTRUCTION_EF
+and CHROMA_HNSW_SEARCH_EF.
+
+    python -m benchmarks.hnsw_tuning_benchmark --size 20000 --m 8 16 32 --construction-ef 100 200 --search-ef 10 50 100
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.vector_backends import ChromaBackend, hnsw_metadata
+from benchmarks.vector_backend_benchmark import PROJECT_ID, rows
+from benchmarks.vector_storage_benchmark import recall, synthetic_corpus, top_k
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int,
+             m: int, construction_ef: int, search_ef: int) -> dict:
+    import chromadb
+    from chromadb.config import Settings
+
+    directory = tempfile.mkdtemp(prefix="kairos-hnsw-")
+    try:
+        client = chromadb.PersistentClient(path=directory, settings=Settings(anonymized_telemetry=False))
+        backend = ChromaBackend(client, layout="per_project", hnsw=hnsw_metadata(m, construction_ef, search_ef))
+        data = rows(corpus)
+        batch_size = backend.max_insert_batch()
+
+        start = time.perf_counter()
+        for offset in range(0, len(corpus), batch_size):
+            end = offset + batch_size
+            backend.add(
+                PROJECT_ID,
+                ids=data["ids"][offset:end],
+                embeddings=corpus[offset:end],
+                documents=data["documents"][offset:end],
+                metadatas=data["metadatas"][offset:end]
+            )
+        build_seconds = time.perf_counter() - start
+
+        positions = {chunk_id: i for i, chunk_id in enumerate(data["ids"])}
+        latencies, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results = backend.query(PROJECT_ID, query, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append([positions[result['id']] for result in results])
+        index_bytes = directory_size(directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "build_s": build_seconds,
+        "index_mb": index_bytes / (1024 * 1024),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "recall": recall(np.array(found), truth)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 50, 100])
+    args = parser.parse_args()
+
+    data = synthetic_corpus(args.size + args.queries, args.dimensions, clusters=64, seed=args.seed)
+    corpus, queries = data[args.queries:], data[:args.queries]
+    truth = top_k(corpus, queries, args.k)
+
+    print(f"{args.size} chunks, {args.dimensions} dimensions, recall@{args.k} against exact search")
+    print(f"{'M':>4}{'constr ef':>11}{'search ef':>11}{'build s':>9}{'index MB':>10}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'recall':>8}")
+    for m in args.m:
+        for construction_ef in args.construction_ef:
+            for search_ef in args.search_ef:
+                row = evaluate(corpus, queries, truth, args.k, m, construction_ef, search_ef)
+                print(f"{m:>4}{construction_ef:>11}{search_ef:>11}{row['build_s']:>9.2f}{row['index_mb']:>10.1f}"
+                      f"{row['p50_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['recall']:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Ingestion throughput benchmark for KairosAI
+Processes the same set of synthetic text documents concurrently (as several
+simultaneous uploads would) with different ingestion worker counts, and
+reports documents and chunks per second. Embedding caching is disabled so
+every run does the full encode work.
+
+    python -m benchmarks.ingestion_benchmark --workers 0 1 2 4 --documents 16
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.services.ingestion import IngestionEngine
+
+PARAGRAPH = (
+    "The platform must let operations managers import supplier catalogues, reconcile "
+    "purchase orders against invoices and flag discrepancies above a configurable "
+    "threshold. REQ-{n}: exports are available as PDF and Word within five seconds. "
+)
+
+def write_documents(directory: str, count: int, paragraphs: int) -> list:
+    paths = []
+    for i in range(count):
+        path = f"{directory}/document_{i}.txt"
+        with open(path, "w") as f:
+            f.write("\n\n".join(PARAGRAPH.format(n=f"{i:03d}-{p:03d}") for p in range(paragraphs)))
+        paths.append(path)
+    return paths
+
+def in_process(engine: IngestionEngine):
+    """engine.process plus embedding, which in-process mode leaves to VectorStore"""
+    from app.services.vector_store import CustomEmbeddingFunction
+    embedding_function = CustomEmbeddingFunction(settings.embedding_model)
+
+    def process(file_path, file_type, document_id):
+        chunks, _ = engine.process(file_path, file_type, document_id)
+        return chunks, embedding_function.embed([chunk['chunk_text'] for chunk in chunks])
+    return process
+
+def run(workers: int, threads: int, paths: list) -> dict:
+    engine = IngestionEngine(workers=workers, threads_per_worker=threads)
+    process = engine.process if workers > 0 else in_process(engine)
+    try:
+        # Load the model in every worker before timing
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as warm_up:
+            list(warm_up.map(lambda i: process(paths[0], "txt", i), range(max(1, workers))))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(paths)) as uploads:
+            results = list(uploads.map(lambda item: process(item[1], "txt", item[0]), enumerate(paths)))
+        elapsed = time.perf_counter() - start
+    finally:
+        engine.close()
+
+    chunks = sum(len(chunk_list) for chunk_list, _ in results)
+    return {"docs_per_s": len(paths) / elapsed, "chunks_per_s": chunks / elapsed, "seconds": elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--threads", type=int, default=1, help="torch/tokenizer threads per worker")
+    parser.add_argument("--documents", type=int, default=16)
+    parser.add_argument("--paragraphs", type=int, default=200)
+    args = parser.parse_args()
+
+    # Also reaches the spawned workers, which read settings from the environment
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    settings.embedding_cache_enabled = False
+    directory = tempfile.mkdtemp(prefix="kairos-ingestion-")
+    try:
+        paths = write_documents(directory, args.documents, args.paragraphs)
+        print(f"{'workers':>8}{'seconds':>10}{'docs/s':>10}{'chunks/s':>11}{'speedup':>9}")
+        baseline = None
+        for workers in args.workers:
+            row = run(workers, args.threads, paths)
+            baseline = baseline or row["chunks_per_s"]
+            print(f"{workers:>8}{row['seconds']:>10.2f}{row['docs_per_s']:>10.2f}{row['chunks_per_s']:>11.1f}"
+                  f"{row['chunks_per_s'] / baseline:>8.2f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Vector backend benchmark for KairosAI
+Compares the Chroma (HNSW) and NumPy (exact) backends on the same corpus:
+time to add the vectors, p50/p99 single-query latency, and recall@k against
+exact search. Each backend writes to a temporary directory.
+
+    python -m benchmarks.vector_backend_benchmark --sizes 1000 10000 50000
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.vector_backends import ChromaBackend, NumpyBackend
+from benchmarks.vector_storage_benchmark import recall, synthetic_corpus, top_k
+
+PROJECT_ID = 1
+
+def rows(corpus: np.ndarray) -> dict:
+    return {
+        "ids": [f"doc_{i // 10}_chunk_{i % 10}" for i in range(len(corpus))],
+        "documents": [f"chunk {i}" for i in range(len(corpus))],
+        "metadatas": [
+            {"document_id": i // 10, "project_id": PROJECT_ID, "chunk_index": i % 10}
+            for i in range(len(corpus))
+        ]
+    }
+
+def create_backend(name: str, directory: str):
+    if name == "numpy":
+        return NumpyBackend(root=directory)
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.PersistentClient(path=directory, settings=Settings(anonymized_telemetry=False))
+    return ChromaBackend(client, layout="per_project")
+
+def evaluate(name: str, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    directory = tempfile.mkdtemp(prefix=f"kairos-{name}-")
+    try:
+        backend = create_backend(name, directory)
+        data = rows(corpus)
+        batch_size = backend.max_insert_batch()
+
+        start = time.perf_counter()
+        for offset in range(0, len(corpus), batch_size):
+            end = offset + batch_size
+            backend.add(
+                PROJECT_ID,
+                ids=data["ids"][offset:end],
+                embeddings=corpus[offset:end],
+                documents=data["documents"][offset:end],
+                metadatas=data["metadatas"][offset:end]
+            )
+        add_seconds = time.perf_counter() - start
+
+        positions = {chunk_id: i for i, chunk_id in enumerate(data["ids"])}
+        latencies, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results = backend.query(PROJECT_ID, query, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append([positions[result['id']] for result in results])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        "backend": name,
+        "add_s": add_seconds,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "recall": recall(np.array(found), truth)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"])
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8}  {'backend':<8}{'add s':>9}{'p50 ms':>9}{'p99 ms':>9}{'recall@k':>10}")
+    for size in args.sizes:
+        data = synthetic_corpus(size + args.queries, args.dimensions, clusters=64, seed=args.seed)
+        corpus, queries = data[args.queries:], data[:args.queries]
+        truth = top_k(corpus, queries, args.k)
+        for name in args.backends:
+            row = evaluate(name, corpus, queries, truth, args.k)
+            print(f"{size:>8}  {row['backend']:<8}{row['add_s']:>9.2f}{row['p50_ms']:>9.2f}"
+                  f"{row['p99_ms']:>9.2f}{row['recall']:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Vector storage benchmark for KairosAI
+Reports recall@k against exact float32 search, and bytes stored per vector, for
+each compact storage mode (PCA index size x rescoring code precision). Sizes
+are what VectorStore actually writes: the float32 index vectors plus the
+base64 rescoring code kept in chunk metadata.
+
+Uses exact search in every mode so the numbers isolate the effect of
+compression from the approximation of the HNSW index.
+
+    python -m benchmarks.vector_storage_benchmark --corpus 50000 --queries 500
+    python -m benchmarks.vector_storage_benchmark --from-db
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.services.vector_codec import VectorCodec, normalize
+
+def synthetic_corpus(n: int, dimensions: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered unit vectors, which behave more like text embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size=n)
+    vectors = centers[assignments] + 0.6 * rng.normal(size=(n, dimensions)).astype(np.float32)
+    return normalize(vectors).astype(np.float32)
+
+def corpus_from_db(limit: int) -> np.ndarray:
+    from app.db.database import SessionLocal
+    from app.db.models import DocumentChunk
+    from app.services.container import container
+
+    db = SessionLocal()
+    try:
+        texts = [row[0] for row in db.query(DocumentChunk.chunk_text).limit(limit).all()]
+    finally:
+        db.close()
+    return normalize(container.embedding_function.embed(texts))
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ matrix.T
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int,
+             dtype: str, pca_dimensions: int, rescore_factor: int) -> dict:
+    codec = VectorCodec(dtype, pca_dimensions)
+    codec.fit(corpus[:min(len(corpus), 20000)])
+    start = time.perf_counter()
+
+    if codec.uses_pca:
+        index = codec.project(corpus)
+        candidates = top_k(index, codec.project(queries), k * rescore_factor)
+        full = normalize(codec.decode(codec.encode(corpus)))
+        found = []
+        for query, ids in zip(queries, candidates):
+            order = np.argsort(-(full[ids] @ query))[:k]
+            found.append(ids[order])
+        found = np.array(found)
+    else:
+        # No projection: the index holds the full float32 vectors
+        found = top_k(corpus, queries, k)
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    sizes = codec.bytes_per_vector(corpus.shape[1])
+    return {
+        "mode": f"{dtype}" + (f" + pca{pca_dimensions} x{rescore_factor}" if codec.uses_pca else ""),
+        "recall": recall(found, truth),
+        "index_mb": sizes["index"] * len(corpus) / 1e6,
+        "codes_mb": sizes["codes"] * len(corpus) / 1e6,
+        "total_mb": sizes["total"] * len(corpus) / 1e6,
+        "ms": elapsed_ms
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--from-db", action="store_true", help="Embed stored chunks instead of a synthetic corpus")
+    args = parser.parse_args()
+
+    data = corpus_from_db(args.corpus + args.queries) if args.from_db else \
+        synthetic_corpus(args.corpus + args.queries, args.dimensions, clusters=64, seed=args.seed)
+    corpus, queries = data[args.queries:], data[:args.queries]
+    truth = top_k(corpus, queries, args.k)
+    baseline_mb = corpus.shape[1] * 4 * len(corpus) / 1e6
+
+    # float16/int8 only apply to rescoring codes, so they need a PCA index
+    modes = [("float32", 0, 1)]
+    for pca_dimensions in (192, 128, 64):
+        if pca_dimensions >= corpus.shape[1]:
+            continue
+        for dtype in ("float32", "float16", "int8"):
+            modes.append((dtype, pca_dimensions, 4))
+        modes.append(("int8", pca_dimensions, 1))
+
+    print(f"corpus={len(corpus)} queries={len(queries)} dims={corpus.shape[1]} k={args.k} baseline={baseline_mb:.1f}MB")
+    print(f"{'mode':<28}{'recall@k':>10}{'index MB':>10}{'codes MB':>10}{'total MB':>10}{'reduction':>11}{'ms':>9}")
+    for dtype, pca_dimensions, rescore_factor in modes:
+        row = evaluate(corpus, queries, truth, args.k, dtype, pca_dimensions, rescore_factor)
+        print(f"{row['mode']:<28}{row['recall']:>10.3f}{row['index_mb']:>10.1f}{row['codes_mb']:>10.1f}"
+              f"{row['total_mb']:>10.1f}{baseline_mb / row['total_mb']:>10.1f}x{row['ms']:>9.0f}")
+
+if __name__ == "__main__":
+    main()
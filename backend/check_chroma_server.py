@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Chroma server check for KairosAI
+Runs the vector backend operations against a Chroma server and against an
+embedded client side by side, and fails if they behave differently. Without
+--url a throwaway local server is launched with `chroma run` as a stand-in
+for the shared one.
+
+    python check_chroma_server.py [--port 8001]
+    python check_chroma_server.py --url http://localhost:8001
+
+Scratch collections use their own prefix, so a live server's projects are
+never touched.
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from app.core.config import settings
+from app.services.vector_backends import ChromaBackend, create_chroma_client
+
+COLLECTION_PREFIX = "kairos_server_check"
+PROJECT_ID = 1
+DIMENSIONS = 16
+
+def launch_server(path: str, port: int) -> subprocess.Popen:
+    """Start `chroma run` on path and wait until it answers"""
+    if shutil.which("chroma") is None:
+        raise RuntimeError("The chroma CLI is not installed (pip install chromadb)")
+    process = subprocess.Popen(
+        ["chroma", "run", "--path", path, "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"chroma run exited with code {process.returncode}")
+        try:
+            create_chroma_client(f"http://localhost:{port}").heartbeat()
+            return process
+        except Exception:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Chroma server did not start on port {port}")
+
+def run_operations(backend: ChromaBackend) -> list:
+    """Exercise every backend operation on a scratch project; returns what each one observed"""
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(30, DIMENSIONS)).astype(np.float32)
+    ids = [f"doc_{i // 10}_chunk_{i % 10}" for i in range(30)]
+    metadatas = [{"document_id": i // 10, "project_id": PROJECT_ID, "chunk_index": i % 10} for i in range(30)]
+
+    backend.delete_project(PROJECT_ID)
+    observed = []
+    backend.add(PROJECT_ID, ids, embeddings, ids, metadatas)
+    observed.append(("count", backend.count(PROJECT_ID)))
+    observed.append(("query", [result["id"] for result in backend.query(PROJECT_ID, embeddings[3], 5)]))
+    observed.append(("query_many", [
+        [result["id"] for result in results]
+        for results in backend.query_many(PROJECT_ID, embeddings[:4], 3, where={"document_id": {"$in": [1, 2]}})
+    ]))
+    # Writes are upserts, so a retried batch leaves the same rows
+    backend.add(PROJECT_ID, ids[:10], embeddings[:10], ids[:10], metadatas[:10])
+    observed.append(("upsert count", backend.count(PROJECT_ID)))
+    observed.append(("delete_document", backend.delete_document(PROJECT_ID, 1)))
+    exported = list(backend.export_project(PROJECT_ID, batch_size=7))
+    observed.append(("export", sorted(chunk_id for batch in exported for chunk_id in batch["ids"])))
+    backend.replace_project(PROJECT_ID, exported)
+    observed.append(("replace count", backend.count(PROJECT_ID)))
+    observed.append(("has_project", PROJECT_ID in backend.list_projects()))
+    backend.delete_project(PROJECT_ID)
+    observed.append(("delete_project count", backend.count(PROJECT_ID)))
+    return observed
+
+def check(url: str = None, port: int = 8001) -> bool:
+    directory = tempfile.mkdtemp(prefix="chroma_check_")
+    process = None
+    try:
+        if url is None:
+            print(f"Launching a local Chroma server on port {port}...")
+            process = launch_server(f"{directory}/server", port)
+            url = f"http://localhost:{port}"
+
+        http_client = create_chroma_client(url)
+        server_version = http_client.get_version()
+        print(f"  server {url}: Chroma {server_version}, client {chromadb.__version__}")
+        if server_version != chromadb.__version__:
+            print("❌ Server and client versions differ; pin the chroma image to the installed chromadb version")
+            return False
+
+        remote = run_operations(ChromaBackend(
+            http_client, layout="per_project", retries=settings.chroma_max_retries, collection_prefix=COLLECTION_PREFIX
+        ))
+        embedded = run_operations(ChromaBackend(
+            create_chroma_client(f"{directory}/embedded"), layout="per_project", collection_prefix=COLLECTION_PREFIX
+        ))
+
+        mismatches = [(name, a, b) for (name, a), (_, b) in zip(remote, embedded) if a != b]
+        for name, a, b in mismatches:
+            print(f"  {name}: server {a}, embedded {b}")
+        if mismatches:
+            print(f"❌ {len(mismatches)} of {len(remote)} operations differ between server and embedded modes")
+            return False
+        print(f"✅ All {len(remote)} operations behave the same against the server and embedded")
+        return True
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Existing Chroma server, e.g. http://localhost:8001 (default: launch one)")
+    parser.add_argument("--port", type=int, default=8001, help="Port for the launched server")
+    args = parser.parse_args()
+
+    try:
+        sys.exit(0 if check(args.url, args.port) else 1)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+ONNX export script for KairosAI
+Exports the configured sentence embedding model to ONNX, writes a dynamically
+int8-quantized copy, and optionally checks that the ONNX backend's outputs stay
+within a cosine tolerance of the PyTorch backend.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_backends import OnnxEmbeddingModel, load_torch_model, onnx_model_dir, onnx_model_file
+
+# Minimum cosine similarity between ONNX and PyTorch embeddings of the same sentence
+DEFAULT_TOLERANCE = 0.99
+
+PARITY_SENTENCES = [
+    "The MVP must support single sign-on for enterprise customers.",
+    "REQ-001: Users can export generated documents to PDF and Word.",
+    "Quarterly revenue grew 12% driven by the new subscription tier.",
+    "Personas: operations manager, procurement lead, IT administrator.",
+    "The vendor shall respond to this RFP no later than March 31.",
+    "short",
+    " ".join(["Long context paragraph about go-to-market strategy and pricing."] * 40),
+]
+
+def export(model_name: str):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    model = load_torch_model(model_name)
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    directory = onnx_model_dir(model_name)
+    os.makedirs(directory, exist_ok=True)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    print(f"Exporting {model_name} to {directory}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            onnx_model_file(model_name, quantized=False),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+
+    print("Quantizing weights to int8...")
+    quantize_dynamic(
+        onnx_model_file(model_name, quantized=False),
+        onnx_model_file(model_name, quantized=True),
+        weight_type=QuantType.QInt8
+    )
+
+    tokenizer.save_pretrained(directory)
+    normalize = any(type(module).__name__ == "Normalize" for module in model)
+    with open(os.path.join(directory, "embedding_config.json"), "w") as f:
+        json.dump({
+            "dimension": model.get_sentence_embedding_dimension(),
+            "max_seq_length": model.max_seq_length,
+            "normalize": normalize
+        }, f, indent=2)
+
+    print("✅ ONNX export complete")
+
+def reference_embeddings(model_name: str) -> np.ndarray:
+    """Normalized PyTorch embeddings of the parity sentences"""
+    reference = load_torch_model(model_name).encode(PARITY_SENTENCES, convert_to_numpy=True)
+    return reference / np.linalg.norm(reference, axis=1, keepdims=True)
+
+def parity(model_name: str, quantized: bool, reference: np.ndarray) -> np.ndarray:
+    """Cosine similarity of each parity sentence's ONNX embedding to its PyTorch one"""
+    candidate = OnnxEmbeddingModel(model_name, quantized=quantized).encode(PARITY_SENTENCES)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return (reference * candidate).sum(axis=1)
+
+def verify(model_name: str, tolerance: float) -> bool:
+    """Compare ONNX and PyTorch embeddings; True if every pair is within tolerance"""
+    reference = reference_embeddings(model_name)
+
+    passed = True
+    for quantized in (False, True):
+        similarities = parity(model_name, quantized, reference)
+        label = "int8" if quantized else "fp32"
+        ok = bool(similarities.min() >= tolerance)
+        passed = passed and ok
+        print(f"  {label}: min cosine {similarities.min():.4f}, mean {similarities.mean():.4f} "
+              f"{'✅' if ok else '❌'} (tolerance {tolerance})")
+    return passed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=settings.embedding_model)
+    parser.add_argument("--verify", action="store_true", help="Check cosine parity against the PyTorch backend")
+    parser.add_argument("--verify-only", action="store_true", help="Skip export and only run the parity check")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Minimum cosine similarity per sentence")
+    args = parser.parse_args()
+
+    if not args.verify_only:
+        export(args.model)
+    if args.verify or args.verify_only:
+        print("Checking parity with the PyTorch backend...")
+        if not verify(args.model, args.tolerance):
+            sys.exit(1)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Vector codec fitting script for KairosAI
+Fits the PCA projection used by compact vector storage on a sample of chunk
+embeddings, saves it next to the vector database, and rewrites existing
+Chroma collections and NumPy backend projects into the compact layout without
+re-embedding stored chunks.
+"""
+
+import argparse
+import os
+
+import numpy as np
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.models import DocumentChunk
+from app.services.container import container
+from app.services.shard_map import numpy_shard_path, parse_shards
+from app.services.vector_backends import NumpyBackend, create_chroma_client
+from app.services.vector_codec import VectorCodec, codec_path, load_vector_codec
+from app.services.vector_store import VECTOR_CODE_KEY
+
+PAGE_SIZE = 1000
+
+def sample_embeddings(sample_size: int) -> np.ndarray:
+    """Embed a random sample of stored chunks (mostly served from the embedding cache)"""
+    db = SessionLocal()
+    try:
+        rows = db.query(DocumentChunk.chunk_text).order_by(func.random()).limit(sample_size).all()
+    finally:
+        db.close()
+    return container.embedding_function.embed([row[0] for row in rows])
+
+def list_collection_names(client) -> list:
+    names = [c if isinstance(c, str) else c.name for c in client.list_collections()]
+    prefix = f"{settings.vector_db_collection_name}_project_"
+    return [name for name in names if name == settings.vector_db_collection_name or name.startswith(prefix)]
+
+def convert_batch(batch: dict, old_codec: VectorCodec, new_codec: VectorCodec) -> dict:
+    """Re-project one batch of stored rows and attach fresh codes"""
+    # Recover full vectors: from codes if the rows were already compact
+    full_vectors = []
+    for embedding, metadata in zip(batch['embeddings'], batch['metadatas']):
+        if VECTOR_CODE_KEY in metadata:
+            full_vectors.append(old_codec.decode([metadata.pop(VECTOR_CODE_KEY)])[0])
+        else:
+            full_vectors.append(np.asarray(embedding, dtype=np.float32))
+    full_vectors = np.stack(full_vectors)
+
+    if new_codec.active:
+        for metadata, code in zip(batch['metadatas'], new_codec.encode(full_vectors)):
+            metadata[VECTOR_CODE_KEY] = code
+
+    return {
+        "ids": batch['ids'],
+        "embeddings": new_codec.project(full_vectors),
+        "documents": batch['documents'],
+        "metadatas": batch['metadatas']
+    }
+
+def convert_collection(client, name: str, old_codec: VectorCodec, new_codec: VectorCodec):
+    """Rebuild one collection with projected vectors and fresh codes"""
+    source = client.get_collection(name=name)
+    shadow_name = f"{name}_compact"
+    try:
+        client.delete_collection(name=shadow_name)
+    except Exception:
+        pass
+    shadow = client.create_collection(name=shadow_name, metadata=source.metadata)
+
+    total = source.count()
+    for offset in range(0, total, PAGE_SIZE):
+        page = source.get(include=["embeddings", "documents", "metadatas"], limit=PAGE_SIZE, offset=offset)
+        if not page['ids']:
+            break
+        batch = convert_batch(page, old_codec, new_codec)
+        shadow.add(
+            ids=batch['ids'],
+            embeddings=batch['embeddings'].tolist(),
+            documents=batch['documents'],
+            metadatas=batch['metadatas']
+        )
+
+    client.delete_collection(name=name)
+    shadow.modify(name=name)
+    print(f"  {name}: {total} chunks")
+
+def convert_numpy_projects(backend: NumpyBackend, old_codec: VectorCodec, new_codec: VectorCodec):
+    """Rewrite every project of the NumPy backend as a new version"""
+    for project_id in backend.list_projects():
+        total = backend.count(project_id)
+        backend.replace_project(project_id, [
+            convert_batch(batch, old_codec, new_codec) for batch in backend.export_project(project_id, PAGE_SIZE)
+        ])
+        print(f"  numpy project {project_id}: {total} chunks")
+
+def fit(sample_size: int):
+    new_codec = VectorCodec(settings.vector_storage_dtype, settings.vector_pca_dimensions)
+    old_codec = VectorCodec.load(codec_path()) if os.path.exists(codec_path()) else load_vector_codec()
+
+    if new_codec.uses_pca:
+        print(f"Fitting PCA to {new_codec.pca_dimensions} dimensions on up to {sample_size} chunks...")
+        new_codec.fit(sample_embeddings(sample_size))
+    new_codec.save(codec_path())
+    print(f"Saved codec to {codec_path()}")
+
+    shards = parse_shards()
+    if settings.vector_backend in ("chroma", "auto"):
+        clients = {name: create_chroma_client(location) for name, location in shards.items()} or \
+            {"default": container.chroma_client}
+        for shard, client in clients.items():
+            names = list_collection_names(client)
+            print(f"Converting {len(names)} collections on {shard}...")
+            for name in names:
+                convert_collection(client, name, old_codec, new_codec)
+    if settings.vector_backend in ("numpy", "auto"):
+        backends = {name: NumpyBackend(numpy_shard_path(name, location)) for name, location in shards.items()} or \
+            {"default": NumpyBackend()}
+        for shard, backend in backends.items():
+            print(f"Converting NumPy backend projects on {shard}...")
+            convert_numpy_projects(backend, old_codec, new_codec)
+
+    print("✅ Vector storage converted; restart the API to pick up the new codec")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sample-size", type=int, default=20000, help="Number of chunks used to fit PCA")
+    args = parser.parse_args()
+    fit(args.sample_size)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Vector store migration script for KairosAI
+Splits the legacy single "documents" collection into one collection per project,
+copying stored embeddings so nothing is re-embedded.
+"""
+
+import argparse
+from collections import defaultdict
+
+from app.core.config import settings
+from app.services.container import container
+from app.services.vector_backends import ChromaBackend
+
+PAGE_SIZE = 1000
+
+def migrate(drop_source: bool = False):
+    """Copy every chunk of the global collection into its project's collection"""
+    if settings.vector_db_layout == "global":
+        print("❌ VECTOR_DB_LAYOUT is 'global'; set it to 'per_project' before migrating")
+        return
+
+    client = container.chroma_client
+    backend = ChromaBackend(client, layout="per_project")
+    try:
+        source = client.get_collection(name=settings.vector_db_collection_name)
+    except Exception:
+        print(f"Nothing to migrate: collection '{settings.vector_db_collection_name}' does not exist")
+        return
+
+    total = source.count()
+    print(f"Migrating {total} chunks from '{source.name}'...")
+
+    copied = defaultdict(int)
+    offset = 0
+    while offset < total:
+        page = source.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=PAGE_SIZE,
+            offset=offset
+        )
+        if not page['ids']:
+            break
+
+        # Group the page by project and write each group in one call
+        groups = defaultdict(lambda: {"ids": [], "embeddings": [], "documents": [], "metadatas": []})
+        for i, chunk_id in enumerate(page['ids']):
+            project_id = page['metadatas'][i]['project_id']
+            group = groups[project_id]
+            group["ids"].append(chunk_id)
+            group["embeddings"].append(list(page['embeddings'][i]))
+            group["documents"].append(page['documents'][i])
+            group["metadatas"].append(page['metadatas'][i])
+
+        for project_id, group in groups.items():
+            backend._get_collection(project_id).upsert(**group)
+            copied[project_id] += len(group["ids"])
+
+        offset += len(page['ids'])
+        print(f"  {offset}/{total}")
+
+    for project_id, count in sorted(copied.items()):
+        print(f"  project {project_id}: {count} chunks")
+
+    migrated = sum(copied.values())
+    if drop_source:
+        if migrated == total:
+            client.delete_collection(name=source.name)
+            print(f"Dropped source collection '{source.name}'")
+        else:
+            print(f"⚠️ Copied {migrated} of {total} chunks; keeping source collection")
+
+    print(f"✅ Migrated {migrated} chunks into {len(copied)} project collections")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--drop-source", action="store_true", help="Delete the global collection after a complete copy")
+    args = parser.parse_args()
+    migrate(drop_source=args.drop_source)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Vector store shard rebalancing script for KairosAI
+Moves projects' stored vectors between the shards listed in VECTOR_SHARDS
+without re-embedding anything.
+
+    python rebalance_shards.py status
+    python rebalance_shards.py move PROJECT_ID SHARD
+    python rebalance_shards.py rebalance [--dry-run]
+
+"rebalance" first records a placement for projects written before sharding
+was enabled (the shard that already holds them), then moves every project
+whose placement differs from its owner on the hash ring, e.g. after a shard
+was added. API workers keep serving while projects move: each move waits
+SHARD_MAP_REFRESH_SECONDS for them to pick up the new placement, then
+carries over writes that reached the old shard meanwhile.
+"""
+
+import argparse
+import sys
+from collections import Counter
+
+from app.core.config import settings
+from app.services.container import container
+
+def settle_seconds() -> float:
+    return settings.shard_map_refresh_seconds + 1.0
+
+def status():
+    vector_store = container.vector_store
+    shard_map = vector_store.shard_map
+    placements = shard_map.placements()
+    found = vector_store.project_shards()
+
+    counts = Counter(placements.values())
+    for name in shard_map.names:
+        print(f"  {name}: {counts.get(name, 0)} projects")
+
+    for project_id in sorted(set(placements) | set(found)):
+        placement = placements.get(project_id)
+        owner = shard_map.ring.owner(project_id)
+        holders = found.get(project_id, [])
+        notes = []
+        if placement is None:
+            notes.append(f"unplaced, data on {', '.join(holders)}")
+        elif placement != owner:
+            notes.append(f"ring owner is {owner}")
+        if len(holders) > 1:
+            notes.append(f"data on {', '.join(holders)}")
+        if notes:
+            print(f"  project {project_id} on {placement or '-'}: {'; '.join(notes)}")
+
+def move(project_id: int, shard: str):
+    report = container.vector_store.move_project_shard(project_id, shard, settle_seconds())
+    print(f"✅ Project {project_id}: {report['chunks']} chunks moved from {report['from']} to {report['to']}")
+
+def rebalance(dry_run: bool = False):
+    vector_store = container.vector_store
+    shard_map = vector_store.shard_map
+    placements = shard_map.placements()
+
+    # Projects written before sharding stay where their vectors are until moved
+    for project_id, holders in sorted(vector_store.project_shards().items()):
+        if project_id in placements:
+            continue
+        owner = shard_map.ring.owner(project_id)
+        shard = owner if owner in holders else holders[0]
+        print(f"  project {project_id}: recording placement on {shard}")
+        if not dry_run:
+            shard_map.assign(project_id, shard)
+        placements[project_id] = shard
+
+    moves = [
+        (project_id, shard_map.ring.owner(project_id))
+        for project_id, shard in sorted(placements.items())
+        if shard != shard_map.ring.owner(project_id)
+    ]
+    for project_id, owner in moves:
+        if dry_run:
+            print(f"  project {project_id}: would move {placements[project_id]} -> {owner}")
+        else:
+            move(project_id, owner)
+    print(f"✅ {len(moves)} projects {'to move' if dry_run else 'moved'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Projects per shard and any misplaced projects")
+    move_parser = subparsers.add_parser("move", help="Move one project to a shard")
+    move_parser.add_argument("project_id", type=int)
+    move_parser.add_argument("shard")
+    rebalance_parser = subparsers.add_parser("rebalance", help="Move projects to their hash-ring owners")
+    rebalance_parser.add_argument("--dry-run", action="store_true", help="Only print what would move")
+    args = parser.parse_args()
+
+    if not settings.vector_shards:
+        print("❌ VECTOR_SHARDS is not configured")
+        sys.exit(1)
+    try:
+        if args.command == "status":
+            status()
+        elif args.command == "move":
+            move(args.project_id, args.shard)
+        else:
+            rebalance(args.dry_run)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
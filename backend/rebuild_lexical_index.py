@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Lexical index rebuild script for KairosAI
+Re-indexes stored DocumentChunk rows for BM25 search, e.g. for projects
+ingested before hybrid retrieval existed, and creates the chunk_terms
+indexes that databases created by an older version lack. With
+--fingerprints it also recomputes the near-duplicate fingerprints, which
+signatures from an older version can't be compared with.
+"""
+
+import argparse
+
+from app.db.database import SessionLocal, engine
+from app.db.models import ChunkTerm, Project
+from app.services.lexical_index import LexicalIndex
+from app.services.near_duplicates import NearDuplicateIndex
+
+def rebuild(project_id: int = None, fingerprints: bool = False):
+    """Rebuild the lexical index (and optionally the fingerprints) for one project, or all of them"""
+    lexical_index = LexicalIndex()
+    near_duplicate_index = NearDuplicateIndex()
+    # create_all() leaves existing tables alone, so indexes added since then are created here
+    for index in ChunkTerm.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        query = db.query(Project)
+        if project_id is not None:
+            query = query.filter(Project.id == project_id)
+
+        for project in query.all():
+            if fingerprints:
+                fingerprinted = near_duplicate_index.rebuild_project(db, project.id, project.documents)
+                print(f"  project {project.id}: {fingerprinted} chunks fingerprinted")
+            # Near-duplicate chunks are searchable through the chunk they point at
+            duplicates = near_duplicate_index.duplicate_keys(db, project.id)
+            indexed = lexical_index.rebuild_project(db, project.id, project.documents, exclude=duplicates)
+            db.commit()
+            print(f"  project {project.id}: {indexed} chunks indexed")
+    finally:
+        db.close()
+    print("✅ Lexical index rebuilt")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--project-id", type=int, help="Only rebuild this project")
+    parser.add_argument("--fingerprints", action="store_true", help="Also recompute near-duplicate fingerprints")
+    args = parser.parse_args()
+    rebuild(args.project_id, args.fingerprints)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Corpus stats reconcile script for KairosAI
+Recomputes the maintained document/chunk counters from the documents and
+document_chunks tables, and can compare them with the vector store.
+"""
+
+import argparse
+
+from app.db.database import SessionLocal
+from app.services import corpus_stats
+
+def reconcile(project_id: int = None, check_vectors: bool = False):
+    db = SessionLocal()
+    try:
+        report = corpus_stats.reconcile(db, project_id)
+    finally:
+        db.close()
+
+    vector_store = None
+    if check_vectors:
+        from app.services.container import container
+        vector_store = container.vector_store
+
+    for row_project_id, counts in sorted(report.items()):
+        previous, current = counts["previous"], counts["current"]
+        marker = "" if previous == current else f" (was {previous})"
+        line = f"  project {row_project_id}: {current['total_documents']} documents, {current['total_chunks']} chunks{marker}"
+        if vector_store is not None:
+            vector_chunks = vector_store.get_project_stats(row_project_id)["total_chunks"]
+            if vector_chunks != current["total_chunks"]:
+                line += f" ⚠️ vector store has {vector_chunks} chunks"
+        print(line)
+
+    print(f"✅ Reconciled counters for {len(report)} projects")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--project-id", type=int, help="Only reconcile this project")
+    parser.add_argument("--check-vectors", action="store_true", help="Also compare chunk counts with the vector store")
+    args = parser.parse_args()
+    reconcile(args.project_id, args.check_vectors)
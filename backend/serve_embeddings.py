@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Embedding server for KairosAI
+Loads the embedding model once and serves every worker on the host over a
+Unix socket, batching concurrent encode requests. Point the API at it with
+EMBEDDING_BACKEND=server (and the same EMBEDDING_SERVER_SOCKET).
+
+    python serve_embeddings.py [--socket PATH] [--backend torch|onnx] [--max-batch 64] [--max-wait-ms 5]
+"""
+
+import argparse
+import signal
+import threading
+
+from app.core.config import settings
+from app.services.embedding_server import EmbeddingServer
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.embedding_model)
+    parser.add_argument("--socket", default=settings.embedding_server_socket, help="Unix socket path")
+    parser.add_argument("--backend", default=settings.embedding_server_backend, choices=["torch", "onnx"])
+    parser.add_argument("--max-batch", type=int, default=settings.embedding_server_max_batch,
+                        help="Texts per coalesced model call")
+    parser.add_argument("--max-wait-ms", type=float, default=settings.embedding_server_max_wait_ms,
+                        help="How long a request waits for others to share its batch")
+    args = parser.parse_args()
+
+    print(f"Loading {args.model} ({args.backend})...")
+    server = EmbeddingServer(args.model, args.socket, args.backend, args.max_batch, args.max_wait_ms)
+
+    # shutdown() blocks until serve_forever returns, so call it off the main thread
+    def stop(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"✅ Serving {args.model} (dimension {server.dimension}) on {args.socket}")
+    server.serve_forever()
+    stats = server.batcher.stats()
+    print(f"Stopped after {stats['requests']} requests in {stats['batches']} batches "
+          f"(average {stats['average_batch_size']} texts per batch)")
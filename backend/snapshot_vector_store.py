@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Vector store snapshot script for KairosAI
+Takes a consistent snapshot of stored vectors together with the Project,
+Document and DocumentChunk rows, or restores one on another node without
+re-embedding. Copy the snapshot directory between nodes with any file tool.
+
+    python snapshot_vector_store.py create [--name NAME] [--project-id ID ...]
+    python snapshot_vector_store.py restore PATH
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from app.core.config import settings
+from app.db.database import Base, engine
+from app.services import snapshots
+from app.services.container import container
+
+def create(name: str = None, project_ids: list = None):
+    name = name or datetime.utcnow().strftime("snapshot-%Y%m%dT%H%M%SZ")
+    path = snapshots.snapshot_path(name)
+    os.makedirs(settings.snapshot_dir, exist_ok=True)
+
+    print(f"Writing snapshot to {path}...")
+    manifest = snapshots.create_snapshot(container.vector_store, path, project_ids)
+    for project_id, entry in manifest["projects"].items():
+        pending = f", {len(entry['pending_documents'])} pending documents" if entry["pending_documents"] else ""
+        print(f"  project {project_id}: {entry['chunks']} chunks, corpus version {entry['corpus_version']}{pending}")
+    print(f"✅ Snapshot {name} created")
+
+def restore(path: str):
+    # Tables may not exist yet on a fresh node
+    Base.metadata.create_all(bind=engine)
+
+    print(f"Restoring snapshot from {path}...")
+    report = snapshots.restore_snapshot(
+        container.vector_store, container.lexical_index, container.near_duplicate_index, path
+    )
+    for project_id, entry in report["projects"].items():
+        print(f"  project {project_id}: {entry['chunks']} chunks, corpus version {entry['corpus_version']}")
+    print(f"✅ Restored snapshot taken at {report['created_at']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    create_parser = subparsers.add_parser("create", help="Snapshot the vector store and document rows")
+    create_parser.add_argument("--name", help="Snapshot directory name under SNAPSHOT_DIR (default: timestamp)")
+    create_parser.add_argument("--project-id", type=int, nargs="+", dest="project_ids", help="Only these projects")
+    restore_parser = subparsers.add_parser("restore", help="Restore a snapshot directory")
+    restore_parser.add_argument("path", help="Snapshot directory")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "create":
+            create(args.name, args.project_ids)
+        else:
+            restore(args.path)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
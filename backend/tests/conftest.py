@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+# Point the app at a throwaway SQLite database before anything imports its settings
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="kairos_tests_"), "test.db")
+
+import pytest
+
+@pytest.fixture
+def db_tables():
+    """Fresh tables for each test"""
+    from app.db import models  # noqa: F401  (registers the tables)
+    from app.db.database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
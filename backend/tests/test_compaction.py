@@ -0,0 +1,57 @@
+import pytest
+
+from app.services import compaction
+
+def _steal(project_id):
+    """Another process claims the project after our lease ran out"""
+    from app.db.database import SessionLocal
+    from app.db.models import VectorIndexChurn
+
+    db = SessionLocal()
+    try:
+        db.query(VectorIndexChurn).filter(VectorIndexChurn.project_id == project_id).update(
+            {VectorIndexChurn.lease_expires_at: None}
+        )
+        db.commit()
+    finally:
+        db.close()
+    assert compaction.claim(project_id) is not None
+
+def test_lease_is_renewed_once_half_of_it_has_run_out(db_tables):
+    expires_at = compaction.claim(1, lease_seconds=60)
+    keep_lease = compaction.LeaseRenewal(1, expires_at, lease_seconds=60)
+    keep_lease()
+    assert keep_lease.expires_at == expires_at
+
+    keep_lease.lease_seconds = 1000
+    keep_lease()
+    assert keep_lease.expires_at > expires_at
+    # The renewed lease still keeps other processes out
+    assert compaction.claim(1) is None
+
+def test_lost_lease_stops_the_compaction(db_tables):
+    class _Store:
+        def list_projects(self):
+            return [1]
+
+        def deleted_fraction(self, project_id):
+            return 0.5
+
+        def compact_project(self, project_id, keep_lease=None):
+            keep_lease.lease_seconds = 10 ** 6
+            _steal(project_id)
+            for _ in range(3):
+                keep_lease()
+                batches.append(project_id)
+
+    batches = []
+    report = compaction.VectorCompactor(_Store(), threshold=0.1).run_once()
+
+    assert batches == []
+    assert "Lost the compaction lease" in report["projects"][0]["error"]
+
+def test_renewing_without_the_lease_raises(db_tables):
+    expires_at = compaction.claim(2)
+    _steal(2)
+    with pytest.raises(RuntimeError):
+        compaction.LeaseRenewal(2, expires_at, lease_seconds=10 ** 6)()
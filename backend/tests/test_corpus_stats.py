@@ -0,0 +1,41 @@
+from app.services import corpus_stats
+
+def _bump(project_id, commit=True):
+    from app.db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        corpus_stats.bump_corpus_version(db, project_id)
+        if commit:
+            db.commit()
+    finally:
+        db.close()
+
+def test_corpus_versions_are_reused_until_a_bump_commits(db_tables, monkeypatch):
+    versions = corpus_stats.CorpusVersions(refresh_seconds=3600)
+    monkeypatch.setattr(corpus_stats, "corpus_versions", versions)
+    _bump(1)
+    assert versions.get(1) == 1
+
+    # Another process's bump: not seen until the entry is refreshed
+    from app.db.database import SessionLocal
+    from app.db.models import ProjectCorpusVersion
+    db = SessionLocal()
+    try:
+        db.query(ProjectCorpusVersion).update({ProjectCorpusVersion.version: 5})
+        db.commit()
+    finally:
+        db.close()
+    assert versions.get(1) == 1
+
+    # A bump from this process that rolls back leaves the entry alone; a committed one drops it
+    _bump(1, commit=False)
+    assert versions.get(1) == 1
+    _bump(1)
+    assert versions.get(1) == 6
+
+def test_corpus_versions_expire_after_refresh_seconds(db_tables):
+    versions = corpus_stats.CorpusVersions(refresh_seconds=0)
+    assert versions.get(2) == 0
+    _bump(2)
+    assert versions.get(2) == 1
@@ -0,0 +1,64 @@
+import sqlite3
+
+import numpy as np
+
+from app.services.embedding_cache import EmbeddingCache
+
+def _vectors(*names, dimensions=4):
+    return {name: np.full(dimensions, i, dtype=np.float32) for i, name in enumerate(names)}
+
+def _summed_bytes(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COALESCE(SUM(length(vector)), 0), COUNT(*) FROM embeddings").fetchone()
+    finally:
+        connection.close()
+
+def _last_used(path, name):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT last_used FROM embeddings WHERE text_hash = ?", (name,)).fetchone()[0]
+    finally:
+        connection.close()
+
+def test_running_totals_follow_inserts_replacements_and_evictions(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path, max_bytes=10 * 16)
+    cache.put_many("model", _vectors(*"abcdef"))
+    cache.put_many("model", _vectors("a", "b", dimensions=8))
+    cache.put_many("model", _vectors(*"ghij"))
+
+    stats = cache.stats()
+    assert stats["evictions"] > 0
+    assert (stats["size_bytes"], stats["entries"]) == _summed_bytes(path)
+    assert stats["size_bytes"] <= 10 * 16
+    cache.close()
+
+def test_existing_cache_is_counted_once_on_open(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path, max_bytes=1 << 20)
+    cache.put_many("model", _vectors(*"abc"))
+    cache.close()
+    connection = sqlite3.connect(path)
+    connection.executescript("DROP TRIGGER embeddings_totals_insert; DROP TABLE cache_meta;")
+    connection.close()
+
+    reopened = EmbeddingCache(path, max_bytes=1 << 20)
+    assert (reopened.stats()["size_bytes"], reopened.stats()["entries"]) == (3 * 16, 3)
+    reopened.close()
+
+def test_hits_are_written_in_batches_and_still_guide_eviction(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path, max_bytes=3 * 16)
+    cache.put_many("model", _vectors("old"))
+    cache.put_many("model", _vectors("newer"))
+    cache.put_many("model", _vectors("newest"))
+    last_used = _last_used(path, "old")
+
+    assert set(cache.get_many("model", ["old"])) == {"old"}
+    assert _last_used(path, "old") == last_used
+
+    # Going over budget writes the pending hit first, so "old" is no longer the least recently used
+    cache.put_many("model", _vectors("fourth"))
+    assert set(cache.get_many("model", ["old", "newer", "newest", "fourth"])) == {"old", "newest", "fourth"}
+    cache.close()
@@ -0,0 +1,129 @@
+import pytest
+
+from app.services import embedding_spaces
+
+def test_live_model_keeps_original_storage_when_target_registers(db_tables):
+    embedding_spaces.register_spaces("live-model", "target-model")
+
+    assert embedding_spaces.storage_key("live-model") == ""
+    assert embedding_spaces.storage_key("target-model") != ""
+
+def test_container_registers_live_model_before_building_target(db_tables, monkeypatch):
+    pytest.importorskip("chromadb")
+    pytest.importorskip("google.generativeai")
+    from app.services import container as container_module
+
+    built = []
+    monkeypatch.setattr(container_module.settings, "embedding_model", "live-model")
+    monkeypatch.setattr(container_module.settings, "embedding_migration_target", "target-model")
+    monkeypatch.setattr(container_module.settings, "vector_pca_dimensions", 0)
+    monkeypatch.setattr(container_module.settings, "vector_storage_dtype", "float32")
+    monkeypatch.setattr(container_module, "CustomEmbeddingFunction", lambda model, cache=None: model)
+    # What matters is the storage key the target store would take, so record it instead of building one
+    monkeypatch.setattr(
+        container_module, "VectorStore",
+        lambda embedding_function, **kwargs: built.append(embedding_spaces.storage_key(embedding_function))
+    )
+
+    services = container_module.ServiceContainer()
+    services._components["embedding_function"] = type("LiveFunction", (), {"cache": None})()
+    services._components["chroma_client"] = None
+    services._create_migration_target()
+
+    assert built and built[0] != ""
+    assert embedding_spaces.storage_key("live-model") == ""
+
+def test_container_refuses_migration_through_embedding_server(monkeypatch):
+    pytest.importorskip("chromadb")
+    pytest.importorskip("google.generativeai")
+    from app.services import container as container_module
+
+    monkeypatch.setattr(container_module.settings, "embedding_model", "live-model")
+    monkeypatch.setattr(container_module.settings, "embedding_migration_target", "target-model")
+    monkeypatch.setattr(container_module.settings, "vector_pca_dimensions", 0)
+    monkeypatch.setattr(container_module.settings, "vector_storage_dtype", "float32")
+    monkeypatch.setattr(container_module.settings, "embedding_backend", "server")
+
+    with pytest.raises(ValueError, match="EMBEDDING_BACKEND=server"):
+        container_module.ServiceContainer()._create_migration_target()
+
+class _RecordingTarget:
+    """Migration target store that runs a callback while it writes"""
+
+    model_name = "target-model"
+
+    def __init__(self, during_write=None):
+        self.during_write = during_write
+        self.written = []
+
+    def add_document_chunks(self, chunks, project_id, embeddings=None):
+        if self.during_write is not None:
+            self.during_write()
+        self.written.extend(chunk["document_id"] for chunk in chunks)
+
+class _RecordingStore:
+    model_name = "live-model"
+
+    def __init__(self, target):
+        self.migration_target = target
+        self.deleted_from_target = []
+
+    def delete_document_from_target(self, document_id, project_id):
+        self.deleted_from_target.append(document_id)
+
+def _project_with_documents(count):
+    from app.db.database import SessionLocal
+    from app.db.models import Document, DocumentChunk, Project
+
+    db = SessionLocal()
+    try:
+        project = Project(name="migration")
+        db.add(project)
+        db.flush()
+        document_ids = []
+        for i in range(count):
+            document = Document(filename=f"{i}.txt", original_filename=f"{i}.txt", file_path=f"/tmp/{i}.txt",
+                                file_size=1, file_type="txt", project_id=project.id)
+            db.add(document)
+            db.flush()
+            db.add(DocumentChunk(document_id=document.id, chunk_text=f"chunk {i}", chunk_index=0))
+            document_ids.append(document.id)
+        db.commit()
+        return project.id, document_ids
+    finally:
+        db.close()
+
+def test_migrator_drops_chunks_of_documents_deleted_while_copying(db_tables):
+    from app.db.database import SessionLocal
+    from app.db.models import Document
+
+    project_id, (kept, deleted) = _project_with_documents(2)
+
+    def delete_document():
+        db = SessionLocal()
+        try:
+            db.delete(db.get(Document, deleted))
+            db.commit()
+        finally:
+            db.close()
+
+    store = _RecordingStore(_RecordingTarget(during_write=delete_document))
+    migrator = embedding_spaces.EmbeddingMigrator(store, chunks_per_second=0)
+    assert migrator.migrate_project(project_id)
+
+    assert sorted(store.migration_target.written) == sorted([kept, deleted])
+    assert store.deleted_from_target == [deleted]
+
+def test_run_once_leaves_switched_projects_alone(db_tables):
+    switched_id, _ = _project_with_documents(1)
+    store = _RecordingStore(_RecordingTarget())
+    migrator = embedding_spaces.EmbeddingMigrator(store, chunks_per_second=0)
+    assert migrator.run_once()["switched"] == [switched_id]
+
+    pending_id, _ = _project_with_documents(1)
+    claimed = []
+    claim = migrator._claim
+    migrator._claim = lambda project_id: claimed.append(project_id) or claim(project_id)
+
+    assert migrator.run_once()["switched"] == [pending_id]
+    assert claimed == [pending_id]
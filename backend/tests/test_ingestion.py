@@ -0,0 +1,24 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app.services import ingestion
+
+def test_worker_threads_are_capped_before_numpy_loads(monkeypatch):
+    # Keeps torch out of the worker; the cap is about BLAS here
+    monkeypatch.setenv("EMBEDDING_BACKEND", "onnx")
+    pool = ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=ingestion._cap_threads,
+        initargs=(2,)
+    )
+    try:
+        limits = pool.submit(ingestion._worker_thread_limits).result()
+    finally:
+        pool.shutdown()
+
+    assert limits["capped_before_numpy"] is True
+    assert limits["omp_num_threads"] == "2"
+    # Only reported when threadpoolctl is installed
+    if "blas" in limits:
+        assert limits["blas"] == [2]
@@ -0,0 +1,127 @@
+import threading
+
+from app.services.near_duplicates import NearDuplicateIndex, shingles
+
+CLAUSE = ("This agreement is governed by the laws of the state of Delaware and any dispute arising under it "
+          "goes to binding arbitration before a single arbitrator in Wilmington")
+
+def _jaccard(first, second):
+    first, second = shingles(first, 5), shingles(second, 5)
+    return len(first & second) / len(first | second)
+
+def _project(db, document_ids):
+    from app.db.models import Document, Project
+
+    db.add(Project(id=1, name="dedup"))
+    for document_id in document_ids:
+        db.add(Document(id=document_id, filename="f", original_filename="f", file_path="f", file_size=1,
+                        file_type="txt", project_id=1))
+    db.commit()
+
+def _chunks(document_id, texts):
+    return [{"document_id": document_id, "chunk_index": i, "chunk_text": text} for i, text in enumerate(texts)]
+
+def test_shared_chunks_point_selected_duplicates_at_their_stored_copy(db_tables):
+    from app.db.database import SessionLocal
+    from app.db.models import ChunkDuplicate, Document, Project
+
+    db = SessionLocal()
+    try:
+        db.add(Project(id=1, name="dedup"))
+        for document_id in (5, 6, 7):
+            db.add(Document(id=document_id, filename="f", original_filename="f", file_path="f", file_size=1,
+                            file_type="txt", project_id=1))
+        db.add_all([
+            # Document 6 shares a chunk stored under 5, document 7 one stored under 6
+            ChunkDuplicate(project_id=1, document_id=6, chunk_index=2, canonical_document_id=5,
+                           canonical_chunk_index=0, similarity=1.0),
+            ChunkDuplicate(project_id=1, document_id=7, chunk_index=0, canonical_document_id=6,
+                           canonical_chunk_index=1, similarity=0.9),
+        ])
+        db.commit()
+
+        index = NearDuplicateIndex()
+        assert index.shared_chunks(db, 1, [6]) == {(5, 0): [(6, 2)]}
+        # A copy stored under another selected document is already in scope
+        assert index.shared_chunks(db, 1, [6, 7]) == {(5, 0): [(6, 2)]}
+        assert index.shared_chunks(db, 1, [5]) == {}
+    finally:
+        db.close()
+
+def test_signatures_estimate_jaccard_similarity():
+    index = NearDuplicateIndex(num_perm=256, bands=32, shingle_size=5)
+    edited = CLAUSE.replace("single", "sole")
+    estimate = index.similarity(index.signature(CLAUSE), index.signature(edited))
+    assert abs(estimate - _jaccard(CLAUSE, edited)) < 0.1
+    assert index.similarity(index.signature(CLAUSE), index.signature(CLAUSE)) == 1.0
+
+def test_near_identical_chunks_at_the_threshold_are_stored_once(db_tables):
+    from app.db.database import SessionLocal
+
+    edited = CLAUSE.replace("Wilmington", "Dover")
+    unrelated = "Quarterly revenue grew eleven percent on strong renewals while hardware margins narrowed in Europe"
+    index = NearDuplicateIndex(threshold=0.85, num_perm=128, bands=16, shingle_size=5)
+    assert _jaccard(CLAUSE, edited) >= 0.85
+    db = SessionLocal()
+    try:
+        _project(db, [5, 6])
+        assert index.index_chunks(db, 1, _chunks(5, [CLAUSE])) == [None]
+        db.commit()
+
+        first, second = index.index_chunks(db, 1, _chunks(6, [edited, unrelated]))
+        db.commit()
+        assert (first["document_id"], first["chunk_index"]) == (5, 0)
+        assert first["similarity"] >= 0.85
+        assert second is None
+        assert index.duplicate_keys(db, 1) == {(6, 0)}
+    finally:
+        db.close()
+
+def test_chunks_below_the_threshold_stay_apart(db_tables):
+    from app.db.database import SessionLocal
+
+    # Half the clause rewritten: similar, but not a duplicate
+    rewritten = CLAUSE.split(" any ")[0] + " any claim is settled by the courts of New York under their rules of procedure"
+    index = NearDuplicateIndex(threshold=0.85, num_perm=128, bands=16, shingle_size=5)
+    assert _jaccard(CLAUSE, rewritten) < 0.5
+    db = SessionLocal()
+    try:
+        _project(db, [5, 6])
+        index.index_chunks(db, 1, _chunks(5, [CLAUSE]))
+        db.commit()
+        assert index.index_chunks(db, 1, _chunks(6, [rewritten])) == [None]
+        db.commit()
+        assert index.duplicate_keys(db, 1) == set()
+    finally:
+        db.close()
+
+def test_concurrent_uploads_see_each_others_chunks(db_tables):
+    from app.db.database import SessionLocal
+
+    index = NearDuplicateIndex()
+    setup = SessionLocal()
+    try:
+        _project(setup, [5, 6])
+    finally:
+        setup.close()
+
+    first = SessionLocal()
+    second = SessionLocal()
+    results = []
+    try:
+        # The first upload holds the project until it commits
+        index.index_chunks(first, 1, _chunks(5, [CLAUSE]))
+        worker = threading.Thread(
+            target=lambda: (results.extend(index.index_chunks(second, 1, _chunks(6, [CLAUSE]))), second.commit())
+        )
+        worker.start()
+        worker.join(0.3)
+        assert worker.is_alive()
+        first.commit()
+        worker.join(5)
+        assert not worker.is_alive()
+    finally:
+        first.close()
+        second.close()
+
+    assert (results[0]["document_id"], results[0]["chunk_index"]) == (5, 0)
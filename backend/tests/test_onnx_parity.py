@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("sentence_transformers")
+
+from app.core.config import settings
+from app.services.embedding_backends import onnx_model_file
+
+import export_onnx_model
+
+@pytest.mark.parametrize("quantized", [False, True], ids=["fp32", "int8"])
+def test_onnx_embeddings_match_torch(quantized):
+    if not os.path.exists(onnx_model_file(settings.embedding_model, quantized)):
+        pytest.skip("No ONNX export of the embedding model; run export_onnx_model.py")
+
+    reference = export_onnx_model.reference_embeddings(settings.embedding_model)
+    similarities = export_onnx_model.parity(settings.embedding_model, quantized, reference)
+
+    assert similarities.min() >= export_onnx_model.DEFAULT_TOLERANCE
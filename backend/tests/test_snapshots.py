@@ -0,0 +1,164 @@
+import threading
+
+import numpy as np
+import pytest
+from sqlalchemy import event
+
+pytest.importorskip("chromadb")
+
+from app.db.database import SessionLocal, engine
+from app.db.models import ChunkDuplicate, ChunkTerm, Document, DocumentChunk, DocumentCorpusStats, Project
+from app.services import corpus_stats, snapshots
+from app.services.lexical_index import LexicalIndex
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.vector_codec import VectorCodec
+
+BOILERPLATE = "This agreement is governed by the laws of the state and any dispute goes to arbitration first"
+
+class _FakeStore:
+    """Vector store holding exported rows in memory"""
+
+    def __init__(self, rows=None):
+        self.rows = rows or {}
+        self.codec = VectorCodec()
+        self.write_lock = threading.RLock()
+
+    def export_project(self, project_id):
+        rows = self.rows.get(project_id, [])
+        if rows:
+            yield {
+                "ids": [row["id"] for row in rows],
+                "embeddings": np.stack([row["embedding"] for row in rows]),
+                "documents": [row["document"] for row in rows],
+                "metadatas": [row["metadata"] for row in rows]
+            }
+
+    def restore_project(self, project_id, batches, total_chunks):
+        self.rows[project_id] = [
+            {"id": chunk_id, "embedding": embedding, "document": document, "metadata": metadata}
+            for batch in batches
+            for chunk_id, embedding, document, metadata in zip(
+                batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"]
+            )
+        ]
+
+@pytest.fixture
+def foreign_keys(db_tables):
+    """Enforce foreign keys on SQLite, as PostgreSQL does"""
+    def enable(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+
+    engine.dispose()
+    event.listen(engine, "connect", enable)
+    yield
+    event.remove(engine, "connect", enable)
+    engine.dispose()
+
+def _ingest(db, store, lexical_index, near_duplicate_index, project_id, texts):
+    """Store a processed document the way the upload route does"""
+    document = Document(filename="f.txt", original_filename="f.txt", file_path="/tmp/f.txt", file_size=1,
+                        file_type="txt", project_id=project_id, processed=True)
+    db.add(document)
+    corpus_stats.record_document_added(db, project_id)
+    db.flush()
+    chunks = [{"document_id": document.id, "chunk_index": i, "chunk_text": text} for i, text in enumerate(texts)]
+    for chunk in chunks:
+        db.add(DocumentChunk(**chunk))
+    duplicates = near_duplicate_index.index_chunks(db, project_id, chunks)
+    unique = [chunk for chunk, duplicate in zip(chunks, duplicates) if duplicate is None]
+    lexical_index.add_chunks(db, project_id, unique)
+    corpus_stats.record_chunks_ingested(db, project_id, document.id, len(chunks))
+    db.commit()
+    store.rows.setdefault(project_id, []).extend(
+        {
+            "id": f"doc_{chunk['document_id']}_chunk_{chunk['chunk_index']}",
+            "embedding": np.full(4, chunk["chunk_index"] + 1, dtype=np.float32),
+            "document": chunk["chunk_text"],
+            "metadata": {"document_id": chunk["document_id"], "project_id": project_id,
+                         "chunk_index": chunk["chunk_index"]}
+        }
+        for chunk in unique
+    )
+    return document.id
+
+def test_restore_replaces_a_populated_project(foreign_keys, tmp_path):
+    store = _FakeStore()
+    lexical_index = LexicalIndex()
+    near_duplicate_index = NearDuplicateIndex()
+    db = SessionLocal()
+    try:
+        db.add(Project(id=1, name="contracts"))
+        db.commit()
+        first = _ingest(db, store, lexical_index, near_duplicate_index, 1, [BOILERPLATE, "Payment is due in thirty days"])
+        second = _ingest(db, store, lexical_index, near_duplicate_index, 1, [BOILERPLATE, "Delivery within two weeks"])
+    finally:
+        db.close()
+
+    snapshots.create_snapshot(store, str(tmp_path / "snapshot"))
+    # The project still holds postings, fingerprints, back-references and counters when it is restored over
+    report = snapshots.restore_snapshot(store, lexical_index, near_duplicate_index, str(tmp_path / "snapshot"))
+
+    assert report["projects"]["1"]["chunks"] == 3
+    assert sorted(row["id"] for row in store.rows[1]) == [
+        f"doc_{first}_chunk_0", f"doc_{first}_chunk_1", f"doc_{second}_chunk_1"
+    ]
+    db = SessionLocal()
+    try:
+        assert [document.processed for document in db.query(Document).order_by(Document.id)] == [True, True]
+        assert db.query(ChunkDuplicate.document_id, ChunkDuplicate.canonical_document_id).all() == [(second, first)]
+        assert db.query(ChunkTerm).filter(ChunkTerm.term == "delivery").count() == 1
+        assert db.query(DocumentCorpusStats).count() == 2
+        assert corpus_stats.get_project_stats(db, 1)["total_chunks"] == 4
+    finally:
+        db.close()
+
+def test_documents_stay_unprocessed_when_the_vector_restore_fails(db_tables, tmp_path):
+    store = _FakeStore()
+    db = SessionLocal()
+    try:
+        db.add(Project(id=1, name="contracts"))
+        db.commit()
+        _ingest(db, store, LexicalIndex(), NearDuplicateIndex(), 1, ["Payment is due in thirty days"])
+    finally:
+        db.close()
+    snapshots.create_snapshot(store, str(tmp_path / "snapshot"))
+
+    def fail(project_id, batches, total_chunks):
+        raise RuntimeError("vector backend unavailable")
+
+    store.restore_project = fail
+    with pytest.raises(RuntimeError):
+        snapshots.restore_snapshot(store, LexicalIndex(), NearDuplicateIndex(), str(tmp_path / "snapshot"))
+
+    db = SessionLocal()
+    try:
+        assert [document.processed for document in db.query(Document)] == [False]
+    finally:
+        db.close()
+
+def test_snapshot_only_keeps_vectors_matching_the_rows_it_read(db_tables, tmp_path):
+    store = _FakeStore()
+    db = SessionLocal()
+    try:
+        db.add(Project(id=1, name="contracts"))
+        db.commit()
+        stored = _ingest(db, store, LexicalIndex(), NearDuplicateIndex(), 1, ["Payment is due in thirty days"])
+        # Processed by another worker whose vectors haven't landed yet
+        unfinished = _ingest(db, store, LexicalIndex(), NearDuplicateIndex(), 1, ["Delivery within two weeks"])
+    finally:
+        db.close()
+    store.rows[1] = [row for row in store.rows[1] if row["metadata"]["document_id"] != unfinished]
+    # Vectors of a document committed after the rows were read
+    store.rows[1].append({"id": "doc_99_chunk_0", "embedding": np.ones(4, dtype=np.float32), "document": "late",
+                          "metadata": {"document_id": 99, "project_id": 1, "chunk_index": 0}})
+
+    manifest = snapshots.create_snapshot(store, str(tmp_path / "snapshot"))
+
+    assert manifest["projects"]["1"]["chunks"] == 1
+    assert manifest["projects"]["1"]["pending_documents"] == [unfinished]
+    batches = list(snapshots._read_batches(str(tmp_path / "snapshot" / "projects" / "1")))
+    assert [chunk_id for batch in batches for chunk_id in batch["ids"]] == [f"doc_{stored}_chunk_0"]
+    assert batches[0]["embeddings"].shape == (1, 4)
+    assert sorted(path.name for path in (tmp_path / "snapshot" / "projects" / "1").iterdir()) == [
+        "embeddings.npy", "records.jsonl", "relational.json"
+    ]
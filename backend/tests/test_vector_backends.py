@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from app.services.vector_backends import NumpyBackend
+
+def _add(backend, document_id, contents):
+    backend.add(
+        1,
+        ids=[f"doc_{document_id}_chunk_{i}" for i in range(len(contents))],
+        embeddings=np.random.default_rng(document_id).normal(size=(len(contents), 4)),
+        documents=contents,
+        metadatas=[{"document_id": document_id, "project_id": 1, "chunk_index": i} for i in range(len(contents))]
+    )
+
+def _contents(backend):
+    return {chunk_id: content for batch in backend.export_project(1)
+            for chunk_id, content in zip(batch["ids"], batch["documents"])}
+
+def test_numpy_upserts_and_filters_across_processes(tmp_path):
+    writer = NumpyBackend(str(tmp_path), retention_seconds=0)
+    for document_id in range(6):
+        _add(writer, document_id, ["first", "second"])
+    _add(writer, 2, ["replaced"])
+    writer.delete_document(1, 4)
+
+    # A second process opens the files cold and keeps upserting where the first left off
+    reader = NumpyBackend(str(tmp_path), retention_seconds=0)
+    _add(reader, 3, ["again", "again"])
+    assert _contents(reader) == {
+        "doc_0_chunk_0": "first", "doc_0_chunk_1": "second",
+        "doc_1_chunk_0": "first", "doc_1_chunk_1": "second",
+        "doc_2_chunk_0": "replaced", "doc_2_chunk_1": "second",
+        "doc_3_chunk_0": "again", "doc_3_chunk_1": "again",
+        "doc_5_chunk_0": "first", "doc_5_chunk_1": "second"
+    }
+
+    where = {"$or": [{"document_id": 0}, {"$and": [{"document_id": 2}, {"chunk_index": {"$in": [1]}}]}]}
+    results = writer.query(1, np.ones(4), 10, where=where)
+    assert sorted(result["id"] for result in results) == ["doc_0_chunk_0", "doc_0_chunk_1", "doc_2_chunk_1"]